@@ -8,3 +8,7 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from ecommerce_project.images import track_image_variants
+        track_image_variants(self.get_model('User'), 'profile_picture')
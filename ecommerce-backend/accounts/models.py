@@ -23,6 +23,8 @@ class User(AbstractUser):
         validators=[FileExtensionValidator(
             allowed_extensions=['jpg', 'jpeg', 'png', 'gif'])]
     )
+    # Resized WebP copies of profile_picture (see ecommerce_project.images)
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_verified = models.BooleanField(default=False)
     is_email_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
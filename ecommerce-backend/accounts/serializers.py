@@ -5,6 +5,7 @@ Serializers for accounts app
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import get_user_model
+from ecommerce_project.images import SrcsetField
 
 User = get_user_model()
 
@@ -47,12 +48,14 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for user details"""
+    profile_picture_srcset = SrcsetField('profile_picture')
+
     class Meta:
         model = User
         fields = [
             'id', 'email', 'username', 'first_name', 'last_name',
             'phone_number', 'address', 'city', 'country', 'zip_code',
-            'profile_picture', 'is_verified', 'created_at'
+            'profile_picture', 'profile_picture_srcset', 'is_verified', 'created_at'
         ]
         read_only_fields = ['id', 'created_at', 'is_verified']
 
@@ -8,3 +8,8 @@ from django.apps import AppConfig
 class CategoriesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'categories'
+
+    def ready(self):
+        from ecommerce_project.images import track_image_variants
+        track_image_variants(self.get_model('Category'), 'image')
+        from . import signals  # noqa: F401
@@ -0,0 +1,230 @@
+"""
+Denormalized product counts for categories app
+
+Every category stores how many active and active in-stock products it holds
+directly (``product_count``, ``in_stock_count``) and including all of its
+subcategories (``tree_product_count``, ``tree_in_stock_count``). Product
+writes compare the rows they touch before and after (``CategoryTracker``,
+``apply_changes``) and hand per-category deltas to ``apply_deltas``, which
+rolls them up the materialized path with one ``UPDATE ... SET x = x + n`` per
+distinct delta; products whose stats inputs changed are passed on to
+categories.stats as removals and additions.
+``manage.py reconcile_category_counts`` recomputes everything and reports
+drift.
+"""
+
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Category
+from .stats import ancestor_ids, apply_stats_changes
+
+DIRECT_FIELDS = ('product_count', 'in_stock_count')
+TREE_FIELDS = ('tree_product_count', 'tree_in_stock_count')
+
+# Product fields whose changes move counts
+COUNTED_FIELDS = {'category', 'category_id', 'is_active', 'quantity_in_stock'}
+# ... and those that move counts or stats (categories.stats)
+TRACKED_FIELDS = COUNTED_FIELDS | {
+    'price', 'discount_price', 'effective_price', 'average_rating', 'review_count',
+}
+# Product columns compared before and after a write
+ROW_FIELDS = (
+    'category_id', 'is_active', 'quantity_in_stock', 'effective_price', 'average_rating',
+    'review_count',
+)
+
+ZERO = (0, 0)
+
+
+def contribution(is_active, quantity_in_stock):
+    """(active, in stock) counted for one product"""
+    active = 1 if is_active else 0
+    return active, active if int(quantity_in_stock) > 0 else 0
+
+
+def snapshot(products):
+    """{category_id: (active, in stock)} for a product queryset (one GROUP BY)"""
+    rows = (products.order_by().filter(category__isnull=False)
+            .values('category_id')
+            .annotate(active=Count('pk', filter=Q(is_active=True)),
+                      in_stock=Count('pk', filter=Q(is_active=True,
+                                                    quantity_in_stock__gt=0))))
+    return {row['category_id']: (row['active'], row['in_stock']) for row in rows}
+
+
+def diff(before, after):
+    """Per-category change from one snapshot to another"""
+    deltas = {}
+    for category_id in before.keys() | after.keys():
+        old, new = before.get(category_id, ZERO), after.get(category_id, ZERO)
+        delta = (new[0] - old[0], new[1] - old[1])
+        if delta != ZERO:
+            deltas[category_id] = delta
+    return deltas
+
+
+def apply_deltas(deltas, using=None):
+    """Add {category_id: (active, in stock)} to the categories and their ancestors"""
+    deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta != ZERO}
+    if not deltas:
+        return
+    manager = Category.objects.using(using)
+    changes = defaultdict(lambda: [0, 0, 0, 0])
+    for pk, path in manager.filter(pk__in=list(deltas)).values_list('pk', 'path'):
+        active, in_stock = deltas[pk]
+        changes[pk][0] += active
+        changes[pk][1] += in_stock
+        for ancestor in ancestor_ids(path) or [pk]:
+            changes[ancestor][2] += active
+            changes[ancestor][3] += in_stock
+    add_counts(changes, using=using)
+
+
+def add_counts(changes, using=None):
+    """Apply {category_id: (direct active, direct in stock, tree active, tree in stock)}"""
+    by_delta = defaultdict(list)
+    for pk, delta in changes.items():
+        if any(delta):
+            by_delta[tuple(delta)].append(pk)
+    now = timezone.now()
+    with transaction.atomic(using=using, savepoint=False):
+        for delta, pks in by_delta.items():
+            Category.objects.using(using).filter(pk__in=pks).update(
+                counts_updated_at=now,
+                **{name: F(name) + amount
+                   for name, amount in zip(DIRECT_FIELDS + TREE_FIELDS, delta) if amount})
+
+
+def move_subtree(category, old_path, new_path, using=None):
+    """Move a category's subtree totals from its old ancestors to its new ones"""
+    totals = (Category.objects.using(using).filter(pk=category.pk)
+              .values_list(*TREE_FIELDS).get())
+    if totals == ZERO:
+        return
+    changes = defaultdict(lambda: [0, 0, 0, 0])
+    for ancestor in ancestor_ids(old_path)[:-1]:
+        changes[ancestor][2] -= totals[0]
+        changes[ancestor][3] -= totals[1]
+    for ancestor in ancestor_ids(new_path)[:-1]:
+        changes[ancestor][2] += totals[0]
+        changes[ancestor][3] += totals[1]
+    add_counts(changes, using=using)
+
+
+def detach(category_id, using=None):
+    """Take a category's own products out of its ancestors' totals (before deleting it)"""
+    row = (Category.objects.using(using).filter(pk=category_id)
+           .values_list('path', *DIRECT_FIELDS).first())
+    if row is None or row[1:] == ZERO:
+        return
+    path, active, in_stock = row
+    add_counts({ancestor: [0, 0, -active, -in_stock]
+                for ancestor in ancestor_ids(path)[:-1]}, using=using)
+
+
+def product_row(product):
+    return tuple(getattr(product, name) for name in ROW_FIELDS)
+
+
+def fetch_rows(products):
+    """{pk: row} of ROW_FIELDS for a product queryset"""
+    return {pk: tuple(row) for pk, *row in
+            products.order_by().values_list('pk', *ROW_FIELDS)}
+
+
+def stats_key(row):
+    """What a product contributes to its category's stats (None for nothing)"""
+    if row is None or row[0] is None or not row[1]:
+        return None
+    category_id, _, _, price, rating, reviews = row
+    return category_id, price, rating, reviews > 0
+
+
+def apply_changes(before, after, using=None):
+    """Update counts and stats for products that went from ``before`` to ``after`` ({pk: row})"""
+    apply_deltas(diff(count_rows(row[:3] for row in before.values()),
+                      count_rows(row[:3] for row in after.values())), using=using)
+    removed, added = [], []
+    for pk in before.keys() | after.keys():
+        old, new = stats_key(before.get(pk)), stats_key(after.get(pk))
+        if old != new:
+            if old is not None:
+                removed.append(old)
+            if new is not None:
+                added.append(new)
+    apply_stats_changes(removed, added, using=using)
+
+
+class CategoryTracker:
+    """
+    Read the products a write touches before it and apply the difference to
+    category counts and stats afterwards::
+
+        tracker = CategoryTracker(products)
+        products.update(...)
+        tracker.apply()
+
+    The products are pinned by primary key, since the write may change which
+    rows the queryset matches; pass ``pin=False`` when it cannot (e.g. a
+    unique-field filter around an upsert, which also has to see new rows).
+    """
+
+    def __init__(self, products, pin=True):
+        self.using = products.db
+        self.before = fetch_rows(products)
+        if pin:
+            products = products.model._default_manager.using(self.using).filter(
+                pk__in=list(self.before))
+        self.products = products
+
+    def apply(self):
+        apply_changes(self.before, fetch_rows(self.products), using=self.using)
+
+
+def count_rows(rows):
+    """{category_id: (active, in stock)} for (category_id, is_active, quantity) rows"""
+    counts = {}
+    for category_id, is_active, quantity_in_stock in rows:
+        if category_id is not None:
+            active, in_stock = contribution(is_active, quantity_in_stock)
+            old = counts.get(category_id, ZERO)
+            counts[category_id] = (old[0] + active, old[1] + in_stock)
+    return counts
+
+
+def count_all(using=None):
+    """Correct counts for every category, from one GROUP BY over products"""
+    Product = apps.get_model('products', 'Product')
+    direct = snapshot(Product.objects.using(using))
+    counts = {}
+    categories = Category.objects.using(using).values_list('pk', 'path')
+    for pk, path in categories:
+        counts.setdefault(pk, [0, 0, 0, 0])
+        active, in_stock = direct.get(pk, ZERO)
+        counts[pk][0] += active
+        counts[pk][1] += in_stock
+        for ancestor in ancestor_ids(path) or [pk]:
+            totals = counts.setdefault(ancestor, [0, 0, 0, 0])
+            totals[2] += active
+            totals[3] += in_stock
+    return counts
+
+
+def reconcile_counts(using=None, batch_size=1000):
+    """Rewrite counts that drifted; returns the categories fixed"""
+    counts = count_all(using=using)
+    fields = DIRECT_FIELDS + TREE_FIELDS
+    now = timezone.now()
+    drifted = []
+    for pk, *stored in Category.objects.using(using).values_list('pk', *fields):
+        expected = counts.get(pk, [0, 0, 0, 0])
+        if list(stored) != expected:
+            drifted.append(Category(pk=pk, counts_updated_at=now, **dict(zip(fields, expected))))
+    Category.objects.using(using).bulk_update(
+        drifted, [*fields, 'counts_updated_at'], batch_size=batch_size)
+    return len(drifted)
@@ -0,0 +1,20 @@
+"""
+Django management command to recompute materialized category paths
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from categories.models import rebuild_paths
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Category.path and Category.depth from the parent_category links'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated, detached = rebuild_paths()
+        if detached:
+            self.stdout.write(self.style.WARNING(
+                f'{detached} categories are on a parent cycle and were treated as roots'))
+        self.stdout.write(self.style.SUCCESS(f'✅ Category paths rebuilt ({updated} updated)'))
@@ -0,0 +1,25 @@
+"""
+Django management command to recompute the category statistics store
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from categories.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute price range and rating stats for every category and subtree'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Threads aggregating category batches (0 runs inline)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Categories aggregated per query (default: 500)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            changed = rebuild_stats(workers=options['workers'],
+                                    batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Category stats rebuilt ({changed} categories changed)'))
@@ -0,0 +1,19 @@
+"""
+Django management command to repair drifted category product counts
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from categories.counts import reconcile_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute direct and subtree product counts for every category and fix drift'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = reconcile_counts()
+        if fixed:
+            self.stdout.write(self.style.WARNING(f'{fixed} categories had drifted counts'))
+        self.stdout.write(self.style.SUCCESS('✅ Category product counts are consistent'))
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:42
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    # Same walk as categories.models.rebuild_paths, against the historical model
+    Category = apps.get_model("categories", "Category")
+    children = {}
+    for pk, parent_id in Category.objects.values_list("pk", "parent_category_id"):
+        children.setdefault(parent_id, []).append(pk)
+    changed = []
+    pending = [(pk, "") for pk in children.get(None, [])]
+    while pending:
+        pk, parent_path = pending.pop()
+        path = f"{parent_path}{pk}/"
+        changed.append(Category(pk=pk, path=path, depth=path.count("/") - 1))
+        pending.extend((child, path) for child in children.get(pk, []))
+    Category.objects.bulk_update(changed, ["path", "depth"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("categories", "0002_category_image_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="depth",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=255
+            ),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
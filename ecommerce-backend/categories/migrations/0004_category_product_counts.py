@@ -0,0 +1,75 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:47
+
+from django.db import migrations, models
+
+
+def count_products(apps, schema_editor):
+    # Same totals as categories.counts.reconcile_counts, for the historical models
+    Category = apps.get_model("categories", "Category")
+    Product = apps.get_model("products", "Product")
+    rows = (
+        Product.objects.filter(category__isnull=False)
+        .values("category_id")
+        .annotate(
+            active=models.Count("pk", filter=models.Q(is_active=True)),
+            in_stock=models.Count(
+                "pk", filter=models.Q(is_active=True, quantity_in_stock__gt=0)
+            ),
+        )
+    )
+    direct = {row["category_id"]: (row["active"], row["in_stock"]) for row in rows}
+    categories = {category.pk: category for category in Category.objects.all()}
+    for category in categories.values():
+        active, in_stock = direct.get(category.pk, (0, 0))
+        category.product_count, category.in_stock_count = active, in_stock
+        for ancestor in filter(None, category.path.split("/")):
+            ancestor = categories.get(int(ancestor))
+            if ancestor is not None:
+                ancestor.tree_product_count += active
+                ancestor.tree_in_stock_count += in_stock
+    Category.objects.bulk_update(
+        categories.values(),
+        [
+            "product_count",
+            "in_stock_count",
+            "tree_product_count",
+            "tree_in_stock_count",
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("categories", "0003_category_path"),
+        ("products", "0006_product_trending"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="counts_updated_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="in_stock_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="product_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="tree_in_stock_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="tree_product_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
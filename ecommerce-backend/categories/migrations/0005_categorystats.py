@@ -0,0 +1,104 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_stats(apps, schema_editor):
+    # Same result as categories.stats.rebuild_stats, for the historical models
+    Category = apps.get_model("categories", "Category")
+    CategoryStats = apps.get_model("categories", "CategoryStats")
+    Product = apps.get_model("products", "Product")
+    rated = models.Q(review_count__gt=0)
+    rows = (
+        Product.objects.filter(is_active=True, category__isnull=False)
+        .order_by()
+        .values("category_id")
+        .annotate(
+            low=models.Min("effective_price"),
+            high=models.Max("effective_price"),
+            total=models.Sum("average_rating", filter=rated),
+            rated=models.Count("pk", filter=rated),
+        )
+    )
+    direct = {
+        row["category_id"]: (row["low"], row["high"], row["total"] or 0.0, row["rated"])
+        for row in rows
+    }
+    stats = {}
+    for pk, path in Category.objects.values_list("pk", "path"):
+        low, high, total, rated_count = direct.get(pk, (None, None, 0.0, 0))
+        stats.setdefault(pk, CategoryStats(category_id=pk))
+        stats[pk].min_price, stats[pk].max_price = low, high
+        stats[pk].rating_total, stats[pk].rated_count = total, rated_count
+        for ancestor in filter(None, path.split("/")):
+            row = stats.setdefault(
+                int(ancestor), CategoryStats(category_id=int(ancestor))
+            )
+            if low is not None:
+                if row.tree_min_price is None or low < row.tree_min_price:
+                    row.tree_min_price = low
+                if row.tree_max_price is None or high > row.tree_max_price:
+                    row.tree_max_price = high
+            row.tree_rating_total += total
+            row.tree_rated_count += rated_count
+    CategoryStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("categories", "0004_category_product_counts"),
+        ("products", "0006_product_trending"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryStats",
+            fields=[
+                (
+                    "category",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="categories.category",
+                    ),
+                ),
+                (
+                    "min_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "max_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                ("rating_total", models.FloatField(default=0.0)),
+                ("rated_count", models.PositiveIntegerField(default=0)),
+                (
+                    "tree_min_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "tree_max_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                ("tree_rating_total", models.FloatField(default=0.0)),
+                ("tree_rated_count", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "category stats",
+                "db_table": "category_stats",
+            },
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
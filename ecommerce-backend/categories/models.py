@@ -2,13 +2,32 @@
 Models for categories app
 """
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
 from django.utils.text import slugify
 from django.core.validators import FileExtensionValidator
 
+# Columns kept up to date by set-based writes rather than by save()
+MAINTAINED_FIELDS = [
+    'path', 'depth', 'product_count', 'in_stock_count', 'tree_product_count',
+    'tree_in_stock_count', 'counts_updated_at',
+]
+
 
 class Category(models.Model):
-    """Product category model with hierarchical structure"""
+    """
+    Product category model with hierarchical structure.
+
+    Besides the ``parent_category`` link each category stores its
+    materialized ``path`` (ancestor ids, root first, e.g. ``"1/4/9/"``) and
+    ``depth``, so a whole subtree is one indexed ``path LIKE '1/4/%'`` query.
+    ``save()`` keeps both up to date, including for the descendants of a
+    moved category; deleting a category cascades to its subtree. Writes that
+    bypass ``save()`` (``QuerySet.update``) need ``manage.py
+    rebuild_category_paths``.
+    """
     name = models.CharField(max_length=200, unique=True)
     slug = models.SlugField(unique=True, max_length=200)
     description = models.TextField(blank=True)
@@ -26,7 +45,18 @@ class Category(models.Model):
         validators=[FileExtensionValidator(
             allowed_extensions=['jpg', 'jpeg', 'png', 'gif'])]
     )
+    # Resized WebP copies of image (see ecommerce_project.images)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Active / active in-stock products, directly in this category and in its
+    # whole subtree (maintained by categories.counts)
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    in_stock_count = models.PositiveIntegerField(default=0, editable=False)
+    tree_product_count = models.PositiveIntegerField(default=0, editable=False)
+    tree_in_stock_count = models.PositiveIntegerField(default=0, editable=False)
+    counts_updated_at = models.DateTimeField(null=True, blank=True, editable=False)
     display_order = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -45,10 +75,127 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Never write back a possibly stale copy of the maintained columns
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in MAINTAINED_FIELDS
+            ]
+        with transaction.atomic(savepoint=False):
+            if not self._state.adding:
+                self.refresh_from_db(fields=MAINTAINED_FIELDS)
+            parent_path = self.parent_path()
+            if self.path and parent_path.startswith(self.path):
+                raise ValueError('A category cannot be moved under itself or its subcategories')
+            super().save(*args, **kwargs)
+            self.move_to(parent_path)
+
+    def parent_path(self):
+        """Current path of the parent category ('' for a root)"""
+        if self.parent_category_id is None:
+            return ''
+        return (Category.objects.filter(pk=self.parent_category_id)
+                .values_list('path', flat=True).get())
+
+    def move_to(self, parent_path):
+        """Store this category's path under ``parent_path`` and re-root its subtree"""
+        old_path = self.path
+        path = f'{parent_path}{self.pk}/'
+        if path == old_path:
+            return
+        depth = path.count('/') - 1
+        if old_path:
+            from .counts import move_subtree
+            move_subtree(self, old_path, path)
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (depth - self.depth),
+                updated_at=timezone.now(),
+            )
+        Category.objects.filter(pk=self.pk).update(path=path, depth=depth)
+        self.path, self.depth = path, depth
+        if old_path:
+            from .stats import ancestor_ids, refresh_stats
+            refresh_stats(rollup_ids=ancestor_ids(old_path)[:-1] + [self.pk])
+
+    def get_descendants(self, include_self=True):
+        """Categories in this subtree (one prefix query)"""
+        queryset = Category.objects.filter(path__startswith=self.path)
+        return queryset if include_self else queryset.exclude(pk=self.pk)
 
     def __str__(self):
         return self.name
 
     def get_absolute_url(self):
         return f'/categories/{self.slug}/'
+
+
+def rebuild_paths(using=None):
+    """
+    Recompute every path and depth from the parent links.
+
+    Returns (rows updated, categories unreachable from a root). Unreachable
+    categories sit on a parent cycle; they are given root paths so that
+    subtree queries stay well-defined.
+    """
+    manager = Category.objects.using(using)
+    categories = {pk: (parent_id, path, depth) for pk, parent_id, path, depth in
+                  manager.values_list('pk', 'parent_category_id', 'path', 'depth')}
+    children = {}
+    for pk, (parent_id, _, _) in categories.items():
+        children.setdefault(parent_id, []).append(pk)
+
+    paths = {}
+    pending = [(pk, '') for pk in children.get(None, [])]
+    while pending:
+        pk, parent_path = pending.pop()
+        paths[pk] = f'{parent_path}{pk}/'
+        pending.extend((child, paths[pk]) for child in children.get(pk, []))
+    detached = [pk for pk in categories if pk not in paths]
+    paths.update((pk, f'{pk}/') for pk in detached)
+
+    changed = [
+        Category(pk=pk, path=path, depth=path.count('/') - 1)
+        for pk, path in paths.items()
+        if (path, path.count('/') - 1) != categories[pk][1:]
+    ]
+    manager.bulk_update(changed, ['path', 'depth'], batch_size=1000)
+    return len(changed), len(detached)
+
+
+class CategoryStats(models.Model):
+    """
+    Aggregates over a category's active products, directly and including its
+    subcategories (maintained by categories.stats)
+    """
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Sum and number of average_rating over products that have reviews
+    rating_total = models.FloatField(default=0.0)
+    rated_count = models.PositiveIntegerField(default=0)
+    tree_min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    tree_max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    tree_rating_total = models.FloatField(default=0.0)
+    tree_rated_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'category_stats'
+        verbose_name_plural = 'category stats'
+
+    def __str__(self):
+        return f"Stats for category {self.category_id}"
+
+    @property
+    def average_rating(self):
+        return self.rating_total / self.rated_count if self.rated_count else None
+
+    @property
+    def tree_average_rating(self):
+        return self.tree_rating_total / self.tree_rated_count if self.tree_rated_count else None
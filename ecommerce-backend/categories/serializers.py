@@ -3,33 +3,96 @@ Serializers for categories app
 """
 
 from rest_framework import serializers
-from .models import Category
+from ecommerce_project.fieldsets import SparseFieldsetSerializerMixin
+from ecommerce_project.images import SrcsetField
+from .models import Category, CategoryStats
 
 
-class CategoryListSerializer(serializers.ModelSerializer):
-    """Serializer for category listing"""
+class CategorySummarySerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """Serializer for a category embedded in another resource"""
+    image_srcset = SrcsetField()
+
     class Meta:
         model = Category
-        fields = ['id', 'name', 'slug', 'image', 'is_active']
+        fields = ['id', 'name', 'slug', 'image', 'image_srcset', 'is_active']
         read_only_fields = ['id', 'slug']
+        field_sources = {'image_srcset': ('image', 'image_variants')}
+
+
+class CategoryListSerializer(CategorySummarySerializer):
+    """Serializer for category listing (product counts are stored columns)"""
+
+    class Meta(CategorySummarySerializer.Meta):
+        fields = CategorySummarySerializer.Meta.fields + [
+            'product_count', 'in_stock_count', 'tree_product_count', 'tree_in_stock_count',
+        ]
+        expandable_fields = {
+            'subcategories': lambda: CategoryListSerializer(many=True, read_only=True),
+        }
+
 
+class CategoryStatsSerializer(serializers.ModelSerializer):
+    """Price range, rating and stock of a category's active products"""
+    category = serializers.IntegerField(source='category_id', read_only=True)
+    direct = serializers.SerializerMethodField()
+    subtree = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CategoryStats
+        fields = ['category', 'direct', 'subtree', 'updated_at']
 
-class CategoryDetailSerializer(serializers.ModelSerializer):
+    def scope(self, low, high, average_rating, product_count, in_stock_count):
+        price = serializers.DecimalField(max_digits=10, decimal_places=2)
+        return {
+            'min_price': price.to_representation(low) if low is not None else None,
+            'max_price': price.to_representation(high) if high is not None else None,
+            'average_rating': round(average_rating, 2) if average_rating is not None else None,
+            'product_count': product_count,
+            'in_stock_count': in_stock_count,
+        }
+
+    def get_direct(self, obj):
+        category = obj.category
+        return self.scope(obj.min_price, obj.max_price, obj.average_rating,
+                          category.product_count, category.in_stock_count)
+
+    def get_subtree(self, obj):
+        category = obj.category
+        return self.scope(obj.tree_min_price, obj.tree_max_price, obj.tree_average_rating,
+                          category.tree_product_count, category.tree_in_stock_count)
+
+
+def category_stats(category):
+    """Stored stats of a category (empty until a product write or rebuild reaches it)"""
+    stats = CategoryStats.objects.filter(category=category).first()
+    if stats is None:
+        stats = CategoryStats(category=category)
+    stats.category = category
+    return stats
+
+
+class CategoryDetailSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for category details"""
     subcategories = CategoryListSerializer(many=True, read_only=True)
-    product_count = serializers.SerializerMethodField()
+    stats = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
         fields = [
             'id', 'name', 'slug', 'description', 'image',
-            'parent_category', 'subcategories', 'product_count',
+            'parent_category', 'subcategories', 'product_count', 'in_stock_count',
+            'tree_product_count', 'tree_in_stock_count', 'stats',
             'is_active', 'display_order', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'slug', 'created_at', 'updated_at']
+        field_sources = {
+            'stats': ('product_count', 'in_stock_count', 'tree_product_count',
+                      'tree_in_stock_count'),
+        }
 
-    def get_product_count(self, obj):
-        return obj.products.filter(is_active=True).count()
+    def get_stats(self, obj):
+        data = CategoryStatsSerializer(category_stats(obj)).data
+        return {'direct': data['direct'], 'subtree': data['subtree']}
 
 
 class CategoryCreateUpdateSerializer(serializers.ModelSerializer):
@@ -38,3 +101,10 @@ class CategoryCreateUpdateSerializer(serializers.ModelSerializer):
         model = Category
         fields = ['name', 'description', 'parent_category',
                   'image', 'is_active', 'display_order']
+
+    def validate_parent_category(self, value):
+        if (value is not None and self.instance is not None and self.instance.path
+                and value.path.startswith(self.instance.path)):
+            raise serializers.ValidationError(
+                'A category cannot be moved under itself or its subcategories.')
+        return value
@@ -0,0 +1,30 @@
+"""
+Signal handlers for categories app
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .counts import detach
+from .models import Category
+from .stats import ancestor_ids, refresh_stats
+from .tree import get_category_tree
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_tree_changed(sender, instance, **kwargs):
+    transaction.on_commit(get_category_tree().invalidate)
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleted(sender, instance, using=None, **kwargs):
+    # Its products are detached (SET NULL) and its subcategories deleted with
+    # it, each taking its own products out of the totals above
+    detach(instance.pk, using=using)
+
+
+@receiver(post_delete, sender=Category)
+def category_stats_removed(sender, instance, using=None, **kwargs):
+    refresh_stats(rollup_ids=ancestor_ids(instance.path)[:-1], using=using)
@@ -0,0 +1,231 @@
+"""
+Aggregate statistics store for categories app
+
+``CategoryStats`` keeps the effective price range and rating of every
+category's active products, directly and for its whole subtree (the in-stock
+counts live on ``Category``, see categories.counts). A product write applies
+its difference to the stored direct stats of the categories it touched
+(``apply_stats_changes``): the rating sum and rated count move by deltas and
+a new price widens the range. Only when a product leaves with the current
+minimum or maximum price is that category's range re-aggregated. Subtree
+stats are then rolled up the materialized path from the stored rows of the
+children; no write scans a whole subtree. Each write first locks the stats
+rows of the categories it touches and all their ancestors (``lock``), so
+concurrent writes under a common ancestor apply one after the other instead
+of overwriting each other's read-modify-write. ``manage.py rebuild_category_stats``
+recomputes everything with the aggregation spread over worker threads.
+"""
+
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.db import connections, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+
+from .models import Category, CategoryStats
+
+DIRECT_COLUMNS = ('min_price', 'max_price', 'rating_total', 'rated_count')
+TREE_COLUMNS = tuple(f'tree_{name}' for name in DIRECT_COLUMNS)
+EMPTY = (None, None, 0.0, 0)
+
+
+def ancestor_ids(path):
+    return [int(pk) for pk in path.split('/') if pk]
+
+
+def aggregate(category_ids, using=None):
+    """Direct stats {category_id: (min, max, rating total, rated)} from one GROUP BY"""
+    Product = apps.get_model('products', 'Product')
+    rated = Q(review_count__gt=0)
+    rows = (Product.objects.using(using)
+            .filter(category_id__in=category_ids, is_active=True)
+            .order_by().values('category_id')
+            .annotate(low=Min('effective_price'), high=Max('effective_price'),
+                      total=Sum('average_rating', filter=rated),
+                      rated=Count('pk', filter=rated)))
+    return {row['category_id']: (row['low'], row['high'], row['total'] or 0.0, row['rated'])
+            for row in rows}
+
+
+def price_ranges(category_ids, using=None):
+    """{category_id: (min, max)} effective price of active products, from one GROUP BY"""
+    Product = apps.get_model('products', 'Product')
+    rows = (Product.objects.using(using)
+            .filter(category_id__in=category_ids, is_active=True)
+            .order_by().values('category_id')
+            .annotate(low=Min('effective_price'), high=Max('effective_price')))
+    return {row['category_id']: (row['low'], row['high']) for row in rows}
+
+
+def merge(*stats):
+    lows = [low for low, _, _, _ in stats if low is not None]
+    highs = [high for _, high, _, _ in stats if high is not None]
+    return (min(lows) if lows else None, max(highs) if highs else None,
+            sum(total for _, _, total, _ in stats), sum(rated for _, _, _, rated in stats))
+
+
+def stored(values):
+    """Stats tuple from stats columns read through a LEFT JOIN (NULL when missing)"""
+    low, high, total, rated = values
+    return low, high, total or 0.0, rated or 0
+
+
+def rollup(ids, fresh, using=None):
+    """
+    Changed (direct + subtree) stats rows for the categories in ``ids``.
+
+    ``ids`` must hold every ancestor of its members (``None`` for all
+    categories); ``fresh`` overrides stored direct stats.
+    """
+    categories = Category.objects.using(using)
+    if ids is not None:
+        categories = categories.filter(Q(pk__in=ids) | Q(parent_category_id__in=ids))
+    nodes = categories.values_list(
+        'pk', 'parent_category_id', 'depth',
+        *(f'stats__{name}' for name in DIRECT_COLUMNS + TREE_COLUMNS))
+
+    direct, tree, before, depths = {}, {}, {}, {}
+    children = defaultdict(list)
+    for pk, parent_id, depth, *values in nodes:
+        before[pk] = stored(values[:4]) + stored(values[4:])
+        direct[pk] = fresh.get(pk, before[pk][:4])
+        tree[pk] = before[pk][4:]
+        depths[pk] = depth
+        children[parent_id].append(pk)
+
+    targets = set(depths) if ids is None else set(ids) & set(depths)
+    changed = {}
+    for pk in sorted(targets, key=depths.get, reverse=True):
+        tree[pk] = merge(direct[pk], *(tree[child] for child in children[pk]))
+        if direct[pk] + tree[pk] != before[pk]:
+            changed[pk] = direct[pk] + tree[pk]
+    return changed
+
+
+def write(rows, using=None):
+    """Upsert {category_id: direct + subtree stats} into CategoryStats"""
+    CategoryStats.objects.using(using).bulk_create(
+        [CategoryStats(category_id=pk, **dict(zip(DIRECT_COLUMNS + TREE_COLUMNS, values)))
+         for pk, values in rows.items()],
+        update_conflicts=True,
+        unique_fields=['category'],
+        update_fields=[*DIRECT_COLUMNS, *TREE_COLUMNS, 'updated_at'],
+        batch_size=1000,
+    )
+
+
+def refresh_stats(direct_ids=(), rollup_ids=(), using=None):
+    """
+    Re-aggregate the direct stats of ``direct_ids`` and roll subtree stats up
+    from them and from ``rollup_ids`` to their roots.
+    """
+    direct_ids = set(direct_ids)
+    fresh = dict.fromkeys(direct_ids, EMPTY)
+    if direct_ids:
+        fresh.update(aggregate(direct_ids, using=using))
+    roll_up(fresh, rollup_ids, using=using)
+
+
+def lock(category_ids, using=None):
+    """
+    Lock the stats rows of ``category_ids`` and all their ancestors, in
+    primary key order, and return {category_id: stored direct stats}.
+
+    Missing rows are created first so that every row can be locked.
+    """
+    ids = set()
+    for path in (Category.objects.using(using).filter(pk__in=category_ids)
+                 .values_list('path', flat=True)):
+        ids.update(ancestor_ids(path))
+    if not ids:
+        return {}
+    stats = CategoryStats.objects.using(using)
+    stats.bulk_create([CategoryStats(category_id=pk) for pk in ids], ignore_conflicts=True)
+    return {pk: stored(values) for pk, *values in
+            stats.select_for_update().filter(category_id__in=ids)
+            .order_by('category_id').values_list('category_id', *DIRECT_COLUMNS)}
+
+
+def roll_up(fresh, rollup_ids=(), using=None):
+    """Store ``fresh`` direct stats and roll subtree stats up to the roots"""
+    start = set(fresh) | set(rollup_ids)
+    if not start:
+        return
+    with transaction.atomic(using=using, savepoint=False):
+        write(rollup(set(lock(start, using=using)), fresh, using=using), using=using)
+
+
+def apply_stats_changes(removed, added, using=None):
+    """
+    Apply products leaving and joining categories' stats, each given as
+    ``(category_id, effective_price, average_rating, rated)``, without
+    re-aggregating unless a current extreme price left.
+    """
+    category_ids = {key[0] for key in (*removed, *added)}
+    if not category_ids:
+        return
+    with transaction.atomic(using=using, savepoint=False):
+        locked = lock(category_ids, using=using)
+        direct = {pk: list(locked.get(pk, EMPTY)) for pk in category_ids}
+        _apply(direct, removed, added, using=using)
+        write(rollup(set(locked), {pk: tuple(values) for pk, values in direct.items()},
+                     using=using), using=using)
+
+
+def _apply(direct, removed, added, using=None):
+    """Move locked direct stats ({category_id: [min, max, total, rated]}) in place"""
+    # A price leaving and joining the same category (e.g. a rating change)
+    # leaves the range as it was
+    readded = Counter((category_id, price) for category_id, price, _, _ in added)
+    stale = set()
+    for category_id, price, rating, rated in removed:
+        values = direct[category_id]
+        if rated:
+            values[2] -= rating
+            values[3] -= 1
+        if readded[category_id, price]:
+            readded[category_id, price] -= 1
+        elif price in values[:2]:
+            stale.add(category_id)
+    for category_id, price, rating, rated in added:
+        values = direct[category_id]
+        values[:2] = merge((*values[:2], 0.0, 0), (price, price, 0.0, 0))[:2]
+        if rated:
+            values[2] += rating
+            values[3] += 1
+
+    if stale:
+        ranges = price_ranges(stale, using=using)
+        for category_id in stale:
+            direct[category_id][:2] = ranges.get(category_id, (None, None))
+    for values in direct.values():
+        if not values[3]:
+            # Drop float residue once nothing is rated
+            values[2] = 0.0
+
+
+def _aggregate_batch(category_ids, using):
+    try:
+        return aggregate(category_ids, using=using)
+    finally:
+        # Worker threads have their own connections
+        connections.close_all()
+
+
+def rebuild_stats(workers=4, batch_size=500, using=None):
+    """Recompute every category's stats; returns the rows that changed"""
+    ids = list(Category.objects.using(using).order_by('pk').values_list('pk', flat=True))
+    batches = [ids[start:start + batch_size] for start in range(0, len(ids), batch_size)]
+    fresh = dict.fromkeys(ids, EMPTY)
+    if workers > 0:
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix='category-stats') as pool:
+            for result in pool.map(_aggregate_batch, batches, [using] * len(batches)):
+                fresh.update(result)
+    else:
+        for batch in batches:
+            fresh.update(aggregate(batch, using=using))
+    changed = rollup(None, fresh, using=using)
+    write(changed, using=using)
+    return len(changed)
@@ -0,0 +1,120 @@
+"""
+Cached category tree for categories app
+
+``GET /api/categories/tree/`` loads every active category in one query,
+assembles the nested tree in memory and keeps the rendered JSON per
+``?depth=`` and host. Like the product detail cache, the cache remembers the
+fingerprint (latest ``updated_at`` and row count of the categories table) it
+was built from, so writes made by other workers are noticed on the next
+request; local writes drop it as soon as they commit (categories.signals).
+"""
+
+import threading
+
+from django.db.models import Count, Max
+from rest_framework.renderers import JSONRenderer
+
+from ecommerce_project.images import srcset
+from .models import Category
+
+# Rendered variants kept per tree (depth limits x hosts)
+MAX_RENDERED = 64
+
+
+def tree_fingerprint():
+    """(parts, last_modified) describing the current state of every category"""
+    row = Category.objects.aggregate(updated=Max('updated_at'), count=Count('pk'))
+    return tuple(row.values()), row['updated']
+
+
+def build_tree():
+    """Nested list of active categories, in display order, from a single query"""
+    rows = list(Category.objects.filter(is_active=True)
+                .order_by('display_order', 'name')
+                .values('id', 'name', 'slug', 'image', 'image_variants', 'parent_category_id'))
+    nodes = {row['id']: dict(row, children=[]) for row in rows}
+    roots = []
+    for node in nodes.values():
+        parent_id = node.pop('parent_category_id')
+        if parent_id is None:
+            roots.append(node)
+        elif parent_id in nodes:
+            nodes[parent_id]['children'].append(node)
+        # else: under an inactive category, so hidden with it
+    return roots
+
+
+def present(nodes, depth, request):
+    """Request-ready copy of ``nodes`` cut to ``depth`` levels (None for all)"""
+    storage = Category._meta.get_field('image').storage
+    children_depth = None if depth is None else depth - 1
+    items = []
+    for node in nodes:
+        name = node['image']
+        items.append({
+            'id': node['id'],
+            'name': node['name'],
+            'slug': node['slug'],
+            'image': request.build_absolute_uri(storage.url(name)) if name else None,
+            'image_srcset': srcset(node['image_variants'], name, storage, request),
+            'has_children': bool(node['children']),
+            'children': (present(node['children'], children_depth, request)
+                         if children_depth != 0 else []),
+        })
+    return items
+
+
+class CategoryTreeCache:
+    """Process-wide category tree and its rendered JSON"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.invalidate()
+
+    def invalidate(self):
+        with self.lock:
+            self.fingerprint = None
+            self.tree = None
+            self.rendered = {}
+
+    def render(self, fingerprint, depth, request):
+        """JSON bytes of the tree for ``fingerprint``, cut to ``depth`` levels"""
+        key = (depth, request.build_absolute_uri('/'))
+        with self.lock:
+            if fingerprint != self.fingerprint:
+                self.fingerprint, self.tree, self.rendered = None, None, {}
+            body = self.rendered.get(key)
+            tree = self.tree
+        if body is not None:
+            return body
+
+        if tree is None:
+            tree = build_tree()
+        body = JSONRenderer().render(present(tree, depth, request))
+        with self.lock:
+            if self.fingerprint in (None, fingerprint):
+                self.fingerprint, self.tree = fingerprint, tree
+                if len(self.rendered) >= MAX_RENDERED:
+                    self.rendered.clear()
+                self.rendered[key] = body
+        return body
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_category_tree():
+    """Return the process-wide category tree cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CategoryTreeCache()
+        return _cache
+
+
+def reset_category_tree():
+    """Drop the process-wide cache (used by tests)"""
+    global _cache
+    with _cache_lock:
+        _cache = None
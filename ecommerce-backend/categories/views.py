@@ -2,19 +2,30 @@
 Views/ViewSets for categories app
 """
 
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, status
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from django.db.models import Count, Max
+from django.http import HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
+from ecommerce_project.conditional import ConditionalGetMixin, latest
+from ecommerce_project.fieldsets import SparseFieldsetMixin
+from ecommerce_project.query_shapes import QueryShapeMixin
 from .models import Category
+from .tree import get_category_tree, tree_fingerprint
 from .serializers import (
     CategoryListSerializer,
     CategoryDetailSerializer,
-    CategoryCreateUpdateSerializer
+    CategoryCreateUpdateSerializer,
+    CategoryStatsSerializer,
+    category_stats,
 )
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
-    """ViewSet for category CRUD operations"""
+class CategoryViewSet(QueryShapeMixin, SparseFieldsetMixin, ConditionalGetMixin,
+                      viewsets.ModelViewSet):
+    """ViewSet for category CRUD operations (with ETag / Last-Modified and ?fields=)"""
     queryset = Category.objects.filter(is_active=True)
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend,
@@ -35,4 +46,53 @@ class CategoryViewSet(viewsets.ModelViewSet):
         # Include inactive categories for staff
         if self.request.user and self.request.user.is_staff:
             queryset = Category.objects.all()
-        return queryset
+        return self.optimize_queryset(queryset)
+
+    def get_detail_fingerprint(self):
+        row = (self.get_queryset()
+               .filter(pk=self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+               .annotate(
+                   subcategories_updated=Max('subcategories__updated_at'),
+                   subcategories_counted=Max('subcategories__counts_updated_at'),
+                   subcategory_count=Count('subcategories'))
+               .values('updated_at', 'counts_updated_at', 'stats__updated_at',
+                       'subcategories_updated', 'subcategories_counted', 'subcategory_count')
+               .first())
+        if row is None:
+            return None
+        return tuple(row.values()), latest(
+            row['updated_at'], row['counts_updated_at'], row['stats__updated_at'],
+            row['subcategories_updated'], row['subcategories_counted'])
+
+    def get_list_fingerprint(self, queryset):
+        if self.get_fieldset()[1]:
+            # Expanded subcategories are validated from the rendered page
+            return None
+        row = queryset.order_by().aggregate(updated=Max('updated_at'), count=Count('pk'),
+                                            counted=Max('counts_updated_at'))
+        # No timestamp moves when a category is deleted, so lists carry only the ETag
+        return tuple(row.values()), None
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Price range, average rating and stock of the category and its subtree"""
+        category = self.get_object()
+        return self.conditional_response(
+            self.get_detail_fingerprint(),
+            render=lambda: Response(CategoryStatsSerializer(category_stats(category)).data))
+
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """Nested tree of all active categories (?depth= limits the levels)"""
+        depth = request.query_params.get('depth')
+        if depth is not None:
+            if not depth.isdigit() or int(depth) < 1:
+                return Response(
+                    {'error': 'depth must be a positive integer'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            depth = int(depth)
+        fingerprint = tree_fingerprint()
+        return self.conditional_response(fingerprint, render=lambda: HttpResponse(
+            get_category_tree().render(fingerprint[0], depth, request),
+            content_type='application/json'))
@@ -10,6 +10,44 @@ from products.models import Product
 User = get_user_model()
 
 
+@pytest.fixture(autouse=True)
+def isolated_product_indexes(settings, tmp_path):
+    """Give each test its own empty in-process product indexes and caches"""
+    from products.indexing import reset_indexes
+    from products.leaderboards import reset_leaderboards
+    from products.counters import reset_sales_counter
+    from products.detail_cache import reset_detail_cache
+    from ecommerce_project.query_shapes import reset_query_shape_recorder
+    from categories.tree import reset_category_tree
+    settings.SEARCH_INDEX_PATH = str(tmp_path / 'search_index.pickle')
+    settings.QUERY_SHAPE_LOG = str(tmp_path / 'query_shapes.jsonl')
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    settings.IMAGE_VARIANT_WORKERS = 0
+    settings.PRODUCT_CHANGES_SETTLE_SECONDS = 0
+    settings.SALES_COUNTER_FLUSH_INTERVAL = 3600
+    reset_indexes()
+    reset_leaderboards()
+    reset_sales_counter()
+    reset_detail_cache()
+    reset_query_shape_recorder()
+    reset_category_tree()
+    yield
+    reset_indexes()
+    reset_leaderboards()
+    reset_sales_counter()
+    reset_detail_cache()
+    reset_query_shape_recorder()
+    reset_category_tree()
+
+
+@pytest.fixture(autouse=True)
+def reset_throttles():
+    """Clear the cache backing DRF's rate limits so tests do not hit them"""
+    from django.core.cache import cache
+    cache.clear()
+    yield
+
+
 @pytest.fixture
 def create_user(db):
     """Fixture to create a test user"""
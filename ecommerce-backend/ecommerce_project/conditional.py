@@ -0,0 +1,119 @@
+"""
+Conditional GET support for DRF viewsets
+"""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    """
+    Answer ``If-None-Match`` / ``If-Modified-Since`` with 304 before serializing.
+
+    Viewsets describe the current version of a resource with a cheap
+    fingerprint query: ``get_detail_fingerprint()`` and
+    ``get_list_fingerprint(queryset)`` return ``(parts, last_modified)``,
+    where ``parts`` is any repr-able value that changes whenever the rendered
+    response would, or ``None`` to skip conditional handling.
+
+    The list fingerprint aggregates the whole filtered set, so it only runs
+    for requests carrying a validator; plain requests are tagged with a
+    digest of the rendered page. A client holding a page digest is still
+    answered with a 304 when the page renders the same, and is handed the
+    fingerprint ETag to send next time.
+    """
+
+    def get_detail_fingerprint(self):
+        return None
+
+    def get_list_fingerprint(self, queryset):
+        return None
+
+    def get_etag(self, parts):
+        request = self.request
+        # The query string selects filters, pages and fields, so it is part
+        # of the representation
+        key = (
+            parts,
+            getattr(request.accepted_renderer, 'format', None),
+            bool(request.user and request.user.is_staff),
+            request.get_full_path(),
+        )
+        digest = hashlib.md5(repr(key).encode(), usedforsecurity=False).hexdigest()
+        return quote_etag(digest)
+
+    def conditional_response(self, fingerprint, render):
+        """Return a 304 if the client's copy is current, else render() with validators"""
+        if fingerprint is None or self.request.method not in ('GET', 'HEAD'):
+            return render()
+
+        parts, last_modified = fingerprint
+        etag = self.get_etag(parts)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = render()
+        if response.status_code in (200, 304):
+            self.set_validators(response, etag, timestamp)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_detail_fingerprint(),
+            render=lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if request.method not in ('GET', 'HEAD'):
+            return self.list_response(queryset)
+
+        conditional = ('HTTP_IF_NONE_MATCH' in request.META
+                       or 'HTTP_IF_MODIFIED_SINCE' in request.META)
+        fingerprint = self.get_list_fingerprint(queryset) if conditional else None
+        etag = timestamp = None
+        if fingerprint is not None:
+            parts, last_modified = fingerprint
+            etag = self.get_etag(parts)
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp)
+            if response is not None:
+                return self.set_validators(response, etag, timestamp)
+
+        response = self.list_response(queryset)
+        if response.status_code != 200:
+            return response
+        page_etag = self.get_etag(response.data)
+        if conditional:
+            # The client may hold the page digest handed out without a validator
+            not_modified = get_conditional_response(request, etag=page_etag)
+            if not_modified is not None:
+                response = not_modified
+        return self.set_validators(response, etag or page_etag, timestamp)
+
+    def set_validators(self, response, etag, timestamp):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list_response(self, queryset):
+        """Paginated, serialized response for an already filtered queryset"""
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+
+def latest(*values):
+    """Most recent of several optional datetimes"""
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
@@ -0,0 +1,149 @@
+"""
+Sparse fieldsets (``?fields=`` / ``?expand=``) for DRF viewsets
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_QUERY_PARAM = 'fields'
+EXPAND_QUERY_PARAM = 'expand'
+
+
+def parse_field_list(value):
+    """Split a comma separated query parameter; ``None`` when it is absent"""
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Trim a top-level serializer to ``context['fields']``.
+
+    Fields listed in ``Meta.expandable_fields`` (name -> field factory) are
+    only rendered when named in ``context['expand']``. ``Meta.field_sources``
+    maps computed fields to the model fields they read, so that views can
+    load only the columns and relations the response needs.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_top_level():
+            return fields
+
+        expand = self.context.get('expand') or ()
+        for name, factory in getattr(self.Meta, 'expandable_fields', {}).items():
+            if name in expand:
+                fields[name] = factory()
+
+        requested = self.context.get('fields')
+        if requested:
+            for name in list(fields):
+                if name not in requested and name not in expand:
+                    del fields[name]
+        return fields
+
+    def is_top_level(self):
+        # Nested uses (e.g. a category inside a product) always render in full
+        parent = getattr(self, 'parent', None)
+        return parent is None or (
+            isinstance(parent, serializers.ListSerializer)
+            and getattr(parent, 'parent', None) is None)
+
+
+def queryset_plan(serializer):
+    """
+    Work out what a queryset must load to render ``serializer``.
+
+    Returns ``(columns, select_related, prefetch_related)``; ``columns`` is
+    ``None`` when some field reads data the plan cannot account for.
+    """
+    meta = serializer.Meta
+    opts = meta.model._meta
+    sources = getattr(meta, 'field_sources', {})
+    columns = {opts.pk.name}
+    select = set()
+    prefetch = set()
+    complete = True
+
+    for name, field in serializer.fields.items():
+        paths = sources[name] if name in sources else [field.source]
+        for path in paths:
+            attr = path.split('.')[0]
+            try:
+                model_field = opts.get_field(attr)
+            except FieldDoesNotExist:
+                complete = False
+                continue
+            if model_field.many_to_many or model_field.one_to_many:
+                prefetch.add(attr)
+            elif model_field.is_relation:
+                columns.add(attr)
+                if '.' in path or isinstance(field, serializers.BaseSerializer):
+                    select.add(attr)
+            else:
+                columns.add(attr)
+
+    return (columns if complete else None), select, prefetch
+
+
+class SparseFieldsetMixin:
+    """
+    Let clients pick response fields with ``?fields=a,b`` and opt in to
+    expandable fields with ``?expand=x``.
+
+    ``optimize_queryset()`` then restricts the queryset to the columns,
+    ``select_related`` and ``prefetch_related`` the serializer will read.
+    """
+
+    def get_fieldset(self):
+        """Return (requested fields or None, expanded fields) for this request"""
+        if not hasattr(self, '_fieldset'):
+            params = self.request.query_params if self.request is not None else {}
+            self._fieldset = (
+                parse_field_list(params.get(FIELDS_QUERY_PARAM)),
+                set(parse_field_list(params.get(EXPAND_QUERY_PARAM)) or ()),
+            )
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self.get_fieldset()
+        return context
+
+    def trim_fields(self, data):
+        """Apply ?fields= to an already serialized dict"""
+        fields, expand = self.get_fieldset()
+        if not fields:
+            return data
+        return {name: value for name, value in data.items()
+                if name in fields or name in expand}
+
+    def optimize_queryset(self, queryset, sparse=True):
+        """
+        Load only what the serializer for this action renders.
+
+        Writes keep full instances, since saving a deferred instance only
+        writes the loaded fields. With ``sparse=False`` the plan ignores
+        ``?fields=`` (for responses that are cached in full).
+        """
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return queryset
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, SparseFieldsetSerializerMixin):
+            return queryset
+
+        context = self.get_serializer_context()
+        if not sparse:
+            context = dict(context, fields=None, expand=())
+        columns, select, prefetch = queryset_plan(serializer_class(context=context))
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if columns is not None:
+            queryset = queryset.only(*columns)
+        return queryset
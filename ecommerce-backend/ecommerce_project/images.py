@@ -0,0 +1,206 @@
+"""
+Responsive image variants for uploaded images
+
+``track_image_variants(Model, 'image')`` watches an image field. Once a save
+that changed the image commits, a worker pool of ``IMAGE_VARIANT_WORKERS``
+threads writes WebP copies of the upload at each of ``IMAGE_VARIANT_WIDTHS``
+next to the original (``products/mouse.jpg`` -> ``products/mouse_320w.webp``)
+and records them in the model's ``<field>_variants`` JSON column as
+``{"source": <original name>, "widths": {"320": <variant name>, ...}}``.
+Requests never wait for resizing; ``srcset()`` only renders variants made from
+the current original, so a replaced image falls back to the upload alone
+until its variants are ready.
+"""
+
+import logging
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+_tracked = defaultdict(list)
+
+
+def variants_field(field_name):
+    """Name of the JSON column holding the variants of an image field"""
+    return f'{field_name}_variants'
+
+
+def srcset(variants, name, storage, request=None):
+    """Map of ``"<width>w"`` to variant URL, empty until variants of ``name`` exist"""
+    if not name or not variants or variants.get('source') != name:
+        return {}
+    urls = {}
+    for width, path in sorted(variants['widths'].items(), key=lambda item: int(item[0])):
+        url = storage.url(path)
+        urls[f'{width}w'] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def absolute_srcset(urls, request):
+    """Make a serialized srcset map absolute, like a request-bound serializer"""
+    return {width: request.build_absolute_uri(url) for width, url in (urls or {}).items()}
+
+
+class SrcsetField(serializers.Field):
+    """Read-only ``{"<width>w": url}`` map of an image field's variants"""
+
+    def __init__(self, image_field='image', **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+        self.image_field = image_field
+
+    def to_representation(self, instance):
+        file = getattr(instance, self.image_field)
+        return srcset(getattr(instance, variants_field(self.image_field)), file.name,
+                      file.storage, self.context.get('request'))
+
+
+def render_variants(image, storage, stem):
+    """Write a WebP copy of ``image`` per configured width; returns {width: name}"""
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    # Never upscale: images narrower than every width get one full-size copy
+    widths = [width for width in settings.IMAGE_VARIANT_WIDTHS if width < image.width]
+    widths = widths or [image.width]
+
+    names = {}
+    for width in sorted(widths, reverse=True):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize(
+            (width, height), Image.LANCZOS, reducing_gap=2.0)
+        buffer = BytesIO()
+        resized.save(buffer, 'WEBP', quality=settings.IMAGE_VARIANT_QUALITY, method=4)
+        name = f'{stem}_{width}w.webp'
+        if storage.exists(name):
+            storage.delete(name)
+        names[str(width)] = storage.save(name, ContentFile(buffer.getvalue()))
+    return names
+
+
+def generate_variants(model, pk, field_name, force=False):
+    """
+    Build and record the variants of one row's image (even when they are
+    already up to date with ``force``).
+
+    Returns the recorded variants, or ``None`` when the row is gone, the
+    image cannot be read, or it was replaced while the variants were made.
+    """
+    attr = variants_field(field_name)
+    instance = model._default_manager.filter(pk=pk).only(field_name, attr).first()
+    if instance is None:
+        return None
+    file = getattr(instance, field_name)
+    previous = getattr(instance, attr) or {}
+    storage = file.storage
+
+    if not force and file.name and previous.get('source') == file.name:
+        return previous
+
+    widths = {}
+    if file.name:
+        try:
+            with storage.open(file.name) as fh:
+                image = ImageOps.exif_transpose(Image.open(fh))
+                image.load()
+        except (OSError, Image.DecompressionBombError) as exc:
+            logger.warning('Cannot build variants of %s: %s', file.name, exc)
+            return None
+        widths = render_variants(image, storage, os.path.splitext(file.name)[0])
+
+    variants = {'source': file.name, 'widths': widths} if file.name else {}
+    values = {attr: variants}
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        # Bump validators so ETags and cached payloads pick up the new srcset
+        values['updated_at'] = timezone.now()
+    unchanged = Q(**{field_name: file.name}) if file.name else (
+        Q(**{field_name: ''}) | Q(**{f'{field_name}__isnull': True}))
+    if not model._default_manager.filter(unchanged, pk=pk).update(**values):
+        _delete_files(storage, widths.values())
+        return None
+
+    _delete_files(storage, set(previous.get('widths', {}).values()) - set(widths.values()))
+    return variants
+
+
+def _delete_files(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning('Cannot delete stale image variant %s', name)
+
+
+def _run(model, pk, field_name):
+    try:
+        generate_variants(model, pk, field_name)
+    except Exception:
+        logger.exception('Image variants failed for %s %s', model._meta.label, pk)
+    finally:
+        connections.close_all()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide variant worker pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix='image-variants')
+        return _executor
+
+
+def schedule_variants(model, pk, field_name):
+    """Queue variant generation (inline when IMAGE_VARIANT_WORKERS is 0)"""
+    if settings.IMAGE_VARIANT_WORKERS <= 0:
+        return generate_variants(model, pk, field_name)
+    return get_executor().submit(_run, model, pk, field_name)
+
+
+def _image_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    deferred = instance.get_deferred_fields()
+    for field_name in _tracked[sender]:
+        if field_name in deferred or (update_fields is not None and field_name not in update_fields):
+            continue
+        name = getattr(instance, field_name).name or None
+        attr = variants_field(field_name)
+        source = None if attr in deferred else (getattr(instance, attr) or {}).get('source')
+        if name != source:
+            transaction.on_commit(
+                lambda pk=instance.pk, field_name=field_name: schedule_variants(
+                    sender, pk, field_name))
+
+
+def track_image_variants(model, field_name):
+    """Generate variants of ``model.<field_name>`` whenever a new image is saved"""
+    if field_name not in _tracked[model]:
+        _tracked[model].append(field_name)
+    post_save.connect(_image_saved, sender=model, dispatch_uid=f'image-variants-{model._meta.label}')
+
+
+def tracked_image_fields():
+    """Yield (model, field name) for every tracked image field"""
+    for model, field_names in _tracked.items():
+        for field_name in field_names:
+            yield model, field_name
@@ -2,9 +2,19 @@
 Pagination classes for DRF
 """
 
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.response import Response
+import base64
+import binascii
+import json
 from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
@@ -26,3 +36,212 @@ class CustomPagination(PageNumberPagination):
             ('current_page', self.page.number),
             ('results', data)
         ]))
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination that never runs COUNT(*) or OFFSET.
+
+    The ordering already applied to the queryset (e.g. by OrderingFilter) is
+    extended with ``id`` as a tie-breaker, and each page continues strictly
+    after the last row of the previous one, so page cost does not depend on
+    how deep the client has paged.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    tie_breaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+
+        cursor = self.decode_cursor(request, queryset.model)
+        self.reverse = bool(cursor and cursor['r'])
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [(name, not desc) for name, desc in ordering]
+
+        queryset = queryset.order_by(
+            *[('-' if desc else '') + name for name, desc in ordering])
+        if cursor:
+            queryset = queryset.filter(
+                self.build_keyset_filter(ordering, cursor['p']))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if self.reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+            if size > 0:
+                return min(size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        """Return the queryset ordering as (field, descending) pairs plus the tie-breaker"""
+        order_by = queryset.query.order_by or queryset.model._meta.ordering
+        opts = queryset.model._meta
+        ordering = []
+        for item in order_by:
+            if not isinstance(item, str):
+                raise NotFound('Cursor pagination requires field-based ordering')
+            desc = item.startswith('-')
+            name = item.lstrip('-')
+            if name == 'pk':
+                name = opts.pk.name
+            if name == self.tie_breaker:
+                break
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                raise NotFound('Cursor pagination requires field-based ordering')
+            ordering.append((field.attname, desc))
+
+        tie_desc = ordering[0][1] if ordering else False
+        ordering.append((self.tie_breaker, tie_desc))
+        return ordering
+
+    def build_keyset_filter(self, ordering, position):
+        """
+        Build a lexicographic "row comes after position" condition.
+
+        The leading ``<=``/``>=`` term lets the database range-scan an index
+        on the first ordering column instead of evaluating the OR per row.
+        """
+        condition = Q()
+        equal = Q()
+        for (name, desc), value in zip(ordering, position):
+            lookup = 'lt' if desc else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        first_name, first_desc = ordering[0]
+        first_value = position[0]
+        leading = Q(**{f'{first_name}__{"lte" if first_desc else "gte"}': first_value})
+        return leading & condition
+
+    def get_position(self, obj, ordering=None):
+        # Rows may be model instances or .values() dicts
+        get = obj.__getitem__ if isinstance(obj, dict) else obj.__getattribute__
+        return [self.encode_value(get(name)) for name, _ in (ordering or self.ordering)]
+
+    def encode_value(self, value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def encode_cursor(self, position, reverse=False):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(
+            remove_query_param(self.base_url, 'page'),
+            self.cursor_query_param,
+            encoded
+        )
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            position = payload['p']
+            reverse = bool(payload.get('r'))
+            if not isinstance(position, list):
+                raise TypeError
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        ordering = self.ordering
+        if len(position) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        opts = model._meta
+        try:
+            position = [self.get_model_field(opts, name).to_python(value)
+                        for (name, _), value in zip(ordering, position)]
+        except (FieldDoesNotExist, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return {'p': position, 'r': reverse}
+
+    def get_model_field(self, opts, attname):
+        for field in opts.concrete_fields:
+            if field.attname == attname:
+                return field.target_field if field.is_relation else field
+        raise FieldDoesNotExist(attname)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('page_size', self.page_size),
+            ('results', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'page_size': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+
+class KeysetPaginationMixin:
+    """
+    Let clients opt in to keyset pagination with ``?pagination=cursor``.
+
+    Requests that carry a ``cursor`` (i.e. follow a next/previous link) stay
+    in keyset mode automatically.
+    """
+    keyset_pagination_class = KeysetPagination
+    pagination_mode_query_param = 'pagination'
+
+    def use_keyset_pagination(self):
+        params = self.request.query_params
+        return (params.get(self.pagination_mode_query_param) == 'cursor'
+                or self.keyset_pagination_class.cursor_query_param in params)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.request is not None and self.use_keyset_pagination():
+                self._paginator = self.keyset_pagination_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
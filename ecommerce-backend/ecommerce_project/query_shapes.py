@@ -0,0 +1,170 @@
+"""
+Query-shape recording for index tuning
+
+ViewSets that mix in ``QueryShapeMixin`` record the shape of each list query:
+which columns are compared for equality or by range, and how rows are
+ordered, but never the values (booleans excepted, since they make partial
+indexes possible). Shapes are counted per process and appended to
+``QUERY_SHAPE_LOG`` (JSON Lines) every ``QUERY_SHAPE_FLUSH_INTERVAL``
+seconds and at exit; ``manage.py index_advisor`` reads that log.
+"""
+
+import atexit
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.db import models
+from django.db.models.expressions import Col
+from django.db.models.sql.where import AND, WhereNode
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+EQUALITY_LOOKUPS = {'exact', 'iexact', 'in', 'isnull'}
+RANGE_LOOKUPS = {'gt', 'gte', 'lt', 'lte', 'range'}
+
+
+def query_shape(queryset):
+    """
+    Describe the indexable part of a queryset's WHERE and ORDER BY.
+
+    Only AND-ed comparisons on the base table's own columns are kept; OR
+    groups, negations, subqueries and primary key lookups cannot be helped
+    by a composite index on the table and are ignored.
+    """
+    query = queryset.query
+    opts = queryset.model._meta
+    equality, ranges, conditions = set(), set(), {}
+
+    def visit(node):
+        if node.connector != AND or node.negated:
+            return
+        for child in node.children:
+            if isinstance(child, WhereNode):
+                visit(child)
+                continue
+            lhs = getattr(child, 'lhs', None)
+            if not isinstance(lhs, Col) or lhs.alias != query.base_table:
+                continue
+            field = lhs.target
+            if field.primary_key:
+                continue
+            if child.lookup_name in EQUALITY_LOOKUPS:
+                equality.add(field.name)
+                if isinstance(field, models.BooleanField) and child.lookup_name == 'exact':
+                    conditions[field.name] = bool(child.rhs)
+            elif child.lookup_name in RANGE_LOOKUPS:
+                ranges.add(field.name)
+
+    visit(query.where)
+
+    ordering = []
+    for item in query.order_by or opts.ordering:
+        if not isinstance(item, str):
+            # Expression ordering (e.g. search relevance) cannot use an index
+            ordering = []
+            break
+        name = item.lstrip('-')
+        if name == 'pk' or name == opts.pk.name:
+            break
+        ordering.append(item)
+
+    return {
+        'model': opts.label,
+        'equality': sorted(equality - ranges),
+        'range': sorted(ranges),
+        'ordering': ordering,
+        'conditions': dict(sorted(conditions.items())),
+    }
+
+
+class QueryShapeRecorder:
+    """Per-process counter of query shapes, appended to the shape log periodically"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or settings.QUERY_SHAPE_LOG)
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.last_flush = time.monotonic()
+
+    def record(self, shape):
+        key = json.dumps(shape, sort_keys=True)
+        with self.lock:
+            self.pending[key] += 1
+            due = time.monotonic() - self.last_flush >= settings.QUERY_SHAPE_FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Append pending counts to the log; returns the number of shapes written"""
+        with self.lock:
+            batch, self.pending = self.pending, Counter()
+            self.last_flush = time.monotonic()
+        if not batch:
+            return 0
+        recorded_at = timezone.now().isoformat()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as fh:
+                for key, count in batch.items():
+                    fh.write(json.dumps({
+                        'shape': json.loads(key), 'count': count, 'recorded_at': recorded_at,
+                    }) + '\n')
+        except OSError:
+            logger.exception('Failed to write query shapes to %s', self.path)
+            return 0
+        return len(batch)
+
+
+def read_shape_log(path):
+    """Yield (shape, count) pairs from a shape log"""
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                yield entry['shape'], entry['count']
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_query_shape_recorder():
+    """Return the process-wide recorder, or None when recording is disabled"""
+    global _recorder
+    if not settings.QUERY_SHAPE_LOG:
+        return None
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = QueryShapeRecorder()
+            atexit.register(_recorder.flush)
+        return _recorder
+
+
+def reset_query_shape_recorder():
+    """Drop the process-wide recorder without flushing it (used by tests)"""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is not None:
+            atexit.unregister(_recorder.flush)
+        _recorder = None
+
+
+class QueryShapeMixin:
+    """Record the shape of the filtered queryset behind each list request"""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list' and not getattr(self, '_query_shape_recorded', False):
+            self._query_shape_recorded = True
+            recorder = get_query_shape_recorder()
+            if recorder is not None and random.random() < settings.QUERY_SHAPE_SAMPLE_RATE:
+                recorder.record(query_shape(queryset))
+        return queryset
@@ -150,6 +150,89 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# In-process product indexes (search, facets)
+# Seconds between pulls of products changed by other workers
+INDEX_SYNC_INTERVAL = int(os.getenv('INDEX_SYNC_INTERVAL', 30))
+# Overlap applied to each pull to catch transactions committed late
+INDEX_SYNC_MARGIN = int(os.getenv('INDEX_SYNC_MARGIN', 5))
+# Load and sync indexes on a background thread in web workers (see wsgi.py)
+INDEX_BACKGROUND_SYNC = os.getenv('INDEX_BACKGROUND_SYNC', 'True') == 'True'
+# Seconds a request waits for the first background load before answering 503
+INDEX_LOAD_TIMEOUT = int(os.getenv('INDEX_LOAD_TIMEOUT', 10))
+SEARCH_INDEX_PATH = os.getenv(
+    'SEARCH_INDEX_PATH', str(BASE_DIR / 'data' / 'search_index.pickle'))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 1000))
+# Lower bounds of the price facet buckets (the last bucket is open-ended)
+FACET_PRICE_BUCKETS = [0, 25, 50, 100, 250, 500, 1000]
+# Most ?search= matches read from the database to narrow facet counts
+FACET_SCAN_LIMIT = int(os.getenv('FACET_SCAN_LIMIT', 5000))
+# Suggestions per group returned by /api/products/autocomplete/ (default, max)
+AUTOCOMPLETE_LIMIT = int(os.getenv('AUTOCOMPLETE_LIMIT', 8))
+AUTOCOMPLETE_MAX_LIMIT = int(os.getenv('AUTOCOMPLETE_MAX_LIMIT', 50))
+# Prefixes up to this many characters keep a precomputed top list
+AUTOCOMPLETE_TOP_DEPTH = int(os.getenv('AUTOCOMPLETE_TOP_DEPTH', 3))
+
+# Materialized product leaderboards (featured, best sellers, top rated, latest)
+LEADERBOARD_SIZE = int(os.getenv('LEADERBOARD_SIZE', 10))
+# Rows kept per board beyond LEADERBOARD_SIZE, as a multiple of it
+LEADERBOARD_BUFFER_FACTOR = int(os.getenv('LEADERBOARD_BUFFER_FACTOR', 2))
+# Upper bound in seconds on how stale a served board may be
+LEADERBOARD_MAX_AGE = int(os.getenv('LEADERBOARD_MAX_AGE', 60))
+
+# Serialized product detail payloads kept per worker (LRU)
+PRODUCT_DETAIL_CACHE_SIZE = int(os.getenv('PRODUCT_DETAIL_CACHE_SIZE', 10000))
+# Products per GET/POST /api/products/batch/ request
+PRODUCT_BATCH_MAX_SIZE = int(os.getenv('PRODUCT_BATCH_MAX_SIZE', 100))
+
+# Change feed (GET /api/products/changes/): entries per page and the cap on ?limit=
+PRODUCT_CHANGES_PAGE_SIZE = int(os.getenv('PRODUCT_CHANGES_PAGE_SIZE', 500))
+PRODUCT_CHANGES_MAX_PAGE_SIZE = int(os.getenv('PRODUCT_CHANGES_MAX_PAGE_SIZE', 5000))
+# Seconds a change must age before it is served, so transactions committing
+# out of id order are not skipped by clients whose cursor already passed them
+PRODUCT_CHANGES_SETTLE_SECONDS = float(os.getenv('PRODUCT_CHANGES_SETTLE_SECONDS', 2))
+
+# Write-behind sales counters: seconds between flushes (0 writes through)
+SALES_COUNTER_FLUSH_INTERVAL = float(os.getenv('SALES_COUNTER_FLUSH_INTERVAL', 5))
+# Buffered increments that force a synchronous flush (max loss per crashed worker)
+SALES_COUNTER_MAX_PENDING = int(os.getenv('SALES_COUNTER_MAX_PENDING', 100))
+
+# Trending ranking: hours for the weight of a sale or review to halve
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 24))
+# Sales a new review counts as
+TRENDING_REVIEW_WEIGHT = float(os.getenv('TRENDING_REVIEW_WEIGHT', 3))
+# Width in seconds of the activity buckets events are counted in
+TRENDING_BUCKET_SECONDS = int(os.getenv('TRENDING_BUCKET_SECONDS', 3600))
+# Days of buckets kept for manage.py rebuild_trending
+TRENDING_WINDOW_DAYS = int(os.getenv('TRENDING_WINDOW_DAYS', 30))
+
+# Bulk product import (manage.py import_products, POST /api/products/import/)
+PRODUCT_IMPORT_BATCH_SIZE = int(os.getenv('PRODUCT_IMPORT_BATCH_SIZE', 1000))
+# Per-row errors kept in an import report; further errors are only counted
+PRODUCT_IMPORT_MAX_ERRORS = int(os.getenv('PRODUCT_IMPORT_MAX_ERRORS', 1000))
+
+# Rows per POST /api/products/bulk-update/ request (batched by PRODUCT_IMPORT_BATCH_SIZE)
+PRODUCT_BULK_UPDATE_MAX_SIZE = int(os.getenv('PRODUCT_BULK_UPDATE_MAX_SIZE', 10000))
+
+# Catalog export (GET /api/products/export/)
+CATALOG_EXPORT_CHUNK_SIZE = int(os.getenv('CATALOG_EXPORT_CHUNK_SIZE', 2000))
+# Non-staff users in this group may export the catalog
+CATALOG_PARTNER_GROUP = os.getenv('CATALOG_PARTNER_GROUP', 'catalog-partners')
+
+# Responsive image variants: widths (px) of the WebP copies made of each upload
+IMAGE_VARIANT_WIDTHS = [
+    int(width) for width in os.getenv('IMAGE_VARIANT_WIDTHS', '160,320,640,1280').split(',')]
+# WebP quality (0-100) of image variants
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', 80))
+# Background threads resizing uploads per worker (0 resizes inline after commit)
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+
+# List query shapes recorded for manage.py index_advisor (JSON Lines; empty disables)
+QUERY_SHAPE_LOG = os.getenv('QUERY_SHAPE_LOG', str(BASE_DIR / 'data' / 'query_shapes.jsonl'))
+# Fraction of list requests whose query shape is recorded
+QUERY_SHAPE_SAMPLE_RATE = float(os.getenv('QUERY_SHAPE_SAMPLE_RATE', 1.0))
+# Seconds between appends of recorded shapes to QUERY_SHAPE_LOG
+QUERY_SHAPE_FLUSH_INTERVAL = float(os.getenv('QUERY_SHAPE_FLUSH_INTERVAL', 60))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -8,3 +8,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_project.settings')
 
 application = get_wsgi_application()
+
+# Load the in-process product indexes now and keep them in sync on a
+# background thread, off the request path. Gunicorn workers import this
+# module after forking, so each worker gets its own thread (do not --preload).
+from django.conf import settings  # noqa: E402
+
+if settings.INDEX_BACKGROUND_SYNC:
+    from products.indexing import start_index_refresher
+    start_index_refresher()
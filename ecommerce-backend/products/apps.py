@@ -8,3 +8,8 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from ecommerce_project.images import track_image_variants
+        track_image_variants(self.get_model('Product'), 'image')
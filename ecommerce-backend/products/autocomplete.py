@@ -0,0 +1,336 @@
+"""
+Search-as-you-type suggestions for product and category names
+
+Suggestion keys live in sorted arrays of ``(key, id)`` pairs: every word
+suffix of a product name ("wireless mouse", "mouse"), its SKU and every word
+suffix of a category name, so answering never touches the database. Matching
+products are ranked by ``sales_count``, matching categories by the sales of
+their products.
+
+Short prefixes ("a", "sku") match a large share of the catalog, so every
+prefix up to ``AUTOCOMPLETE_TOP_DEPTH`` characters keeps its top
+``AUTOCOMPLETE_MAX_LIMIT`` products, built with the index and moved in place
+when a product is written or its sales change; answering is a slice. Longer
+prefixes match few keys; they are ranked with a ``bisect`` and a scan on
+first use and then kept (LRU) and maintained the same way.
+
+Sales counts change through ``update()`` and leave ``updated_at`` alone, so
+besides the product rows written since the last sync, ``sync()`` re-reads the
+``sales_count`` of products with sales recorded in the trending activity
+buckets since then; rankings in every worker follow counter flushes made by
+the others.
+"""
+
+import heapq
+import re
+from bisect import bisect_left, insort
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+
+from .indexing import ProductIndex, get_index, register_index
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Prefixes longer than AUTOCOMPLETE_TOP_DEPTH whose ranked products are kept
+MEMO_SIZE = 10000
+
+
+def normalize(text):
+    """Casefold and collapse whitespace"""
+    return ' '.join(str(text or '').casefold().split())
+
+
+def suggestion_keys(name, *extra):
+    """Word-start suffixes of a name, plus any extra whole keys"""
+    name = normalize(name)
+    keys = {name[match.start():] for match in WORD_RE.finditer(name)}
+    keys.update(normalize(value) for value in extra if value)
+    keys.discard('')
+    return keys
+
+
+def _insert(entries, keys, item_id):
+    for key in keys:
+        insort(entries, (key, item_id))
+
+
+def _delete(entries, keys, item_id):
+    for key in keys:
+        position = bisect_left(entries, (key, item_id))
+        if position < len(entries) and entries[position] == (key, item_id):
+            del entries[position]
+
+
+def _prefixes(keys, longest=None):
+    return {key[:length] for key in keys for length in range(1, len(key) + 1)
+            if longest is None or length <= longest}
+
+
+def _prefix_matches(entries, prefix):
+    matches = set()
+    position = bisect_left(entries, (prefix,))
+    while position < len(entries) and entries[position][0].startswith(prefix):
+        matches.add(entries[position][1])
+        position += 1
+    return matches
+
+
+@register_index
+class AutocompleteIndex(ProductIndex):
+    """Sorted-array prefix index over product names, SKUs and category names"""
+
+    name = 'autocomplete'
+
+    def clear(self):
+        with self.lock:
+            super().clear()
+            self.entries = []
+            self.products = {}
+            self.depth = settings.AUTOCOMPLETE_TOP_DEPTH
+            self.top_size = settings.AUTOCOMPLETE_MAX_LIMIT
+            # Prefix -> top product ids, best first: every prefix up to depth
+            # with matches, and recently asked longer ones (LRU)
+            self.top = {}
+            self.ranked = OrderedDict()
+            self.bulk = False
+            self.category_entries = []
+            self.categories = {}
+            self.category_sales = {}
+
+    def get_queryset(self):
+        from .models import Product
+        return Product.objects.only(
+            'name', 'slug', 'sku', 'sales_count', 'is_active', 'category', 'updated_at')
+
+    # Products
+
+    def add(self, product):
+        with self.lock:
+            keys = suggestion_keys(product.name, product.sku)
+            old = self.products.get(product.pk)
+            if old is not None and (not product.is_active or old['keys'] != keys):
+                self.remove(product.pk)
+                old = None
+            if not product.is_active:
+                return
+            promoted = False
+            if old is not None:
+                # Same keys: re-ranked in place, so full top lists are not recomputed
+                self.adjust_category_sales(old['category_id'], -old['sales_count'])
+                promoted = ((-product.sales_count, product.name)
+                            <= (-old['sales_count'], old['name']))
+            self.products[product.pk] = {
+                'keys': keys,
+                'name': product.name,
+                'slug': product.slug,
+                'sku': product.sku,
+                'sales_count': product.sales_count,
+                'category_id': product.category_id,
+            }
+            self.adjust_category_sales(product.category_id, product.sales_count)
+            if self.bulk:
+                # Sorted and ranked once at the end of build()
+                self.entries.extend((key, product.pk) for key in keys)
+            else:
+                if old is None:
+                    _insert(self.entries, keys, product.pk)
+                self.reposition(keys, product.pk, promoted)
+
+    def remove(self, product_id):
+        with self.lock:
+            document = self.products.pop(product_id, None)
+            if document is None:
+                return
+            _delete(self.entries, document['keys'], product_id)
+            self.reposition(document['keys'], product_id)
+            self.adjust_category_sales(document['category_id'], -document['sales_count'])
+
+    def sales_changed(self, product):
+        """Update a product's ranking after a counter write that skipped signals"""
+        with self.lock:
+            document = self.products.get(product.pk)
+            if document is None or document['sales_count'] == product.sales_count:
+                return
+            promoted = product.sales_count > document['sales_count']
+            self.adjust_category_sales(
+                document['category_id'], product.sales_count - document['sales_count'])
+            document['sales_count'] = product.sales_count
+            self.reposition(document['keys'], product.pk, promoted)
+
+    def rank_key(self, product_id):
+        document = self.products[product_id]
+        return -document['sales_count'], document['name'], product_id
+
+    def reposition(self, keys, product_id, promoted=False):
+        """
+        Move a product to its place in the top lists of every prefix of keys
+        (``promoted`` when its rank can only have improved)
+        """
+        for prefix in _prefixes(keys):
+            if len(prefix) <= self.depth:
+                top = self.top.setdefault(prefix, [])
+                if not self.place(top, product_id, promoted):
+                    top[:] = self.rank_products(prefix, self.top_size)
+                if not top:
+                    del self.top[prefix]
+            elif (prefix in self.ranked
+                  and not self.place(self.ranked[prefix], product_id, promoted)):
+                # Re-ranked on the next request
+                del self.ranked[prefix]
+
+    def place(self, top, product_id, promoted=False):
+        """
+        Put a (re-ranked, added or removed) product in its place in a top list.
+
+        Returns False when the list may now miss a product ranked just
+        outside it, i.e. a full list lost one of its members or demoted one
+        to the last place.
+        """
+        full = len(top) >= self.top_size
+        indexed = product_id in self.products
+        if product_id in top:
+            top.remove(product_id)
+            if not indexed:
+                return not full
+            position = bisect_left(top, self.rank_key(product_id), key=self.rank_key)
+            if full and position == len(top) and not promoted:
+                return False
+            top.insert(position, product_id)
+        elif indexed:
+            position = bisect_left(top, self.rank_key(product_id), key=self.rank_key)
+            if position < self.top_size:
+                top.insert(position, product_id)
+                del top[self.top_size:]
+        return True
+
+    def adjust_category_sales(self, category_id, delta):
+        if category_id is not None:
+            self.category_sales[category_id] = self.category_sales.get(category_id, 0) + delta
+
+    # Categories
+
+    def add_category(self, category):
+        with self.lock:
+            self.remove_category(category.pk)
+            if not category.is_active:
+                return
+            keys = suggestion_keys(category.name)
+            _insert(self.category_entries, keys, category.pk)
+            self.categories[category.pk] = {
+                'keys': keys, 'name': category.name, 'slug': category.slug}
+
+    def remove_category(self, category_id):
+        with self.lock:
+            document = self.categories.pop(category_id, None)
+            if document is not None:
+                _delete(self.category_entries, document['keys'], category_id)
+
+    def category_changed(self, category_id):
+        from categories.models import Category
+        category = Category.objects.filter(pk=category_id).first()
+        if category is None:
+            self.remove_category(category_id)
+        else:
+            self.add_category(category)
+
+    def load_categories(self):
+        from categories.models import Category
+        with self.lock:
+            self.category_entries = []
+            self.categories = {}
+            categories = Category.objects.filter(is_active=True).only('name', 'slug', 'is_active')
+            for category in categories:
+                self.add_category(category)
+
+    def build(self):
+        with self.lock:
+            self.bulk = True
+            try:
+                count = super().build()
+            finally:
+                self.bulk = False
+            self.entries.sort()
+            matches = defaultdict(list)
+            for product_id, document in self.products.items():
+                for prefix in _prefixes(document['keys'], self.depth):
+                    matches[prefix].append(product_id)
+            self.top = {prefix: heapq.nsmallest(self.top_size, ids, key=self.rank_key)
+                        for prefix, ids in matches.items()}
+            self.ranked.clear()
+            self.load_categories()
+        return count
+
+    def sync(self):
+        with self.lock:
+            since = self.watermark
+            count = super().sync()
+            if since is not None:
+                self.sync_sales(since)
+                self.sync_categories(since)
+        return count
+
+    def sync_sales(self, since):
+        """Re-rank products whose sales other workers flushed since the last sync"""
+        from .models import Product, ProductActivity
+        from .trending import bucket_start
+        since = bucket_start(since - timedelta(seconds=settings.INDEX_SYNC_MARGIN))
+        sold = ProductActivity.objects.filter(bucket__gte=since, sales__gt=0).values('product_id')
+        for product in Product.objects.filter(pk__in=sold).only('sales_count'):
+            self.sales_changed(product)
+
+    def sync_categories(self, since):
+        """Apply category writes made by other workers since the last sync"""
+        from categories.models import Category
+        since -= timedelta(seconds=settings.INDEX_SYNC_MARGIN)
+        for category in Category.objects.filter(updated_at__gte=since).only(
+                'name', 'slug', 'is_active'):
+            self.add_category(category)
+        # Deletions leave no row to find; a count mismatch reveals them
+        if Category.objects.filter(is_active=True).count() != len(self.categories):
+            self.load_categories()
+
+    # Querying
+
+    def suggest(self, prefix, limit):
+        """Return (products, categories) whose names or SKUs start with a word of prefix"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return [], []
+
+        with self.lock:
+            if len(prefix) <= self.depth:
+                top = self.top.get(prefix, [])
+            elif prefix in self.ranked:
+                top = self.ranked[prefix]
+                self.ranked.move_to_end(prefix)
+            else:
+                top = self.ranked[prefix] = self.rank_products(prefix, self.top_size)
+                if len(self.ranked) > MEMO_SIZE:
+                    self.ranked.popitem(last=False)
+            product_ids = top[:limit]
+            category_ids = heapq.nsmallest(
+                limit, _prefix_matches(self.category_entries, prefix),
+                key=lambda pk: (-self.category_sales.get(pk, 0), self.categories[pk]['name']))
+
+            products = [
+                {'id': pk, 'name': self.products[pk]['name'], 'slug': self.products[pk]['slug'],
+                 'sku': self.products[pk]['sku']}
+                for pk in product_ids
+            ]
+            categories = [
+                {'id': pk, 'name': self.categories[pk]['name'],
+                 'slug': self.categories[pk]['slug']}
+                for pk in category_ids
+            ]
+        return products, categories
+
+    def rank_products(self, prefix, limit):
+        return heapq.nsmallest(
+            limit, _prefix_matches(self.entries, prefix), key=self.rank_key)
+
+
+def get_autocomplete_index():
+    """Return the process-wide autocomplete index"""
+    return get_index(AutocompleteIndex.name)
@@ -0,0 +1,55 @@
+"""
+Shared batch validation and reporting for products app
+
+Bulk imports (products.importers) and price / stock updates
+(products.bulk_updates) both read ``(line, data)`` rows keyed by SKU, validate
+them one batch at a time and report per-row failures.
+"""
+
+import time
+from abc import ABC, abstractmethod
+
+
+class BatchReport(ABC):
+    """Timing and batch count for one batched run; subclasses record failures"""
+
+    def __init__(self):
+        self.batches = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    @abstractmethod
+    def failure(self, line, sku, errors):
+        """Record a row that could not be written"""
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+
+def validate_rows(batch, serializer_class, report):
+    """
+    Return {sku: (line, validated data)} for a batch of (line, data) rows.
+
+    Rows that fail to parse or validate are passed to ``report.failure``; a
+    later row with the same SKU replaces (and fails) the earlier one.
+    """
+    valid = {}
+    for line, data in batch:
+        if isinstance(data, Exception):
+            report.failure(line, None, {'non_field_errors': [str(data)]})
+            continue
+        if not isinstance(data, dict):
+            report.failure(line, None, {'non_field_errors': ['Each row must be an object']})
+            continue
+        serializer = serializer_class(data=data)
+        if not serializer.is_valid():
+            report.failure(line, data.get('sku'), serializer.errors)
+            continue
+        row = serializer.validated_data
+        if row['sku'] in valid:
+            earlier_line, _ = valid[row['sku']]
+            report.failure(earlier_line, row['sku'], {
+                'sku': [f'Duplicate SKU in batch; row {line} replaces this row']})
+        valid[row['sku']] = (line, row)
+    return valid
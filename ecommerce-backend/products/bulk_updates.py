@@ -0,0 +1,141 @@
+"""
+Set-based bulk price and stock updates
+
+ERP syncs send thousands of ``(sku, price, discount_price, quantity_in_stock)``
+rows. Each batch of ``PRODUCT_IMPORT_BATCH_SIZE`` rows is validated
+together, the products are loaded with one query, and the rows that actually
+change are written with ``bulk_update`` (one ``UPDATE ... CASE`` statement
+per database batch). Caches and in-memory views are notified once per batch
+after it commits.
+"""
+
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .batches import BatchReport, validate_rows
+from .detail_cache import get_detail_cache
+from .indexing import loaded_indexes
+from .leaderboards import get_leaderboards
+from .models import Product
+from .serializers import PriceStockRowSerializer
+
+UPDATABLE_FIELDS = ('price', 'discount_price', 'quantity_in_stock')
+
+
+class BulkUpdateReport(BatchReport):
+    """Totals and per-SKU outcomes for one bulk update"""
+
+    def __init__(self):
+        super().__init__()
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.results = []
+
+    def result(self, line, sku, outcome, errors=None):
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        entry = {'row': line, 'sku': sku, 'status': outcome}
+        if errors:
+            entry['errors'] = errors
+        self.results.append(entry)
+
+    def failure(self, line, sku, errors):
+        self.result(line, sku, 'failed', errors)
+
+    @property
+    def rows(self):
+        return self.updated + self.unchanged + self.failed
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'failed': self.failed,
+            'batches': self.batches,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'results': sorted(self.results, key=lambda entry: entry['row']),
+        }
+
+
+class PriceStockUpdater:
+    """Applies price / stock rows keyed by SKU, one batch at a time"""
+
+    def __init__(self, batch_size=None, report=None):
+        self.batch_size = batch_size or settings.PRODUCT_IMPORT_BATCH_SIZE
+        self.report = report or BulkUpdateReport()
+
+    def run(self, rows):
+        """Apply an iterable of (line, data) rows"""
+        rows = iter(rows)
+        try:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self.update_batch(batch)
+        finally:
+            self.report.finished = time.monotonic()
+        return self.report
+
+    def update_batch(self, batch):
+        self.report.batches += 1
+        valid = validate_rows(batch, PriceStockRowSerializer, self.report)
+        if not valid:
+            return
+
+        products = {
+            product.sku: product
+            for product in Product.objects.filter(sku__in=valid).only(
+                'sku', 'is_active', *UPDATABLE_FIELDS)
+        }
+        now = timezone.now()
+        changed, fields = [], set()
+        for sku, (line, row) in valid.items():
+            product = products.get(sku)
+            if product is None:
+                self.report.result(line, sku, 'failed', {'sku': ['Unknown SKU']})
+                continue
+            diff = {field: value for field, value in row.items()
+                    if field != 'sku' and getattr(product, field) != value}
+            if not diff:
+                self.report.result(line, sku, 'unchanged')
+                continue
+            for field, value in diff.items():
+                setattr(product, field, value)
+            # bulk_update skips auto_now; ETags and cache fingerprints key on it
+            product.updated_at = now
+            fields.update(diff)
+            changed.append((line, product))
+
+        if not changed:
+            return
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_update(
+                    [product for _, product in changed],
+                    [field for field in UPDATABLE_FIELDS if field in fields] + ['updated_at'])
+                product_ids = [product.pk for _, product in changed]
+                transaction.on_commit(lambda: notify(product_ids))
+        except DatabaseError as exc:
+            for line, product in changed:
+                self.report.result(line, product.sku, 'failed', {'non_field_errors': [str(exc)]})
+            return
+        for line, product in changed:
+            self.report.result(line, product.sku, 'updated')
+
+
+def notify(product_ids):
+    """bulk_update skips signals, so refresh caches and in-memory views in one go"""
+    cache = get_detail_cache()
+    for product_id in product_ids:
+        cache.invalidate(product_id)
+    for index in loaded_indexes():
+        index.expire()
+    leaderboards = get_leaderboards()
+    if leaderboards.loaded:
+        leaderboards.invalidate()
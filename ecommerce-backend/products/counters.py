@@ -0,0 +1,178 @@
+"""
+Write-behind buffered product sales counters
+
+``increment_sales`` calls are collected in a per-worker buffer and written as
+set-based ``UPDATE ... SET sales_count = sales_count + n`` statements, one per
+distinct increment size, instead of one read-modify-write per call. The same
+flush feeds the trending scores (see products.trending). The
+buffer is flushed every ``SALES_COUNTER_FLUSH_INTERVAL`` seconds by a
+background thread, at process exit, and synchronously whenever it holds
+``SALES_COUNTER_MAX_PENDING`` increments, which bounds what a crashed worker
+can lose.
+"""
+
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+
+from .trending import record_activity
+
+logger = logging.getLogger(__name__)
+
+
+class SalesCounterBuffer:
+    """Per-process buffer of pending sales_count increments"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pending = Counter()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @property
+    def total_pending(self):
+        with self.lock:
+            return sum(self.pending.values())
+
+    def pending_for(self, product_id):
+        with self.lock:
+            return self.pending[product_id]
+
+    def increment(self, product_id, amount=1):
+        """
+        Buffer an increment and return the product's unflushed total.
+
+        A synchronous flush that fails is logged rather than raised: the
+        increment is already buffered and the next flush retries it.
+        """
+        with self.lock:
+            self.pending[product_id] += amount
+            unflushed = self.pending[product_id]
+            total = sum(self.pending.values())
+
+        if settings.SALES_COUNTER_FLUSH_INTERVAL <= 0 or total >= settings.SALES_COUNTER_MAX_PENDING:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush buffered sales counts')
+        else:
+            self.start()
+        return unflushed
+
+    def sales_count(self, product_id):
+        """
+        The product's stored sales_count plus this worker's pending increments.
+
+        Both are read while no flush is in flight, so an increment is counted
+        exactly once whether or not a flush has moved it to the database yet.
+        """
+        from .models import Product
+
+        with self.flush_lock:
+            stored = (Product.objects.filter(pk=product_id)
+                      .values_list('sales_count', flat=True).first())
+            return (stored or 0) + self.pending_for(product_id)
+
+    def flush(self):
+        """Write every pending increment; returns the number of products updated"""
+        from .models import Product
+
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, Counter()
+            if not batch:
+                return 0
+
+            by_amount = defaultdict(list)
+            for product_id, amount in batch.items():
+                by_amount[amount].append(product_id)
+
+            try:
+                with transaction.atomic():
+                    for amount, product_ids in by_amount.items():
+                        Product.objects.filter(pk__in=product_ids).update(
+                            sales_count=F('sales_count') + amount)
+                    record_activity(sales=batch)
+            except Exception:
+                with self.lock:
+                    self.pending.update(batch)
+                raise
+
+        transaction.on_commit(lambda: self.notify(list(batch)))
+        return len(batch)
+
+    def notify(self, product_ids):
+        """Let materialized views see the new counts (update() skips signals)"""
+        from .indexing import loaded_indexes
+        from .leaderboards import get_leaderboards
+        from .models import Product
+
+        leaderboards = get_leaderboards()
+        indexes = loaded_indexes()
+        if not leaderboards.loaded and not indexes:
+            return
+        for product in Product.objects.select_related('category').filter(pk__in=product_ids):
+            for index in indexes:
+                index.sales_changed(product)
+            if leaderboards.loaded:
+                leaderboards.product_changed(product)
+
+    # Background flushing
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.stopped.clear()
+            self.thread = threading.Thread(
+                target=self.run, name='sales-counter-flush', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(settings.SALES_COUNTER_FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush buffered sales counts')
+            finally:
+                connections.close_all()
+
+    def stop(self, flush=True):
+        self.stopped.set()
+        if flush:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush buffered sales counts')
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_sales_counter():
+    """Return the process-wide sales counter buffer"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = SalesCounterBuffer()
+            atexit.register(_buffer.stop)
+        return _buffer
+
+
+def reset_sales_counter():
+    """Drop the process-wide buffer without flushing it (used by tests)"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is not None:
+            atexit.unregister(_buffer.stop)
+            _buffer.stop(flush=False)
+        _buffer = None
@@ -0,0 +1,115 @@
+"""
+In-process response cache for product detail
+
+Serialized ``ProductDetailSerializer`` payloads are kept per product id in an
+LRU of ``PRODUCT_DETAIL_CACHE_SIZE`` entries. Payloads are stored with
+relative image URLs and made absolute per request, so one entry serves both
+``/products/<id>/`` and ``/products/slug/<slug>/`` on any host.
+
+Every entry records the fingerprint it was rendered from (the same row the
+detail ETag is computed from), so a hit is only served while the product and
+its category are unchanged, including after writes made by other workers.
+Signal handlers evict entries as soon as a local write commits.
+"""
+
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+
+
+class ProductDetailCache:
+    """LRU of serialized product detail payloads with hit/miss statistics"""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or settings.PRODUCT_DETAIL_CACHE_SIZE
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.entries = OrderedDict()
+            self.by_category = defaultdict(set)
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def get(self, product_id, fingerprint):
+        """Return the cached payload if it was rendered from ``fingerprint``"""
+        with self.lock:
+            entry = self.entries.get(product_id)
+            if entry is not None and entry[0] == fingerprint:
+                self.entries.move_to_end(product_id)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._drop(product_id)
+                self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def set(self, product_id, fingerprint, data):
+        with self.lock:
+            if product_id in self.entries:
+                self._drop(product_id)
+            category = data.get('category')
+            self.entries[product_id] = (fingerprint, data, category and category['id'])
+            if category:
+                self.by_category[category['id']].add(product_id)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, product_id):
+        with self.lock:
+            if product_id in self.entries:
+                self._drop(product_id)
+                self.invalidations += 1
+
+    def invalidate_category(self, category_id):
+        with self.lock:
+            for product_id in list(self.by_category.get(category_id, ())):
+                self._drop(product_id)
+                self.invalidations += 1
+
+    def _drop(self, product_id):
+        _, _, category_id = self.entries.pop(product_id)
+        if category_id is not None:
+            products = self.by_category[category_id]
+            products.discard(product_id)
+            if not products:
+                del self.by_category[category_id]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_detail_cache():
+    """Return the process-wide product detail cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ProductDetailCache()
+        return _cache
+
+
+def reset_detail_cache():
+    """Drop the process-wide cache (used by tests)"""
+    global _cache
+    with _cache_lock:
+        _cache = None
@@ -0,0 +1,151 @@
+"""
+Streaming catalog export
+
+Active products are read with ``iterator(chunk_size=...)`` (a server-side
+cursor on PostgreSQL), their attributes prefetched per chunk, and rendered
+straight to NDJSON or CSV lines that are flushed in ~64 KB pieces, so memory
+stays flat regardless of catalog size.
+"""
+
+import csv
+import io
+import json
+
+from django.conf import settings
+
+from .facets import ATTRIBUTE_FILTER_PREFIX
+from .importers import join_attribute_values
+from .models import Product, ProductAttribute
+
+OUTPUTS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CSV_FIELDS = [
+    'id', 'sku', 'name', 'slug', 'description', 'short_description', 'price',
+    'discount_price', 'current_price', 'quantity_in_stock', 'category',
+    'category_name', 'image', 'is_active', 'is_featured', 'average_rating',
+    'review_count', 'sales_count', 'created_at', 'updated_at',
+]
+
+FLUSH_BYTES = 64 * 1024
+
+
+def export_queryset(category_id=None):
+    queryset = (Product.objects.filter(is_active=True)
+                .select_related('category')
+                .prefetch_related('attributes')
+                .order_by('pk'))
+    if category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+    return queryset
+
+
+def _decimal(value):
+    return None if value is None else str(value)
+
+
+class CatalogExporter:
+    """Renders the active catalog as a stream of NDJSON or CSV chunks"""
+
+    def __init__(self, queryset, media_base='', chunk_size=None):
+        self.queryset = queryset
+        self.media_base = media_base.rstrip('/')
+        self.chunk_size = chunk_size or settings.CATALOG_EXPORT_CHUNK_SIZE
+
+    def image_url(self, image):
+        if not image:
+            return None
+        url = image.url
+        return self.media_base + url if url.startswith('/') else url
+
+    def product_record(self, product):
+        category = product.category
+        return {
+            'id': product.pk,
+            'sku': product.sku,
+            'name': product.name,
+            'slug': product.slug,
+            'description': product.description,
+            'short_description': product.short_description,
+            'price': _decimal(product.price),
+            'discount_price': _decimal(product.discount_price),
+            'current_price': _decimal(product.current_price),
+            'quantity_in_stock': product.quantity_in_stock,
+            'category': category and {
+                'id': category.pk, 'name': category.name, 'slug': category.slug},
+            'image': self.image_url(product.image),
+            'is_active': product.is_active,
+            'is_featured': product.is_featured,
+            'average_rating': product.average_rating,
+            'review_count': product.review_count,
+            'sales_count': product.sales_count,
+            'created_at': product.created_at.isoformat(),
+            'updated_at': product.updated_at.isoformat(),
+            'attributes': [
+                {'attribute_key': attr.attribute_key, 'attribute_value': attr.attribute_value}
+                for attr in product.attributes.all()
+            ],
+        }
+
+    def products(self):
+        return self.queryset.iterator(chunk_size=self.chunk_size)
+
+    def buffered(self, lines):
+        """Join rendered lines into chunks of roughly FLUSH_BYTES"""
+        buffer = []
+        size = 0
+        for line in lines:
+            buffer.append(line)
+            size += len(line)
+            if size >= FLUSH_BYTES:
+                yield ''.join(buffer).encode('utf-8')
+                buffer, size = [], 0
+        if buffer:
+            yield ''.join(buffer).encode('utf-8')
+
+    def ndjson(self):
+        return self.buffered(
+            json.dumps(self.product_record(product), ensure_ascii=False) + '\n'
+            for product in self.products()
+        )
+
+    def csv(self):
+        # Attribute columns use the importer's attr.<key> spelling so an
+        # export can be fed back into import_products
+        keys = list(ProductAttribute.objects.filter(
+            product__in=self.queryset.order_by()
+        ).order_by('attribute_key').values_list('attribute_key', flat=True).distinct())
+        header = CSV_FIELDS + [ATTRIBUTE_FILTER_PREFIX + key for key in keys]
+
+        out = io.StringIO()
+        writer = csv.writer(out)
+
+        def render(row):
+            writer.writerow(row)
+            line = out.getvalue()
+            out.seek(0)
+            out.truncate()
+            return line
+
+        def lines():
+            yield render(header)
+            for product in self.products():
+                record = self.product_record(product)
+                category = record['category'] or {}
+                values = {}
+                for attr in record['attributes']:
+                    values.setdefault(attr['attribute_key'], []).append(attr['attribute_value'])
+                # Storage paths rather than URLs, matching what the importer expects
+                record.update(category=category.get('id'), category_name=category.get('name'),
+                              image=product.image.name)
+                yield render(
+                    [record[name] for name in CSV_FIELDS]
+                    + [join_attribute_values(values.get(key, [])) for key in keys]
+                )
+
+        return self.buffered(lines())
+
+    def stream(self, output):
+        return self.csv() if output == 'csv' else self.ndjson()
@@ -0,0 +1,259 @@
+"""
+Faceted navigation for products
+
+Facet counts are computed from in-memory posting sets (facet value -> set of
+product ids) rather than per-facet GROUP BY queries: narrowing to the current
+filters and counting every facet value are set intersections. Counts are
+disjunctive, i.e. the counts for one attribute key ignore that key's own
+filter so clients can offer "Red (132), Blue (87)" after selecting Red.
+
+The index also keeps the columns behind the price, discount and rating range
+filters in sorted arrays, and the active / featured flags as sets, so the
+common product filters narrow the counts without touching the database.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+
+from .indexing import ProductIndex, get_index, register_index
+
+ATTRIBUTE_FILTER_PREFIX = 'attr.'
+
+# ProductFilter fields answered from the index: filter -> (column, lookup)
+RANGE_FILTERS = {
+    'min_price': ('effective_price', 'gte'),
+    'max_price': ('effective_price', 'lte'),
+    'min_discount': ('discount_percentage', 'gte'),
+    'min_rating': ('average_rating', 'gte'),
+}
+RANGE_COLUMNS = ('effective_price', 'discount_percentage', 'average_rating')
+FLAG_FILTERS = ('is_active', 'is_featured')
+
+
+def normalize(value):
+    return str(value).strip().casefold()
+
+
+def parse_attribute_filters(params):
+    """Return {normalized key: {normalized values}} from ``attr.<key>=<value>`` params"""
+    filters = {}
+    for param in params:
+        if not param.startswith(ATTRIBUTE_FILTER_PREFIX):
+            continue
+        key = normalize(param[len(ATTRIBUTE_FILTER_PREFIX):])
+        values = {normalize(value) for value in params.getlist(param) if value.strip()}
+        if key and values:
+            filters.setdefault(key, set()).update(values)
+    return filters
+
+
+@register_index
+class ProductFacetIndex(ProductIndex):
+    """Posting sets of product ids per attribute value, category and price bucket"""
+
+    name = 'facets'
+
+    def clear(self):
+        with self.lock:
+            super().clear()
+            self.attributes = defaultdict(lambda: defaultdict(set))
+            self.categories = defaultdict(set)
+            self.price_buckets = defaultdict(set)
+            self.active = set()
+            self.featured = set()
+            self.everything = set()
+            # Column -> sorted (value, product id) pairs
+            self.ranges = {column: [] for column in RANGE_COLUMNS}
+            self.labels = {}
+            self.documents = {}
+
+    @property
+    def bucket_bounds(self):
+        return [Decimal(str(bound)) for bound in settings.FACET_PRICE_BUCKETS]
+
+    def price_bucket(self, price):
+        return max(bisect_right(self.bucket_bounds, price) - 1, 0)
+
+    def add(self, product):
+        category_id = product.category_id
+        bucket = self.price_bucket(product.current_price)
+        values = tuple(getattr(product, column) for column in RANGE_COLUMNS)
+
+        with self.lock:
+            self.remove(product.pk)
+            attributes = []
+            for attr in product.attributes.all():
+                key, value = normalize(attr.attribute_key), normalize(attr.attribute_value)
+                self.labels.setdefault(key, attr.attribute_key.strip())
+                self.labels.setdefault((key, value), attr.attribute_value.strip())
+                attributes.append((key, value))
+            for key, value in attributes:
+                self.attributes[key][value].add(product.pk)
+            if category_id is not None:
+                self.categories[category_id].add(product.pk)
+            self.price_buckets[bucket].add(product.pk)
+            if product.is_active:
+                self.active.add(product.pk)
+            if product.is_featured:
+                self.featured.add(product.pk)
+            for column, value in zip(RANGE_COLUMNS, values):
+                if value is not None:
+                    insort(self.ranges[column], (value, product.pk))
+            self.everything.add(product.pk)
+            self.documents[product.pk] = (tuple(attributes), category_id, bucket, values)
+
+    def remove(self, product_id):
+        with self.lock:
+            document = self.documents.pop(product_id, None)
+            if document is None:
+                return
+            attributes, category_id, bucket, values = document
+            for key, value in attributes:
+                postings = self.attributes[key]
+                postings[value].discard(product_id)
+                if not postings[value]:
+                    del postings[value]
+                if not postings:
+                    del self.attributes[key]
+            if category_id is not None:
+                self.categories[category_id].discard(product_id)
+                if not self.categories[category_id]:
+                    del self.categories[category_id]
+            self.price_buckets[bucket].discard(product_id)
+            for column, value in zip(RANGE_COLUMNS, values):
+                entries = self.ranges[column]
+                position = bisect_left(entries, (value, product_id))
+                if position < len(entries) and entries[position] == (value, product_id):
+                    del entries[position]
+            self.active.discard(product_id)
+            self.featured.discard(product_id)
+            self.everything.discard(product_id)
+
+    def attribute_matches(self, key, values):
+        postings = self.attributes.get(key, {})
+        matches = set()
+        for value in values:
+            matches |= postings.get(value, set())
+        return matches
+
+    def range_matches(self, column, low=None, high=None):
+        """Ids whose column lies within [low, high] (either bound optional)"""
+        entries = self.ranges[column]
+        start = 0 if low is None else bisect_left(entries, (low,))
+        end = len(entries)
+        if high is not None:
+            # Past every (high, id) pair
+            end = bisect_right(entries, (high, float('inf')))
+        return {product_id for _, product_id in entries[start:end]}
+
+    def filter_matches(self, values):
+        """
+        Ids matching ``{filter name: cleaned value}`` for the RANGE_FILTERS and
+        FLAG_FILTERS among them, or None when none of them is set.
+        """
+        with self.lock:
+            matches = None
+            bounds = {}
+            for name, (column, lookup) in RANGE_FILTERS.items():
+                if values.get(name) is None:
+                    continue
+                low, high = bounds.get(column, (None, None))
+                if lookup == 'gte':
+                    low = values[name]
+                else:
+                    high = values[name]
+                bounds[column] = (low, high)
+            for column, (low, high) in bounds.items():
+                found = self.range_matches(column, low, high)
+                matches = found if matches is None else matches & found
+            for name in FLAG_FILTERS:
+                if values.get(name) is None:
+                    continue
+                flagged = self.active if name == 'is_active' else self.featured
+                found = flagged if values[name] else self.everything - flagged
+                matches = found if matches is None else matches & found
+            return matches
+
+    def category_matches(self, category_ids):
+        """Ids of products directly in any of ``category_ids``"""
+        with self.lock:
+            matches = set()
+            for category_id in category_ids:
+                matches |= self.categories.get(category_id, set())
+            return matches
+
+    def facet_counts(self, attribute_filters, category_id=None,
+                     include_inactive=False, restrict_to=None):
+        """
+        Count products per facet value under the given filters.
+
+        ``restrict_to`` narrows the universe to ids matched by filters the
+        index does not cover (price range, search, rating, ...).
+        """
+        with self.lock:
+            base = self.everything if include_inactive else self.active
+            if restrict_to is not None:
+                base = base & restrict_to
+
+            constraints = {
+                key: self.attribute_matches(key, values)
+                for key, values in attribute_filters.items()
+            }
+            if category_id is not None:
+                constraints['__category__'] = self.categories.get(category_id, set())
+
+            def narrowed(excluding=None):
+                result = base
+                for name, matches in sorted(constraints.items(), key=lambda item: len(item[1])):
+                    if name != excluding:
+                        result = result & matches
+                return result
+
+            results = narrowed()
+
+            attributes = {}
+            for key in sorted(self.attributes, key=lambda k: self.labels.get(k, k)):
+                universe = narrowed(excluding=key) if key in constraints else results
+                counts = [
+                    {
+                        'value': self.labels.get((key, value), value),
+                        'count': len(universe & postings),
+                        'selected': value in attribute_filters.get(key, ()),
+                    }
+                    for value, postings in self.attributes[key].items()
+                ]
+                counts = [item for item in counts if item['count'] or item['selected']]
+                if counts:
+                    counts.sort(key=lambda item: (-item['count'], item['value']))
+                    attributes[self.labels.get(key, key)] = counts
+
+            universe = narrowed(excluding='__category__')
+            categories = {
+                cat_id: len(universe & postings)
+                for cat_id, postings in self.categories.items()
+            }
+
+            bounds = settings.FACET_PRICE_BUCKETS
+            price_buckets = [
+                {
+                    'min': bound,
+                    'max': bounds[position + 1] if position + 1 < len(bounds) else None,
+                    'count': len(results & self.price_buckets.get(position, set())),
+                }
+                for position, bound in enumerate(bounds)
+            ]
+
+        return {
+            'total': len(results),
+            'attributes': attributes,
+            'categories': {cat_id: count for cat_id, count in categories.items() if count},
+            'price': price_buckets,
+        }
+
+
+def get_facet_index():
+    """Return the process-wide product facet index"""
+    return get_index(ProductFacetIndex.name)
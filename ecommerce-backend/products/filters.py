@@ -3,19 +3,26 @@ Filters for products app
 """
 
 import django_filters
-from .models import Product
+from django.db.models import Exists, OuterRef, Q
+from categories.models import Category
+from .models import Product, ProductAttribute
+from .facets import parse_attribute_filters
 
 
 class ProductFilter(django_filters.FilterSet):
     """Filter set for products"""
     min_price = django_filters.NumberFilter(
-        field_name='price',
+        field_name='effective_price',
         lookup_expr='gte'
     )
     max_price = django_filters.NumberFilter(
-        field_name='price',
+        field_name='effective_price',
         lookup_expr='lte'
     )
+    min_discount = django_filters.NumberFilter(
+        field_name='discount_percentage',
+        lookup_expr='gte'
+    )
     min_rating = django_filters.NumberFilter(
         field_name='average_rating',
         lookup_expr='gte'
@@ -24,7 +31,31 @@ class ProductFilter(django_filters.FilterSet):
         field_name='category__name',
         lookup_expr='icontains'
     )
+    category_tree = django_filters.NumberFilter(
+        method='filter_category_tree',
+        label='Category, including all of its subcategories'
+    )
 
     class Meta:
         model = Product
         fields = ['category', 'is_active', 'is_featured']
+
+    def filter_category_tree(self, queryset, name, value):
+        """Products anywhere in a category's subtree (an indexed path prefix match)"""
+        path = Category.objects.filter(pk=value).values_list('path', flat=True).first()
+        if not path:
+            return queryset.none()
+        return queryset.filter(category__path__startswith=path)
+
+    def filter_queryset(self, queryset):
+        """Apply ``attr.<key>=<value>`` filters (values OR-ed, keys AND-ed)"""
+        queryset = super().filter_queryset(queryset)
+        for key, values in parse_attribute_filters(self.data).items():
+            value_match = Q()
+            for value in values:
+                value_match |= Q(attribute_value__iexact=value)
+            queryset = queryset.filter(Exists(
+                ProductAttribute.objects.filter(
+                    value_match, product=OuterRef('pk'), attribute_key__iexact=key)
+            ))
+        return queryset
@@ -0,0 +1,275 @@
+"""
+Streaming bulk product import
+
+Rows are read lazily from CSV or JSON Lines, validated and written in
+batches of ``PRODUCT_IMPORT_BATCH_SIZE``: one query to look up existing SKUs
+and slugs, one upsert keyed on ``sku``, and one DELETE plus one
+``bulk_create`` for attributes, with the per-row attribute signal handlers
+muted. Only the current batch is held in memory.
+
+CSV attributes are given as ``attr.<key>`` columns, the same spelling as the
+listing filters, several values of a key separated by ``;`` (a literal
+``;`` or backslash in a value is escaped with a backslash); JSONL rows carry
+an ``attributes`` list of ``{"attribute_key": ..., "attribute_value": ...}``
+objects.
+"""
+
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils.text import slugify
+
+from categories.models import Category
+from .batches import BatchReport, validate_rows
+from .facets import ATTRIBUTE_FILTER_PREFIX
+from .indexing import loaded_indexes
+from .leaderboards import get_leaderboards
+from .models import Product, ProductAttribute
+from .serializers import ProductImportRowSerializer
+from .signals import attribute_signals_muted
+
+FORMATS = ('csv', 'jsonl')
+
+# Columns written on insert and overwritten when the SKU already exists
+UPDATE_FIELDS = [
+    'name', 'description', 'short_description', 'price', 'discount_price',
+    'quantity_in_stock', 'category', 'image', 'is_active', 'is_featured', 'updated_at',
+]
+
+
+# Separates the values of one attribute within a CSV cell
+ATTRIBUTE_VALUE_SEPARATOR = ';'
+
+
+def join_attribute_values(values):
+    """CSV cell holding every value of one attribute (see split_attribute_values)"""
+    separator = ATTRIBUTE_VALUE_SEPARATOR
+    escaped = (value.replace('\\', '\\\\').replace(separator, '\\' + separator)
+               for value in values)
+    return f'{separator} '.join(escaped)
+
+
+def split_attribute_values(cell):
+    """The non-empty values of a CSV attribute cell, unescaped"""
+    values, current = [], []
+    chars = iter(cell)
+    for char in chars:
+        if char == '\\':
+            current.append(next(chars, ''))
+        elif char == ATTRIBUTE_VALUE_SEPARATOR:
+            values.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    values.append(''.join(current).strip())
+    return [value for value in values if value]
+
+
+class ImportFormatError(ValueError):
+    """The uploaded file cannot be parsed in the requested format"""
+
+
+def detect_format(filename, default='csv'):
+    suffix = str(filename).rsplit('.', 1)[-1].lower()
+    if suffix in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if suffix == 'csv':
+        return 'csv'
+    return default
+
+
+def _text_stream(stream):
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+def iter_csv_rows(stream):
+    reader = csv.DictReader(_text_stream(stream))
+    for row in reader:
+        data = {}
+        attributes = []
+        for column, value in row.items():
+            if column is None:
+                continue
+            value = (value or '').strip()
+            if column.startswith(ATTRIBUTE_FILTER_PREFIX):
+                attributes.extend(
+                    {'attribute_key': column[len(ATTRIBUTE_FILTER_PREFIX):],
+                     'attribute_value': attribute_value}
+                    for attribute_value in split_attribute_values(value))
+            elif value != '':
+                # Empty cells fall back to the serializer defaults
+                data[column] = value
+        if attributes:
+            data['attributes'] = attributes
+        yield reader.line_num, data
+
+
+def iter_jsonl_rows(stream):
+    for line_number, line in enumerate(_text_stream(stream), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as exc:
+            yield line_number, ImportFormatError(f'Invalid JSON: {exc}')
+            continue
+        if not isinstance(data, dict):
+            yield line_number, ImportFormatError('Each line must be a JSON object')
+            continue
+        yield line_number, data
+
+
+class ImportReport(BatchReport):
+    """Running totals and per-row errors for one import"""
+
+    def __init__(self, max_errors=None):
+        super().__init__()
+        self.max_errors = max_errors or settings.PRODUCT_IMPORT_MAX_ERRORS
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        self.errors_truncated = False
+
+    def error(self, line, sku, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': line, 'sku': sku, 'errors': errors})
+        else:
+            self.errors_truncated = True
+
+    failure = error
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'batches': self.batches,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'errors': self.errors,
+            'errors_truncated': self.errors_truncated,
+        }
+
+
+class ProductImporter:
+    """Upserts products by SKU from a stream of rows, one batch at a time"""
+
+    def __init__(self, created_by=None, batch_size=None, report=None):
+        self.created_by = created_by
+        self.batch_size = batch_size or settings.PRODUCT_IMPORT_BATCH_SIZE
+        self.report = report or ImportReport()
+
+    def run(self, stream, fmt, on_batch=None):
+        if fmt not in FORMATS:
+            raise ImportFormatError(f'Unsupported format "{fmt}"; use one of {", ".join(FORMATS)}')
+        rows = iter_csv_rows(stream) if fmt == 'csv' else iter_jsonl_rows(stream)
+        try:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch)
+                if on_batch:
+                    on_batch(self.report)
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise ImportFormatError(str(exc))
+        finally:
+            self.report.finished = time.monotonic()
+            self.notify()
+        return self.report
+
+    def validate_batch(self, batch):
+        """Return {sku: (line, validated data)}, recording per-row errors"""
+        self.report.rows += len(batch)
+        valid = validate_rows(batch, ProductImportRowSerializer, self.report)
+
+        category_ids = {row['category'] for _, row in valid.values() if row['category']}
+        known = set(Category.objects.filter(pk__in=category_ids).values_list('pk', flat=True))
+        for sku, (line, row) in list(valid.items()):
+            if row['category'] and row['category'] not in known:
+                self.report.error(line, sku, {
+                    'category': [f'Invalid pk "{row["category"]}" - object does not exist.']})
+                del valid[sku]
+        return valid
+
+    def build_products(self, valid):
+        """Build unsaved Product instances, choosing non-colliding slugs for new SKUs"""
+        existing = dict(Product.objects.filter(sku__in=valid).values_list('sku', 'slug'))
+        wanted = {sku: slugify(row['name'])[:255] or slugify(sku) for sku, (_, row) in valid.items()
+                  if sku not in existing}
+        taken = set(Product.objects.filter(slug__in=wanted.values()).values_list('slug', flat=True))
+
+        products = []
+        for sku, (_, row) in valid.items():
+            if sku in existing:
+                slug = existing[sku]
+            else:
+                slug = wanted[sku]
+                if slug in taken:
+                    slug = slugify(f'{row["name"]}-{sku}')[:255]
+                taken.add(slug)
+            fields = {k: v for k, v in row.items() if k not in ('attributes', 'category')}
+            products.append(Product(
+                slug=slug, category_id=row['category'], created_by=self.created_by, **fields))
+        return products, existing
+
+    def import_batch(self, batch):
+        self.report.batches += 1
+        valid = self.validate_batch(batch)
+        if not valid:
+            return
+
+        try:
+            with transaction.atomic():
+                products, existing = self.build_products(valid)
+                Product.objects.bulk_create(
+                    products,
+                    update_conflicts=True,
+                    unique_fields=['sku'],
+                    update_fields=UPDATE_FIELDS,
+                )
+                ids = dict(Product.objects.filter(sku__in=valid).values_list('sku', 'pk'))
+
+                with_attributes = [sku for sku, (_, row) in valid.items() if 'attributes' in row]
+                if with_attributes:
+                    # The upsert above already bumped updated_at and logged these
+                    # products once, and notify() resyncs the indexes
+                    with attribute_signals_muted():
+                        ProductAttribute.objects.filter(
+                            product_id__in=[ids[sku] for sku in with_attributes]).delete()
+                    ProductAttribute.objects.bulk_create([
+                        ProductAttribute(product_id=ids[sku], **attr)
+                        for sku in with_attributes
+                        for attr in valid[sku][1]['attributes']
+                    ], ignore_conflicts=True)
+        except DatabaseError as exc:
+            for sku, (line, _) in valid.items():
+                self.report.error(line, sku, {'non_field_errors': [str(exc)]})
+            return
+
+        self.report.updated += len(existing)
+        self.report.created += len(valid) - len(existing)
+
+    def notify(self):
+        """bulk_create skips signals, so ask in-memory views to catch up"""
+        for index in loaded_indexes():
+            index.expire()
+        leaderboards = get_leaderboards()
+        if leaderboards.loaded:
+            leaderboards.invalidate()
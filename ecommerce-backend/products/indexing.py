@@ -0,0 +1,235 @@
+"""
+Shared machinery for in-process product indexes
+
+An index is loaded from the database (or a snapshot), refreshed per product
+from model signals in the worker that made the write, and pulled forward
+from ``Product.updated_at`` every ``INDEX_SYNC_INTERVAL`` seconds to pick up
+writes made by other workers.
+
+Web workers load and sync every index on a background thread
+(``start_index_refresher``, started from the WSGI module), so requests only
+read; a request arriving before the first load waits for it (up to
+``INDEX_LOAD_TIMEOUT`` seconds) rather than building the index itself, and
+gets a 503 if the load fails or times out. Without a refresher (tests, management commands)
+indexes load and sync inline on first use.
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+
+class IndexUnavailable(APIException):
+    """The index has not finished its first load"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The product index is still loading; try again shortly.'
+    default_code = 'index_unavailable'
+
+
+class ProductIndex:
+    """Base class for incrementally maintained in-memory product indexes"""
+
+    name = None
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        # Set once the first load has finished or failed
+        self.ready = threading.Event()
+        self.load_error = None
+        self.clear()
+
+    def clear(self):
+        """Drop every indexed product; subclasses reset their own structures"""
+        with self.lock:
+            self.watermark = None
+            self.last_sync = 0.0
+
+    def add(self, product):
+        """Index (or re-index) a product instance"""
+        raise NotImplementedError
+
+    def remove(self, product_id):
+        """Drop a product from the index"""
+        raise NotImplementedError
+
+    def get_queryset(self):
+        from .models import Product
+        return Product.objects.prefetch_related('attributes')
+
+    def sales_changed(self, product):
+        """Hook for counter writes that bypass model signals"""
+
+    def category_changed(self, category_id):
+        """Hook for category writes; product rows are re-indexed separately"""
+
+    def index_products(self, products):
+        count = 0
+        with self.lock:
+            for product in products:
+                self.add(product)
+                count += 1
+        return count
+
+    def reindex(self, product_id):
+        """Re-read a single product from the database and index it"""
+        product = self.get_queryset().filter(pk=product_id).first()
+        if product is None:
+            self.remove(product_id)
+        else:
+            self.index_products([product])
+
+    def build(self):
+        """Rebuild the whole index from the database"""
+        started = timezone.now()
+        with self.lock:
+            self.clear()
+            count = self.index_products(
+                self.get_queryset().order_by('pk').iterator(chunk_size=2000))
+            self.watermark = started
+            self.last_sync = time.monotonic()
+            self.loaded = True
+        logger.info('Built %s index with %d products', self.name, count)
+        return count
+
+    def sync(self):
+        """Index products written since the last sync (e.g. by other workers)"""
+        started = timezone.now()
+        with self.lock:
+            if self.watermark is None:
+                return 0
+            since = self.watermark - timedelta(seconds=settings.INDEX_SYNC_MARGIN)
+            count = self.index_products(
+                self.get_queryset().filter(updated_at__gte=since).iterator(chunk_size=2000))
+            self.watermark = started
+            self.last_sync = time.monotonic()
+        return count
+
+    def expire(self):
+        """Sync soon, e.g. after writes that bypass model signals"""
+        with self.lock:
+            self.last_sync = float('-inf')
+        if _refresher is not None:
+            _refresher.wake()
+
+    def load_snapshot(self):
+        """Restore a persisted copy of the index; returns False if unsupported"""
+        return False
+
+    def refresh(self):
+        """Load (or build) the index if needed, else sync it when due"""
+        with self.lock:
+            if not self.loaded:
+                try:
+                    if self.load_snapshot():
+                        self.sync()
+                    else:
+                        self.build()
+                except Exception as exc:
+                    # Release waiting requests; the refresher retries on its next pass
+                    self.load_error = exc
+                    self.ready.set()
+                    raise
+                self.load_error = None
+            elif time.monotonic() - self.last_sync >= settings.INDEX_SYNC_INTERVAL:
+                self.sync()
+        self.ready.set()
+
+    def ensure_loaded(self):
+        """Make the index usable for a request (read-only once a refresher runs)"""
+        refresher = _refresher
+        if refresher is None:
+            self.refresh()
+        elif not self.loaded:
+            refresher.wake()
+            self.ready.wait(settings.INDEX_LOAD_TIMEOUT)
+            if not self.loaded:
+                if self.load_error is not None:
+                    logger.warning('%s index unavailable: %r', self.name, self.load_error)
+                raise IndexUnavailable()
+
+
+class IndexRefresher:
+    """Background thread loading every registered index and keeping it in sync"""
+
+    def __init__(self):
+        self.woken = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='index-refresh', daemon=True)
+
+    def wake(self):
+        self.woken.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.woken.clear()
+            for name in list(_registry):
+                try:
+                    get_index(name).refresh()
+                except Exception:
+                    logger.exception('Failed to refresh %s index', name)
+                finally:
+                    connections.close_all()
+            self.woken.wait(settings.INDEX_SYNC_INTERVAL)
+
+    def stop(self, timeout=None):
+        self.stopped.set()
+        self.woken.set()
+        self.thread.join(timeout)
+
+
+_registry = {}
+_instances = {}
+_registry_lock = threading.Lock()
+_refresher = None
+
+
+def register_index(cls):
+    """Class decorator registering a ProductIndex subclass under its name"""
+    _registry[cls.name] = cls
+    return cls
+
+
+def get_index(name):
+    """Return the process-wide instance of a registered index"""
+    with _registry_lock:
+        if name not in _instances:
+            _instances[name] = _registry[name]()
+        return _instances[name]
+
+
+def loaded_indexes():
+    """Return the indexes that have been loaded in this process"""
+    with _registry_lock:
+        return [index for index in _instances.values() if index.loaded]
+
+
+def start_index_refresher():
+    """Load every index now and sync them in the background from here on"""
+    global _refresher
+    # Importing the index modules registers them
+    from . import autocomplete, facets, search  # noqa: F401
+    with _registry_lock:
+        if _refresher is None:
+            _refresher = IndexRefresher()
+            _refresher.thread.start()
+        return _refresher
+
+
+def reset_indexes():
+    """Drop every process-wide index (used by tests and after rebuilds)"""
+    global _refresher
+    refresher, _refresher = _refresher, None
+    if refresher is not None:
+        refresher.stop(timeout=10)
+    with _registry_lock:
+        _instances.clear()
@@ -0,0 +1,201 @@
+"""
+Materialized product leaderboards
+
+The featured / best sellers / top rated / latest / trending lists are kept in memory as
+already-serialized top-N lists. Each board stores a window of the best
+``LEADERBOARD_SIZE * LEADERBOARD_BUFFER_FACTOR`` rows so that product writes
+can be applied incrementally; a board is only re-queried when removals shrink
+the window below ``LEADERBOARD_SIZE`` or when it is older than
+``LEADERBOARD_MAX_AGE`` seconds (which also bounds staleness across workers).
+"""
+
+import threading
+import time
+from bisect import insort
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+from ecommerce_project.images import absolute_srcset
+
+
+@dataclass(frozen=True)
+class Leaderboard:
+    """Definition of a top-N list: which products qualify and how they rank"""
+    name: str
+    ordering: tuple
+    filters: dict = field(default_factory=dict)
+    # Fields that must be set for a product to be ranked at all
+    required: tuple = ()
+
+    def qualifies(self, product):
+        return product.is_active and all(
+            getattr(product, name) == value for name, value in self.filters.items()
+        ) and all(getattr(product, name) is not None for name in self.required)
+
+    def sort_key(self, product):
+        key = []
+        for item in self.ordering:
+            value = getattr(product, item.lstrip('-'))
+            if hasattr(value, 'timestamp'):
+                value = value.timestamp()
+            key.append(-value if item.startswith('-') else value)
+        key.append(-product.pk)
+        return tuple(key)
+
+    def filter(self, queryset):
+        """Restrict a product queryset to the rows that qualify"""
+        return queryset.filter(
+            **self.filters, **{f'{name}__isnull': False for name in self.required})
+
+    def get_queryset(self):
+        from .models import Product
+        return (self.filter(Product.objects.filter(is_active=True))
+                .select_related('category')
+                .order_by(*self.ordering, '-pk'))
+
+
+LEADERBOARDS = {
+    board.name: board for board in (
+        Leaderboard('featured', ('-sales_count',), {'is_featured': True}),
+        Leaderboard('best_sellers', ('-sales_count',)),
+        Leaderboard('top_rated', ('-average_rating',)),
+        Leaderboard('latest', ('-created_at',)),
+        Leaderboard('trending', ('-trending_score',), required=('trending_score',)),
+    )
+}
+
+
+class BoardState:
+    """Sorted window of (sort key, product id, serialized data) entries"""
+
+    def __init__(self, entries, exhaustive):
+        self.entries = entries
+        self.exhaustive = exhaustive
+        self.positions = {product_id for _, product_id, _ in entries}
+        self.built_at = time.monotonic()
+        self.dirty = False
+
+    def remove(self, product_id):
+        if product_id not in self.positions:
+            return
+        self.positions.discard(product_id)
+        self.entries = [entry for entry in self.entries if entry[1] != product_id]
+
+
+class LeaderboardStore:
+    """Process-wide cache of materialized leaderboards"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.boards = {}
+
+    @property
+    def size(self):
+        return settings.LEADERBOARD_SIZE
+
+    @property
+    def capacity(self):
+        return settings.LEADERBOARD_SIZE * settings.LEADERBOARD_BUFFER_FACTOR
+
+    @property
+    def loaded(self):
+        return bool(self.boards)
+
+    def serialize(self, product):
+        from .serializers import ProductListSerializer
+        return ProductListSerializer(product).data
+
+    def build(self, name):
+        board = LEADERBOARDS[name]
+        products = list(board.get_queryset()[:self.capacity])
+        state = BoardState(
+            [(board.sort_key(p), p.pk, self.serialize(p)) for p in products],
+            exhaustive=len(products) < self.capacity,
+        )
+        with self.lock:
+            self.boards[name] = state
+        return state
+
+    def get(self, name):
+        """Return the serialized top-N list for a board"""
+        with self.lock:
+            state = self.boards.get(name)
+            if (state is None or state.dirty
+                    or time.monotonic() - state.built_at >= settings.LEADERBOARD_MAX_AGE):
+                state = self.build(name)
+            return [data for _, _, data in state.entries[:self.size]]
+
+    def product_changed(self, product):
+        """Apply a product write to every built board"""
+        with self.lock:
+            data = None
+            for name, state in self.boards.items():
+                board = LEADERBOARDS[name]
+                state.remove(product.pk)
+                if board.qualifies(product):
+                    key = board.sort_key(product)
+                    if state.exhaustive or (state.entries and key < state.entries[-1][0]):
+                        if data is None:
+                            data = self.serialize(product)
+                        insort(state.entries, (key, product.pk, data), key=lambda e: e[0])
+                        state.positions.add(product.pk)
+                        if len(state.entries) > self.capacity:
+                            _, dropped, _ = state.entries.pop()
+                            state.positions.discard(dropped)
+                            state.exhaustive = False
+                if len(state.entries) < self.size and not state.exhaustive:
+                    state.dirty = True
+
+    def product_removed(self, product_id):
+        with self.lock:
+            for state in self.boards.values():
+                state.remove(product_id)
+                if len(state.entries) < self.size and not state.exhaustive:
+                    state.dirty = True
+
+    def invalidate(self):
+        """Force every board to be rebuilt on next read"""
+        with self.lock:
+            for state in self.boards.values():
+                state.dirty = True
+
+
+def with_absolute_urls(data, request):
+    """Copy serialized products, making image URLs absolute like a request-bound serializer"""
+    def absolute(url):
+        return request.build_absolute_uri(url) if url else url
+
+    def with_urls(item):
+        item = dict(item, image=absolute(item['image']))
+        if 'image_srcset' in item:
+            item['image_srcset'] = absolute_srcset(item['image_srcset'], request)
+        return item
+
+    items = []
+    for item in data:
+        item = with_urls(item)
+        if item.get('category'):
+            item['category'] = with_urls(item['category'])
+        items.append(item)
+    return items
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_leaderboards():
+    """Return the process-wide leaderboard store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LeaderboardStore()
+        return _store
+
+
+def reset_leaderboards():
+    """Drop the process-wide leaderboard store (used by tests)"""
+    global _store
+    with _store_lock:
+        _store = None
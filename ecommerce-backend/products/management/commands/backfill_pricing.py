@@ -0,0 +1,34 @@
+"""
+Django management command to recompute the denormalized pricing columns
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from products.models import Product, pricing_expressions
+
+
+class Command(BaseCommand):
+    help = 'Recompute effective_price and discount_percentage for products whose values are stale'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Number of primary keys covered by each UPDATE'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        expressions = pricing_expressions()
+        last_pk = Product.objects.aggregate(last=Max('pk'))['last'] or 0
+
+        updated = 0
+        for start in range(0, last_pk + 1, batch_size):
+            # Only rows that drifted (e.g. raw SQL writes) are rewritten
+            updated += Product.objects.filter(
+                pk__gte=start, pk__lt=start + batch_size
+            ).exclude(**expressions).update(**expressions)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Updated pricing for {updated} products'))
@@ -0,0 +1,111 @@
+"""
+Django management command to compare product list serialization paths
+"""
+
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from categories.models import Category
+from products.models import Product
+from products.serializers import (
+    ProductListSerializer,
+    product_list_values,
+    serialize_product_values,
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time ProductListSerializer against the .values() fast path for one list page'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=100,
+            help='Rows per rendered page'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Pages rendered per path'
+        )
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Create page-size throwaway products inside a rolled back transaction'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options['page_size'])
+                self.run(options['page_size'], options['iterations'])
+                if options['seed']:
+                    raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        category = Category.objects.create(name='Benchmark Category')
+        Product.objects.bulk_create([
+            Product(
+                name=f'Benchmark Product {number}',
+                slug=f'benchmark-product-{number}',
+                sku=f'BENCH-{number:06d}',
+                description='Benchmark product',
+                price=Decimal('19.99') + number,
+                discount_price=Decimal('14.99') + number if number % 3 == 0 else None,
+                quantity_in_stock=number % 7,
+                category=category,
+                image=f'products/benchmark-{number}.jpg',
+            )
+            for number in range(count)
+        ])
+
+    def run(self, page_size, iterations):
+        queryset = (Product.objects.filter(is_active=True)
+                    .select_related('category').order_by('-created_at', '-pk'))
+        if queryset.count() < page_size:
+            raise CommandError(
+                f'Need at least {page_size} active products; pass --seed to create them')
+
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'),
+                    'localhost')
+        context = {'request': RequestFactory().get('/api/products/', HTTP_HOST=host)}
+        renderer = JSONRenderer()
+
+        def serializer_path():
+            page = list(queryset[:page_size])
+            return renderer.render(ProductListSerializer(page, many=True, context=context).data)
+
+        def values_path():
+            page = list(product_list_values(queryset)[:page_size])
+            return renderer.render(serialize_product_values(page, context))
+
+        if serializer_path() != values_path():
+            raise CommandError('Fast path output differs from ProductListSerializer')
+
+        timings = {}
+        for name, render in (('serializer', serializer_path), ('values', values_path)):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                render()
+            timings[name] = (time.perf_counter() - started) / iterations * 1000
+
+        for name, elapsed in timings.items():
+            self.stdout.write(f'{name:>10}: {elapsed:8.2f} ms per page of {page_size}')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Fast path is {timings["serializer"] / timings["values"]:.1f}x faster '
+            f'(output identical)'))
@@ -0,0 +1,55 @@
+"""
+Django management command to apply price and stock updates from CSV or JSONL
+"""
+
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.bulk_updates import PriceStockUpdater
+from products.importers import (
+    FORMATS,
+    ImportFormatError,
+    detect_format,
+    iter_csv_rows,
+    iter_jsonl_rows,
+)
+
+
+class Command(BaseCommand):
+    help = 'Set price, discount_price and quantity_in_stock by SKU in set-based batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file, or "-" to read standard input')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Feed format (default: from the file extension, else csv)')
+        parser.add_argument('--batch-size', type=int,
+                            help='Rows per batch (default: PRODUCT_IMPORT_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        updater = PriceStockUpdater(batch_size=options['batch_size'])
+
+        def run(stream):
+            rows = iter_csv_rows(stream) if fmt == 'csv' else iter_jsonl_rows(stream)
+            return updater.run(rows)
+
+        try:
+            if path == '-':
+                report = run(sys.stdin.buffer)
+            else:
+                with open(path, 'rb') as stream:
+                    report = run(stream)
+        except (OSError, UnicodeDecodeError, csv.Error, ImportFormatError) as exc:
+            raise CommandError(str(exc))
+
+        for result in report.results:
+            if result['status'] == 'failed':
+                self.stderr.write(f'row {result["row"]} ({result["sku"]}): {result["errors"]}')
+
+        style = self.style.SUCCESS if not report.failed else self.style.WARNING
+        self.stdout.write(style(
+            f'✅ Processed {report.rows} rows in {report.elapsed:.2f}s: {report.updated} updated, '
+            f'{report.unchanged} unchanged, {report.failed} failed'))
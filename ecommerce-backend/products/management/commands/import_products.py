@@ -0,0 +1,61 @@
+"""
+Django management command to bulk import products from CSV or JSONL
+"""
+
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importers import FORMATS, ImportFormatError, ProductImporter, detect_format
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Stream products from a CSV or JSONL feed, upserting by SKU in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file, or "-" to read standard input')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Feed format (default: from the file extension, else csv)')
+        parser.add_argument('--batch-size', type=int,
+                            help='Rows per batch (default: PRODUCT_IMPORT_BATCH_SIZE)')
+        parser.add_argument('--user', help='Username recorded as creator of new products')
+
+    def handle(self, *args, **options):
+        created_by = None
+        if options['user']:
+            try:
+                created_by = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User "{options["user"]}" does not exist')
+
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        importer = ProductImporter(created_by=created_by, batch_size=options['batch_size'])
+
+        def progress(report):
+            self.stdout.write(
+                f'  batch {report.batches}: {report.rows} rows, {report.failed} failed, '
+                f'{report.rows_per_second:.0f} rows/s')
+
+        try:
+            if path == '-':
+                report = importer.run(sys.stdin.buffer, fmt, on_batch=progress)
+            else:
+                with open(path, 'rb') as stream:
+                    report = importer.run(stream, fmt, on_batch=progress)
+        except (OSError, ImportFormatError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report.errors:
+            self.stderr.write(f'row {error["row"]} ({error["sku"]}): {error["errors"]}')
+        if report.errors_truncated:
+            self.stderr.write(f'... {report.failed - len(report.errors)} more errors not shown')
+
+        style = self.style.SUCCESS if not report.failed else self.style.WARNING
+        self.stdout.write(style(
+            f'✅ Imported {report.rows} rows in {report.elapsed:.2f}s '
+            f'({report.rows_per_second:.0f} rows/s): {report.created} created, '
+            f'{report.updated} updated, {report.failed} failed'))
@@ -0,0 +1,316 @@
+"""
+Django management command to propose composite and partial indexes from recorded query shapes
+"""
+
+import math
+from collections import defaultdict
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.utils import run_formatters
+from django.db import migrations, models
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.db.models import Count, Q
+
+from ecommerce_project.query_shapes import read_shape_log
+
+# Assumed fraction of rows kept by one range comparison (price between, date after)
+RANGE_SELECTIVITY = 0.3
+
+
+def _name(field):
+    return field.lstrip('-')
+
+
+def existing_indexes(model):
+    """Return (fields, condition) for every index the model already has"""
+    opts = model._meta
+    indexes = []
+    for index in opts.indexes:
+        condition = None
+        if index.condition is not None:
+            # Only plain AND-ed equality conditions are understood
+            if index.condition.connector != Q.AND or index.condition.negated or not all(
+                    isinstance(child, tuple) for child in index.condition.children):
+                continue
+            condition = dict(index.condition.children)
+        indexes.append((tuple(index.fields), condition))
+    for field in opts.local_concrete_fields:
+        if not field.primary_key and (field.db_index or field.unique):
+            indexes.append(((field.name,), None))
+    for fields in opts.unique_together:
+        indexes.append((tuple(fields), None))
+    return indexes
+
+
+def index_definition(index):
+    """Source for a Meta.indexes entry matching ``index``"""
+    arguments = [f'fields={index.fields!r}']
+    if index.condition is not None:
+        arguments.append('condition=Q({})'.format(', '.join(
+            f'{field}={value!r}' for field, value in index.condition.children)))
+    arguments.append(f'name={index.name!r}')
+    return f'models.Index({", ".join(arguments)})'
+
+
+class TableStats:
+    """Row and distinct-value counts used to estimate selectivity"""
+
+    def __init__(self, model):
+        self.model = model
+        self.rows = model._default_manager.count()
+        self.distinct = {}
+        self.matching = {}
+
+    def selectivity(self, field, value=None):
+        if not self.rows:
+            return 1.0
+        if value is not None:
+            key = (field, value)
+            if key not in self.matching:
+                self.matching[key] = self.model._default_manager.filter(**{field: value}).count()
+            return self.matching[key] / self.rows
+        if field not in self.distinct:
+            self.distinct[field] = self.model._default_manager.aggregate(
+                n=Count(field, distinct=True))['n']
+        return 1.0 / max(self.distinct[field], 1)
+
+
+def shape_cost(shape, stats, page_size, index=None):
+    """
+    Estimate rows touched to serve one page of ``shape``.
+
+    Without ``index`` this is a full scan plus a sort. ``None`` means the
+    index cannot be used for the shape at all.
+    """
+    rows = max(stats.rows, 1)
+    conditions = shape['conditions']
+    equality = set(shape['equality'])
+    ranges = set(shape['range'])
+
+    matched = 1.0
+    for field in equality:
+        matched *= stats.selectivity(field, conditions.get(field))
+    matched *= RANGE_SELECTIVITY ** len(ranges)
+    matching_rows = max(rows * matched, 1)
+    sort = matching_rows * math.log2(matching_rows + 1) if shape['ordering'] else 0
+
+    if index is None:
+        return rows + sort
+
+    fields, condition = index
+    if condition and any(conditions.get(field) != value for field, value in condition.items()):
+        return None
+
+    scanned = 1.0
+    consumed = set()
+    for field, value in (condition or {}).items():
+        scanned *= stats.selectivity(field, value)
+        consumed.add(field)
+    position = 0
+    while position < len(fields) and _name(fields[position]) in equality - consumed:
+        field = _name(fields[position])
+        scanned *= stats.selectivity(field, conditions.get(field))
+        consumed.add(field)
+        position += 1
+
+    used = bool(consumed)
+    ordered = not shape['ordering']
+    if position < len(fields) and _name(fields[position]) in ranges:
+        scanned *= RANGE_SELECTIVITY
+        used = True
+    elif shape['ordering']:
+        wanted = [_name(field) for field in shape['ordering']]
+        ordered = [_name(field) for field in fields[position:position + len(wanted)]] == wanted
+        used = used or ordered
+
+    if not used:
+        return None
+    if ordered:
+        # Rows come out in order; stop once a page of matches has been read
+        return min(rows * scanned, page_size * scanned / matched)
+    return rows * scanned + sort
+
+
+def candidate_indexes(shape, stats):
+    """Index layouts worth considering for one shape"""
+    condition = shape['conditions']
+    equality = sorted(
+        (field for field in shape['equality'] if field not in condition),
+        key=stats.selectivity)
+    candidates = []
+    for field in shape['range']:
+        candidates.append((tuple(equality) + (field,), condition or None))
+    if shape['ordering']:
+        candidates.append((tuple(equality) + tuple(shape['ordering']), condition or None))
+    elif equality:
+        candidates.append((tuple(equality), condition or None))
+    return [(fields, condition) for fields, condition in candidates if fields]
+
+
+class Command(BaseCommand):
+    help = 'Rank composite / partial index proposals by estimated benefit for recorded list queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log',
+            default=None,
+            help='Query shape log to read (defaults to QUERY_SHAPE_LOG)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=5,
+            help='Number of indexes to propose'
+        )
+        parser.add_argument(
+            '--min-queries',
+            type=int,
+            default=1,
+            help='Ignore shapes recorded fewer times than this'
+        )
+        parser.add_argument(
+            '--emit-migration',
+            action='store_true',
+            help='Write an AddIndex migration per app for the proposals'
+        )
+        parser.add_argument(
+            '--name',
+            default='advisor_indexes',
+            help='Name suffix of emitted migrations'
+        )
+        parser.add_argument(
+            '--output-dir',
+            default=None,
+            help="Directory for emitted migrations (defaults to each app's migrations package)"
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['log'] or settings.QUERY_SHAPE_LOG or '')
+        if not path.is_file():
+            raise CommandError(f'No query shape log at {path}')
+
+        shapes = defaultdict(lambda: defaultdict(int))
+        for shape, count in read_shape_log(path):
+            key = (tuple(shape['equality']), tuple(shape['range']),
+                   tuple(shape['ordering']), tuple(sorted(shape['conditions'].items())))
+            shapes[shape['model']][key] += count
+
+        page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 20
+        proposals = []
+        for label, counts in shapes.items():
+            try:
+                model = apps.get_model(label)
+            except LookupError:
+                self.stderr.write(f'Skipping unknown model {label}')
+                continue
+            workload = [
+                ({'equality': list(eq), 'range': list(rng), 'ordering': list(order),
+                  'conditions': dict(cond)}, count)
+                for (eq, rng, order, cond), count in counts.items()
+                if count >= options['min_queries']
+            ]
+            proposals.extend(self.rank(model, workload, page_size, options['top']))
+
+        proposals.sort(key=lambda proposal: (-proposal['benefit'], -proposal['queries']))
+        proposals = proposals[:options['top']]
+        if not proposals:
+            self.stdout.write(self.style.SUCCESS('✅ Existing indexes already cover the recorded queries'))
+            return
+
+        for rank, proposal in enumerate(proposals, 1):
+            where = ' AND '.join(f'{field}={value}' for field, value in
+                                 (proposal['condition'] or {}).items())
+            self.stdout.write(
+                f'{rank}. {proposal["model"]._meta.label} ({", ".join(proposal["fields"])})'
+                f'{f" WHERE {where}" if where else ""}: '
+                f'{proposal["queries"]} queries, est. {proposal["benefit"]:,.0f} rows saved')
+
+        if options['emit_migration']:
+            self.emit_migrations(proposals, options['name'], options['output_dir'])
+
+    def rank(self, model, workload, page_size, limit):
+        """Greedily pick the indexes that save the most estimated row reads"""
+        stats = TableStats(model)
+        indexes = existing_indexes(model)
+
+        def best_cost(shape, indexes):
+            costs = [shape_cost(shape, stats, page_size)]
+            costs += [shape_cost(shape, stats, page_size, index) for index in indexes]
+            return min(cost for cost in costs if cost is not None)
+
+        candidates = {
+            candidate
+            for shape, _ in workload
+            for candidate in map(self.freeze, candidate_indexes(shape, stats))
+        }
+        current = [best_cost(shape, indexes) for shape, _ in workload]
+
+        chosen = []
+        while candidates and len(chosen) < limit:
+            scored = []
+            for candidate in candidates:
+                index = (candidate[0], dict(candidate[1]) or None)
+                benefit, queries = 0.0, 0
+                for (shape, count), cost in zip(workload, current):
+                    new_cost = shape_cost(shape, stats, page_size, index)
+                    if new_cost is not None and new_cost < cost:
+                        benefit += count * (cost - new_cost)
+                        queries += count
+                scored.append((benefit, queries, candidate))
+            benefit, queries, candidate = max(scored, key=lambda item: item[:2])
+            if benefit <= 0:
+                break
+            candidates.discard(candidate)
+            index = (candidate[0], dict(candidate[1]) or None)
+            indexes.append(index)
+            current = [best_cost(shape, indexes) for shape, _ in workload]
+            chosen.append({
+                'model': model, 'fields': index[0], 'condition': index[1],
+                'benefit': benefit, 'queries': queries,
+            })
+        return chosen
+
+    @staticmethod
+    def freeze(candidate):
+        fields, condition = candidate
+        return tuple(fields), tuple(sorted((condition or {}).items()))
+
+    def emit_migrations(self, proposals, name, output_dir):
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        by_app = defaultdict(list)
+        for proposal in proposals:
+            by_app[proposal['model']._meta.app_label].append(proposal)
+
+        for app_label, app_proposals in by_app.items():
+            leaves = loader.graph.leaf_nodes(app_label)
+            number = max((MigrationAutodetector.parse_number(leaf[1]) or 0
+                          for leaf in leaves), default=0) + 1
+            migration = migrations.Migration(f'{number:04d}_{name}', app_label)
+            migration.dependencies = leaves
+
+            for proposal in app_proposals:
+                model = proposal['model']
+                condition = proposal['condition']
+                index = models.Index(
+                    fields=list(proposal['fields']),
+                    condition=Q(**condition) if condition else None,
+                    name='placeholder',
+                )
+                index.set_name_with_model(model)
+                migration.operations.append(
+                    migrations.AddIndex(model_name=model._meta.model_name, index=index))
+                # The model state must match, or the next makemigrations drops the index
+                self.stdout.write(
+                    f'   Add to {model.__name__}.Meta.indexes: {index_definition(index)}')
+
+            writer = MigrationWriter(migration)
+            target = Path(output_dir) / f'{migration.name}.py' if output_dir else Path(writer.path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(writer.as_string())
+            run_formatters([str(target)])
+            self.stdout.write(self.style.SUCCESS(f'✅ Wrote {target}'))
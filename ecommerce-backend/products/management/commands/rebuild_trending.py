@@ -0,0 +1,22 @@
+"""
+Django management command to recompute trending scores from activity buckets
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.leaderboards import get_leaderboards
+from products.trending import rebuild_scores
+
+
+class Command(BaseCommand):
+    help = 'Prune old activity buckets and recompute every product trending score'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Products written per UPDATE (default: 1000)')
+
+    def handle(self, *args, **options):
+        scored, pruned = rebuild_scores(batch_size=options['batch_size'])
+        get_leaderboards().invalidate()
+        self.stdout.write(f'{pruned} expired buckets pruned')
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt trending scores for {scored} products'))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["updated_at"], name="products_updated_b2f96c_idx"
+            ),
+        ),
+    ]
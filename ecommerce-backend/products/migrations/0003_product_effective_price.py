@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:07
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Cast, Floor
+from django.db.models.lookups import GreaterThan, LessThan
+
+
+def backfill_pricing(apps, schema_editor):
+    # A frozen copy of products.models.pricing_expressions() as of this migration
+    Product = apps.get_model("products", "Product")
+    price, discount = F("price"), F("discount_price")
+    has_discount = GreaterThan(discount, Decimal("0"))
+    Product.objects.update(
+        effective_price=models.Case(
+            models.When(has_discount, then=discount),
+            default=price,
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+        discount_percentage=models.Case(
+            models.When(
+                models.Q(has_discount, LessThan(discount, price)),
+                then=Cast(Floor((price - discount) * 100 / price), models.IntegerField()),
+            ),
+            default=Value(0),
+            output_field=models.IntegerField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0002_product_updated_at_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="discount_percentage",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="effective_price",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=10
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["effective_price"], name="products_effecti_55e56a_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["discount_percentage"], name="products_discoun_df4ee0_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_pricing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:32
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def seed_change_log(apps, schema_editor):
+    # One "created" entry per existing product lets a new consumer bootstrap
+    # from the feed alone
+    Product = apps.get_model("products", "Product")
+    ProductChange = apps.get_model("products", "ProductChange")
+    now = django.utils.timezone.now()
+    batch = []
+    for product_id in (
+        Product.objects.order_by("pk").values_list("pk", flat=True).iterator()
+    ):
+        batch.append(
+            ProductChange(product_id=product_id, action="created", changed_at=now)
+        )
+        if len(batch) == 1000:
+            ProductChange.objects.bulk_create(batch)
+            batch = []
+    ProductChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0004_product_image_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("product_id", models.BigIntegerField()),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("created", "Created"),
+                            ("updated", "Updated"),
+                            ("deactivated", "Deactivated"),
+                            ("deleted", "Deleted"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("changed_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "db_table": "product_changes",
+                "ordering": ["id"],
+            },
+        ),
+        migrations.RunPython(seed_change_log, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0005_productchange"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductActivity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("sales", models.PositiveIntegerField(default=0)),
+                ("reviews", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "db_table": "product_activity",
+            },
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="trending_score",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["-trending_score"], name="products_trendin_7c4380_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="productactivity",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="activity",
+                to="products.product",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productactivity",
+            index=models.Index(fields=["bucket"], name="product_act_bucket_c07975_idx"),
+        ),
+        migrations.AlterUniqueTogether(
+            name="productactivity",
+            unique_together={("product", "bucket")},
+        ),
+    ]
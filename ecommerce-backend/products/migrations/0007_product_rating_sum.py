@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:58
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def seed_review_stats(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    Review = apps.get_model("reviews", "Review")
+    totals = {
+        row["product_id"]: (row["count"], row["total"])
+        for row in Review.objects.order_by()
+        .values("product_id")
+        .annotate(count=Count("pk"), total=Sum("rating"))
+    }
+    products = []
+    for product in Product.objects.only("pk"):
+        count, total = totals.get(product.pk, (0, 0))
+        product.review_count = count
+        product.rating_sum = total
+        product.average_rating = total / count if count else 0.0
+        products.append(product)
+    Product.objects.bulk_update(
+        products, ["review_count", "rating_sum", "average_rating"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0006_product_trending"),
+        ("reviews", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(seed_review_stats, migrations.RunPython.noop),
+    ]
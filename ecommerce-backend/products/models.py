@@ -2,13 +2,172 @@
 Models for products app
 """
 
-from django.db import models
+from decimal import Decimal
+
+from django.db import connections, models, router, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Cast, Floor
+from django.db.models.lookups import GreaterThan, LessThan
 from django.core.validators import MinValueValidator, MaxValueValidator, FileExtensionValidator
+from django.utils import timezone
 from django.utils.text import slugify
+from categories.counts import (
+    ROW_FIELDS, TRACKED_FIELDS, CategoryTracker, apply_changes, fetch_rows, product_row,
+)
 from categories.models import Category
 from accounts.models import User
 
 
+# Columns that effective_price / discount_percentage are derived from
+PRICING_SOURCE_FIELDS = {'price', 'discount_price'}
+PRICING_DERIVED_FIELDS = ['effective_price', 'discount_percentage']
+# Writes touching only these columns are left out of the change feed
+CHANGE_LOG_IGNORED_FIELDS = {'sales_count', 'trending_score'}
+
+
+def pricing_expressions(**values):
+    """
+    SQL expressions computing the derived pricing columns.
+
+    ``price`` / ``discount_price`` default to the stored columns; pass the new
+    values of an UPDATE so both derived columns are written by the same
+    statement (SET clauses see the row as it was before the update).
+    """
+    def expression(field):
+        if field not in values:
+            return F(field)
+        value = values[field]
+        if hasattr(value, 'resolve_expression'):
+            return value
+        return Value(value, output_field=models.DecimalField(max_digits=10, decimal_places=2))
+
+    price = expression('price')
+    discount = expression('discount_price')
+    has_discount = GreaterThan(discount, Decimal('0'))
+    return {
+        'effective_price': models.Case(
+            models.When(has_discount, then=discount),
+            default=price,
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+        'discount_percentage': models.Case(
+            models.When(
+                models.Q(has_discount, LessThan(discount, price)),
+                then=Cast(Floor((price - discount) * 100 / price), models.IntegerField()),
+            ),
+            default=Value(0),
+            output_field=models.IntegerField(),
+        ),
+    }
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Keeps the derived pricing columns in sync on bulk writes, and records
+    every write in the change log (ProductChange) in the same transaction.
+    """
+
+    def update(self, **kwargs):
+        if PRICING_SOURCE_FIELDS & kwargs.keys():
+            kwargs.update(pricing_expressions(
+                **{field: kwargs[field] for field in PRICING_SOURCE_FIELDS & kwargs.keys()}))
+        if kwargs.keys() <= CHANGE_LOG_IGNORED_FIELDS:
+            return super().update(**kwargs)
+        action = ProductChange.DEACTIVATED if kwargs.get('is_active') is False else ProductChange.UPDATED
+        with transaction.atomic(using=self.db, savepoint=False):
+            # Logged first: the WHERE clause may stop matching once the rows change
+            self.log_changes(action)
+            if not TRACKED_FIELDS & kwargs.keys():
+                return super().update(**kwargs)
+            tracker = CategoryTracker(self)
+            updated = super().update(**kwargs)
+            tracker.apply()
+            return updated
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.sync_pricing()
+        update_fields = kwargs.get('update_fields')
+        if update_fields and PRICING_SOURCE_FIELDS & set(update_fields):
+            kwargs['update_fields'] = _with_pricing_fields(update_fields)
+        unique_fields = kwargs.get('unique_fields') or ()
+        upsert = kwargs.get('update_conflicts') and len(unique_fields) == 1
+        with transaction.atomic(using=self.db, savepoint=False):
+            if upsert:
+                # Upserted rows do not get their primary keys back
+                field = unique_fields[0]
+                upserted = self.model._default_manager.using(self.db).filter(**{
+                    f'{field}__in': [getattr(obj, field) for obj in objs]
+                })
+                tracker = CategoryTracker(upserted, pin=False)
+            created = super().bulk_create(objs, *args, **kwargs)
+            if upsert:
+                upserted.log_changes(ProductChange.UPDATED)
+                tracker.apply()
+            else:
+                inserted = [obj for obj in created if obj.pk is not None]
+                record_changes([obj.pk for obj in inserted], ProductChange.CREATED, using=self.db)
+                apply_changes({}, {obj.pk: product_row(obj) for obj in inserted}, using=self.db)
+        return created
+
+    bulk_create.alters_data = True
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if PRICING_SOURCE_FIELDS & set(fields):
+            for obj in objs:
+                obj.sync_pricing()
+            fields = _with_pricing_fields(fields)
+        # bulk_update() runs update() per batch, which logs the changes and
+        # keeps category counts and stats
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    bulk_update.alters_data = True
+
+    def add_review_stats(self, count, rating_total):
+        """Apply a change in review count and rating sum, deriving average_rating, in one UPDATE"""
+        review_count = F('review_count') + count
+        rating_sum = F('rating_sum') + rating_total
+        return self.update(
+            review_count=review_count,
+            rating_sum=rating_sum,
+            average_rating=models.Case(
+                models.When(GreaterThan(review_count, 0), then=(
+                    Cast(rating_sum, models.FloatField())
+                    / Cast(review_count, models.FloatField()))),
+                default=Value(0.0),
+                output_field=models.FloatField(),
+            ),
+            updated_at=timezone.now(),
+        )
+
+    add_review_stats.alters_data = True
+
+    def log_changes(self, action=None):
+        """Append a change log row for every matching product with one INSERT ... SELECT"""
+        action = action or ProductChange.UPDATED
+        connection = connections[self.db]
+        sql, params = self.order_by().values('pk').query.sql_with_params()
+        table = connection.ops.quote_name(ProductChange._meta.db_table)
+        changed_at = connection.ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (product_id, action, changed_at) '
+                f'SELECT changed.id, %s, %s FROM ({sql}) changed',
+                (action, changed_at, *params),
+            )
+            return cursor.rowcount
+
+    log_changes.alters_data = True
+
+
+def _with_pricing_fields(fields):
+    return list(fields) + [name for name in PRICING_DERIVED_FIELDS if name not in fields]
+
+
 class Product(models.Model):
     """Product model for e-commerce catalog"""
     name = models.CharField(max_length=255)
@@ -34,12 +193,23 @@ class Product(models.Model):
         blank=True,
         validators=[MinValueValidator(0)]
     )
+    # Denormalized from price / discount_price so the selling price and
+    # discount can be filtered and sorted on with an index
+    effective_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False
+    )
+    discount_percentage = models.PositiveSmallIntegerField(default=0, editable=False)
     quantity_in_stock = models.IntegerField(validators=[MinValueValidator(0)])
     image = models.ImageField(
         upload_to='products/',
         validators=[FileExtensionValidator(
             allowed_extensions=['jpg', 'jpeg', 'png', 'gif'])]
     )
+    # Resized WebP copies of image (see ecommerce_project.images)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
     average_rating = models.FloatField(
@@ -47,7 +217,12 @@ class Product(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(5)]
     )
     review_count = models.IntegerField(default=0)
+    # Sum of review ratings; average_rating is rating_sum / review_count
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
     sales_count = models.IntegerField(default=0)
+    # Log of the time-decayed sales / review activity (see products.trending);
+    # null until the product has any
+    trending_score = models.FloatField(null=True, blank=True, editable=False)
     created_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -57,6 +232,8 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         db_table = 'products'
         ordering = ['-created_at']
@@ -70,12 +247,50 @@ class Product(models.Model):
             models.Index(fields=['quantity_in_stock']),
             models.Index(fields=['is_featured']),
             models.Index(fields=['average_rating']),
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['effective_price']),
+            models.Index(fields=['discount_percentage']),
+            models.Index(fields=['-trending_score']),
         ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        self.sync_pricing()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and PRICING_SOURCE_FIELDS & set(update_fields):
+            kwargs['update_fields'] = _with_pricing_fields(update_fields)
+        if update_fields is not None and set(update_fields) <= CHANGE_LOG_IGNORED_FIELDS:
+            return super().save(*args, **kwargs)
+
+        action = ProductChange.CREATED if self._state.adding else self.change_action()
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        update_fields = kwargs.get('update_fields')
+        tracked = update_fields is None or TRACKED_FIELDS & set(update_fields)
+        with transaction.atomic(using=using, savepoint=False):
+            before = {}
+            if tracked and not self._state.adding:
+                before = fetch_rows(Product.objects.using(using).filter(pk=self.pk))
+            super().save(*args, **kwargs)
+            record_changes([self.pk], action, using=using)
+            if tracked:
+                apply_changes(before, {self.pk: self.saved_row(before.get(self.pk), update_fields)},
+                              using=using)
+
+    def saved_row(self, before, update_fields):
+        """Category tracking row as stored by a save() of ``update_fields``"""
+        row = product_row(self)
+        if before is None or update_fields is None:
+            return row
+        # Columns left out of the save keep their stored values
+        return tuple(
+            value if name in update_fields or name.removesuffix('_id') in update_fields else old
+            for name, value, old in zip(ROW_FIELDS, row, before)
+        )
+
+    def change_action(self):
+        """Change log action for a write that leaves the product in its current state"""
+        return ProductChange.UPDATED if self.is_active else ProductChange.DEACTIVATED
 
     def __str__(self):
         return self.name
@@ -83,12 +298,16 @@ class Product(models.Model):
     def get_absolute_url(self):
         return f'/products/{self.slug}/'
 
-    @property
-    def discount_percentage(self):
-        """Calculate discount percentage"""
-        if self.discount_price and self.discount_price < self.price:
-            return int(((self.price - self.discount_price) / self.price) * 100)
-        return 0
+    def sync_pricing(self):
+        """Recompute effective_price and discount_percentage from the prices"""
+        # Values assigned from forms or fixtures may still be strings
+        price = Decimal(str(self.price))
+        discount = Decimal(str(self.discount_price)) if self.discount_price else None
+        self.effective_price = discount or price
+        if discount and discount < price:
+            self.discount_percentage = int(((price - discount) / price) * 100)
+        else:
+            self.discount_percentage = 0
 
     @property
     def current_price(self):
@@ -101,14 +320,12 @@ class Product(models.Model):
         return self.quantity_in_stock > 0
 
     def update_review_stats(self):
-        """Update review statistics"""
-        reviews = self.reviews.all()
-        if reviews.exists():
-            self.average_rating = reviews.aggregate(
-                avg_rating=models.Avg('rating')
-            )['avg_rating'] or 0.0
-            self.review_count = reviews.count()
-            self.save(update_fields=['average_rating', 'review_count'])
+        """Recompute review statistics from every review (reviews apply deltas instead)"""
+        totals = self.reviews.aggregate(count=models.Count('pk'), total=models.Sum('rating'))
+        self.review_count = totals['count']
+        self.rating_sum = totals['total'] or 0
+        self.average_rating = self.rating_sum / self.review_count if self.review_count else 0.0
+        self.save(update_fields=['average_rating', 'review_count', 'rating_sum', 'updated_at'])
 
 
 class ProductAttribute(models.Model):
@@ -132,3 +349,65 @@ class ProductAttribute(models.Model):
 
     def __str__(self):
         return f"{self.product.name} - {self.attribute_key}: {self.attribute_value}"
+
+
+class ProductActivity(models.Model):
+    """Sales and new reviews of a product within one trending time bucket"""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='activity'
+    )
+    bucket = models.DateTimeField()
+    sales = models.PositiveIntegerField(default=0)
+    reviews = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'product_activity'
+        unique_together = ('product', 'bucket')
+        indexes = [
+            models.Index(fields=['bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.bucket:%Y-%m-%d %H:%M}: {self.sales} sales, {self.reviews} reviews"
+
+
+class ProductChange(models.Model):
+    """
+    Append-only log of product writes behind the change feed.
+
+    The primary key is the feed cursor. ``product_id`` is deliberately not a
+    foreign key so that tombstones outlive the products they describe.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DEACTIVATED = 'deactivated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = [
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DEACTIVATED, 'Deactivated'),
+        (DELETED, 'Deleted'),
+    ]
+
+    product_id = models.BigIntegerField()
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'product_changes'
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.pk} product {self.product_id} {self.action}"
+
+
+def record_changes(product_ids, action, using=None):
+    """Append change log rows for products written outside ProductQuerySet.update()"""
+    if product_ids:
+        now = timezone.now()
+        ProductChange.objects.using(using).bulk_create([
+            ProductChange(product_id=product_id, action=action, changed_at=now)
+            for product_id in product_ids
+        ])
@@ -0,0 +1,17 @@
+"""
+Permissions for products app
+"""
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class IsStaffOrCatalogPartner(BasePermission):
+    """Allow staff and members of the CATALOG_PARTNER_GROUP group"""
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        return user.is_staff or user.groups.filter(
+            name=settings.CATALOG_PARTNER_GROUP).exists()
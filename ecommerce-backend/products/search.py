@@ -0,0 +1,233 @@
+"""
+In-process full-text search for products
+
+Products are indexed into an inverted index (term -> {product_id: weighted
+term frequency}) over name, SKU, attributes and description, and ranked with
+BM25. The index is kept up to date incrementally from model signals, pulled
+forward from ``Product.updated_at`` to pick up writes made by other workers,
+and persisted to disk so new workers start from a snapshot instead of
+rebuilding from the database.
+"""
+
+import math
+import os
+import pickle
+import re
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, When
+
+from .indexing import ProductIndex, get_index, register_index
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Relative weight of a term occurrence per indexed field
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'sku': 3.0,
+    'attributes': 2.0,
+    'description': 1.0,
+}
+
+SNAPSHOT_VERSION = 1
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    if not text:
+        return []
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def product_document(product, attributes=None):
+    """Return the weighted term frequencies for a product"""
+    if attributes is None:
+        attributes = product.attributes.all()
+
+    fields = {
+        'name': tokenize(product.name),
+        'sku': tokenize(product.sku) + [product.sku.lower()],
+        'attributes': [
+            token
+            for attr in attributes
+            for token in tokenize(f'{attr.attribute_key} {attr.attribute_value}')
+        ],
+        'description': tokenize(product.short_description) + tokenize(product.description),
+    }
+
+    terms = defaultdict(float)
+    for field, tokens in fields.items():
+        weight = FIELD_WEIGHTS[field]
+        for token in tokens:
+            terms[token] += weight
+    return dict(terms)
+
+
+@register_index
+class ProductSearchIndex(ProductIndex):
+    """Inverted index over products with BM25 ranking"""
+
+    name = 'search'
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, path=None):
+        if path is None:
+            path = settings.SEARCH_INDEX_PATH
+        self.path = Path(path) if path else None
+        super().__init__()
+
+    def clear(self):
+        with self.lock:
+            super().clear()
+            self.postings = defaultdict(dict)
+            self.documents = {}
+            self.lengths = {}
+            self.total_length = 0.0
+
+    # Document maintenance
+
+    def add(self, product):
+        self.add_document(product.pk, product_document(product, product.attributes.all()))
+
+    def add_document(self, product_id, terms):
+        with self.lock:
+            self.remove(product_id)
+            self.documents[product_id] = terms
+            self.lengths[product_id] = sum(terms.values())
+            self.total_length += self.lengths[product_id]
+            for term, frequency in terms.items():
+                self.postings[term][product_id] = frequency
+
+    def remove(self, product_id):
+        with self.lock:
+            terms = self.documents.pop(product_id, None)
+            if terms is None:
+                return
+            self.total_length -= self.lengths.pop(product_id)
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                posting.pop(product_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    # Persistence
+
+    def save(self, path=None):
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            snapshot = {
+                'version': SNAPSHOT_VERSION,
+                'watermark': self.watermark,
+                'documents': self.documents,
+            }
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name)
+            try:
+                with os.fdopen(fd, 'wb') as fh:
+                    pickle.dump(snapshot, fh, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def load(self, path=None):
+        """Load a snapshot written by save(); returns False if there is none"""
+        path = Path(path or self.path)
+        try:
+            with open(path, 'rb') as fh:
+                snapshot = pickle.load(fh)
+        except FileNotFoundError:
+            return False
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            return False
+
+        with self.lock:
+            self.clear()
+            for product_id, terms in snapshot['documents'].items():
+                self.add_document(product_id, terms)
+            self.watermark = snapshot['watermark']
+            self.loaded = True
+        return True
+
+    def load_snapshot(self):
+        return bool(self.path) and self.load()
+
+    def build(self):
+        count = super().build()
+        if self.path:
+            self.save()
+        return count
+
+    # Querying
+
+    def search(self, query, limit=None):
+        """Return (product_id, score) pairs ranked by BM25, best first"""
+        terms = set(tokenize(query))
+        # Whole SKUs such as "ABC-123" are indexed as a single term too
+        if query and not query.split()[1:]:
+            terms.add(query.strip().lower())
+
+        with self.lock:
+            doc_count = len(self.documents)
+            if not doc_count:
+                return []
+            avg_length = self.total_length / doc_count or 1.0
+            scores = defaultdict(float)
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for product_id, frequency in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[product_id] / avg_length)
+                    scores[product_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+
+def get_search_index():
+    """Return the process-wide product search index"""
+    return get_index(ProductSearchIndex.name)
+
+
+def search_queryset(queryset, query, keep_ordering=False):
+    """
+    Restrict a (filtered) product queryset to search hits, ordered by relevance.
+
+    Ranking happens in memory; the database only hydrates the matching ids.
+    At most ``SEARCH_MAX_RESULTS`` products are returned: the best-ranked
+    hits *that pass the queryset's filters*, so a filtered search is never
+    starved by better-ranked products the filters drop.
+    """
+    index = get_search_index()
+    index.ensure_loaded()
+    ids = [product_id for product_id, _ in index.search(query)]
+    if len(ids) > settings.SEARCH_MAX_RESULTS:
+        ids = matching_ids(queryset, ids, settings.SEARCH_MAX_RESULTS)
+
+    queryset = queryset.filter(pk__in=ids)
+    if keep_ordering or not ids:
+        return queryset
+    return queryset.order_by(Case(
+        *[When(pk=product_id, then=position) for position, product_id in enumerate(ids)],
+        output_field=IntegerField()
+    ))
+
+
+def matching_ids(queryset, ranked_ids, limit):
+    """The first ``limit`` of ``ranked_ids`` that ``queryset`` matches, in rank order"""
+    matched = []
+    for start in range(0, len(ranked_ids), limit):
+        chunk = ranked_ids[start:start + limit]
+        found = set(queryset.order_by().filter(pk__in=chunk).values_list('pk', flat=True))
+        matched.extend(product_id for product_id in chunk if product_id in found)
+        if len(matched) >= limit:
+            break
+    return matched[:limit]
@@ -2,9 +2,14 @@
 Serializers for products app
 """
 
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
 from rest_framework import serializers
 from .models import Product, ProductAttribute
-from categories.serializers import CategoryListSerializer
+from categories.models import Category
+from categories.serializers import CategorySummarySerializer
+from ecommerce_project.fieldsets import SparseFieldsetSerializerMixin
+from ecommerce_project.images import SrcsetField, srcset
 
 
 class ProductAttributeSerializer(serializers.ModelSerializer):
@@ -14,24 +19,38 @@ class ProductAttributeSerializer(serializers.ModelSerializer):
         fields = ['id', 'attribute_key', 'attribute_value']
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+# Model fields read by computed serializer fields (see SparseFieldsetSerializerMixin)
+PRODUCT_FIELD_SOURCES = {
+    'current_price': ('price', 'discount_price'),
+    'discount_percentage': ('discount_percentage',),
+    'is_in_stock': ('quantity_in_stock',),
+    'image_srcset': ('image', 'image_variants'),
+}
+
+
+class ProductListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for product listing (minimal fields)"""
-    category = CategoryListSerializer(read_only=True)
+    category = CategorySummarySerializer(read_only=True)
     discount_percentage = serializers.SerializerMethodField()
     current_price = serializers.SerializerMethodField()
     is_in_stock = serializers.BooleanField(read_only=True)
+    image_srcset = SrcsetField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'slug', 'short_description', 'price',
             'discount_price', 'current_price', 'discount_percentage',
-            'image', 'category', 'average_rating', 'review_count',
+            'image', 'image_srcset', 'category', 'average_rating', 'review_count',
             'quantity_in_stock', 'is_in_stock', 'is_active', 'is_featured',
             'created_at'
         ]
         read_only_fields = ['id', 'created_at',
                             'average_rating', 'review_count']
+        field_sources = PRODUCT_FIELD_SOURCES
+        expandable_fields = {
+            'attributes': lambda: ProductAttributeSerializer(many=True, read_only=True),
+        }
 
     def get_discount_percentage(self, obj):
         return obj.discount_percentage
@@ -40,9 +59,124 @@ class ProductListSerializer(serializers.ModelSerializer):
         return str(obj.current_price)
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+# Columns read by the ProductListSerializer fast path, per rendered field
+PRODUCT_LIST_COLUMNS = {
+    'id': ('id',),
+    'name': ('name',),
+    'slug': ('slug',),
+    'short_description': ('short_description',),
+    'price': ('price',),
+    'discount_price': ('discount_price',),
+    'current_price': ('price', 'discount_price'),
+    'discount_percentage': ('discount_percentage',),
+    'image': ('image',),
+    'image_srcset': ('image', 'image_variants'),
+    'category': ('category_id', 'category__name', 'category__slug', 'category__image',
+                 'category__image_variants', 'category__is_active'),
+    'average_rating': ('average_rating',),
+    'review_count': ('review_count',),
+    'quantity_in_stock': ('quantity_in_stock',),
+    'is_in_stock': ('quantity_in_stock',),
+    'is_active': ('is_active',),
+    'is_featured': ('is_featured',),
+    'created_at': ('created_at',),
+}
+
+# Always selected: keyset pagination reads the ordering columns from each row
+PRODUCT_LIST_ORDERING_COLUMNS = (
+    'id', 'price', 'effective_price', 'discount_percentage', 'created_at', 'sales_count',
+    'average_rating',
+)
+
+
+def product_list_values(queryset, fields=None):
+    """Project a product queryset onto the columns ProductListSerializer renders"""
+    columns = dict.fromkeys(PRODUCT_LIST_ORDERING_COLUMNS)
+    for name in fields or PRODUCT_LIST_COLUMNS:
+        columns.update(dict.fromkeys(PRODUCT_LIST_COLUMNS.get(name, ())))
+    return queryset.select_related(None).prefetch_related(None).values(*columns)
+
+
+def serialize_product_values(rows, context=None):
+    """
+    Render ``product_list_values()`` rows exactly as ProductListSerializer would.
+
+    Skips model instantiation and per-field serializer dispatch; values that
+    need formatting (decimals, datetimes, image URLs) still go through the
+    serializer's own field objects so the output is identical. Honours the
+    same ``fields`` / ``expand`` context as the serializer.
+    """
+    rows = list(rows)
+    context = context or {}
+    request = context.get('request')
+    fields = ProductListSerializer(context=context).fields
+    product_image = Product._meta.get_field('image')
+    category_image = Category._meta.get_field('image')
+
+    def image(name, model_field, serializer_field):
+        if not name:
+            return None
+        return serializer_field.to_representation(FieldFile(None, model_field, name))
+
+    def category(row):
+        if row['category_id'] is None:
+            return None
+        return {
+            'id': row['category_id'],
+            'name': row['category__name'],
+            'slug': row['category__slug'],
+            'image': image(row['category__image'], category_image,
+                           fields['category'].fields['image']),
+            'image_srcset': srcset(row['category__image_variants'], row['category__image'],
+                                   category_image.storage, request),
+            'is_active': row['category__is_active'],
+        }
+
+    attributes = {}
+    if 'attributes' in fields:
+        for attr in ProductAttribute.objects.filter(
+                product_id__in=[row['id'] for row in rows]
+        ).order_by('pk').values('id', 'product_id', 'attribute_key', 'attribute_value'):
+            product_id = attr.pop('product_id')
+            attributes.setdefault(product_id, []).append(attr)
+
+    def representation(name):
+        return fields[name].to_representation if name in fields else None
+
+    price, discount_price = representation('price'), representation('discount_price')
+    average_rating, created_at = representation('average_rating'), representation('created_at')
+    image_field = fields.get('image')
+
+    builders = {
+        'id': lambda row: row['id'],
+        'name': lambda row: row['name'],
+        'slug': lambda row: row['slug'],
+        'short_description': lambda row: row['short_description'],
+        'price': lambda row: price(row['price']),
+        'discount_price': lambda row: (
+            None if row['discount_price'] is None else discount_price(row['discount_price'])),
+        'current_price': lambda row: str(row['discount_price'] or row['price']),
+        'discount_percentage': lambda row: row['discount_percentage'],
+        'image': lambda row: image(row['image'], product_image, image_field),
+        'image_srcset': lambda row: srcset(
+            row['image_variants'], row['image'], product_image.storage, request),
+        'category': category,
+        'average_rating': lambda row: average_rating(row['average_rating']),
+        'review_count': lambda row: row['review_count'],
+        'quantity_in_stock': lambda row: row['quantity_in_stock'],
+        'is_in_stock': lambda row: row['quantity_in_stock'] > 0,
+        'is_active': lambda row: row['is_active'],
+        'is_featured': lambda row: row['is_featured'],
+        'created_at': lambda row: created_at(row['created_at']),
+        'attributes': lambda row: attributes.get(row['id'], []),
+    }
+    render = [(name, builders[name]) for name in fields]
+    return [{name: build(row) for name, build in render} for row in rows]
+
+
+class ProductDetailSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for product details (all fields)"""
-    category = CategoryListSerializer(read_only=True)
+    category = CategorySummarySerializer(read_only=True)
     attributes = ProductAttributeSerializer(many=True, read_only=True)
     discount_percentage = serializers.SerializerMethodField()
     current_price = serializers.SerializerMethodField()
@@ -59,6 +193,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at',
                             'average_rating', 'review_count', 'slug']
+        field_sources = PRODUCT_FIELD_SOURCES
 
     def get_discount_percentage(self, obj):
         return obj.discount_percentage
@@ -82,23 +217,91 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         attributes_data = validated_data.pop('attributes', [])
-        product = Product.objects.create(**validated_data)
-
-        for attr_data in attributes_data:
-            ProductAttribute.objects.create(product=product, **attr_data)
-
+        with transaction.atomic():
+            product = Product.objects.create(**validated_data)
+            self.sync_attributes(product, attributes_data, existing=[])
         return product
 
     def update(self, instance, validated_data):
         attributes_data = validated_data.pop('attributes', None)
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
 
-        if attributes_data is not None:
-            instance.attributes.all().delete()
-            for attr_data in attributes_data:
-                ProductAttribute.objects.create(product=instance, **attr_data)
+            if attributes_data is not None:
+                self.sync_attributes(instance, attributes_data)
 
         return instance
+
+    def sync_attributes(self, product, attributes_data, existing=None):
+        """
+        Make the product's attributes match attributes_data.
+
+        Unchanged rows are left alone, new ones are added with one
+        bulk_create and removed ones deleted with one DELETE, so the number
+        of queries does not grow with the number of attributes.
+        """
+        wanted = dict.fromkeys(
+            (attr['attribute_key'], attr['attribute_value']) for attr in attributes_data
+        )
+        if existing is None:
+            existing = product.attributes.all()
+        current = {(attr.attribute_key, attr.attribute_value): attr.pk for attr in existing}
+
+        stale = [pk for pair, pk in current.items() if pair not in wanted]
+        if stale:
+            ProductAttribute.objects.filter(pk__in=stale).delete()
+
+        added = [pair for pair in wanted if pair not in current]
+        if added:
+            ProductAttribute.objects.bulk_create([
+                ProductAttribute(product=product, attribute_key=key, attribute_value=value)
+                for key, value in added
+            ])
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """
+    Validates one row of a bulk product import.
+
+    Deliberately not a ModelSerializer: uniqueness and category existence
+    are checked once per batch by the importer instead of once per row.
+    """
+    sku = serializers.CharField(max_length=100)
+    name = serializers.CharField(max_length=255)
+    description = serializers.CharField()
+    short_description = serializers.CharField(
+        max_length=255, required=False, allow_blank=True, default='')
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    discount_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False, allow_null=True,
+        default=None)
+    quantity_in_stock = serializers.IntegerField(min_value=0)
+    category = serializers.IntegerField(required=False, allow_null=True, default=None)
+    image = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    is_active = serializers.BooleanField(required=False, default=True)
+    is_featured = serializers.BooleanField(required=False, default=False)
+    attributes = ProductAttributeSerializer(many=True, required=False)
+
+
+class PriceStockRowSerializer(serializers.Serializer):
+    """
+    Validates one row of a bulk price / stock update.
+
+    SKU existence is checked once per batch by the updater; omitted fields
+    keep their stored values.
+    """
+    sku = serializers.CharField(max_length=100)
+    price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False)
+    discount_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False, allow_null=True)
+    quantity_in_stock = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, attrs):
+        if len(attrs) == 1:
+            raise serializers.ValidationError(
+                'Give at least one of price, discount_price, quantity_in_stock')
+        return attrs
@@ -0,0 +1,152 @@
+"""
+Signal handlers for products app
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from categories.counts import apply_changes, product_row
+from categories.models import Category
+from .detail_cache import get_detail_cache
+from .indexing import loaded_indexes
+from .leaderboards import get_leaderboards
+from .models import Product, ProductAttribute, ProductChange, record_changes
+
+
+_scheduled = threading.local()
+_muted = threading.local()
+
+
+def _pending_refreshes():
+    """
+    Return the refreshes already scheduled in the current transaction.
+
+    Django swaps in a new on-commit hook list whenever a transaction commits
+    or rolls back, so keying on that list forgets refreshes whose
+    transaction was rolled back instead of suppressing them forever.
+    """
+    hooks = transaction.get_connection().run_on_commit
+    if getattr(_scheduled, 'hooks', None) is not hooks:
+        _scheduled.hooks = hooks
+        _scheduled.keys = set()
+    return _scheduled.keys
+
+
+def _reindex_on_commit(product_id):
+    """
+    Refresh a product in every loaded index once the write is committed.
+
+    Several writes to one product in a transaction (the product row plus
+    each attribute) schedule a single refresh.
+    """
+    pending = _pending_refreshes()
+    for index in loaded_indexes():
+        key = (index.name, product_id)
+        if key in pending:
+            continue
+        pending.add(key)
+
+        def refresh(index=index, key=key):
+            pending.discard(key)
+            index.reindex(product_id)
+
+        transaction.on_commit(refresh)
+
+
+def _refresh_leaderboards(product_id):
+    leaderboards = get_leaderboards()
+    product = Product.objects.select_related('category').filter(pk=product_id).first()
+    if product is None:
+        leaderboards.product_removed(product_id)
+    else:
+        leaderboards.product_changed(product)
+
+
+def _touch_product(product_id):
+    """
+    Bump the product's updated_at after an attribute write.
+
+    Detail cache entries, ETags and other workers' index syncs all key on
+    updated_at, which attribute rows would otherwise leave untouched.
+    """
+    if transaction.get_connection().in_atomic_block:
+        pending = _pending_refreshes()
+        if ('touch', product_id) in pending:
+            return
+        pending.add(('touch', product_id))
+    Product.objects.filter(pk=product_id).update(updated_at=timezone.now())
+    transaction.on_commit(lambda: get_detail_cache().invalidate(product_id))
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    product_changed(instance.pk)
+
+
+def product_changed(product_id):
+    """Refresh indexes, cached details and leaderboards once a product write commits"""
+    _reindex_on_commit(product_id)
+    transaction.on_commit(lambda: get_detail_cache().invalidate(product_id))
+    if get_leaderboards().loaded:
+        transaction.on_commit(lambda: _refresh_leaderboards(product_id))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, using=None, **kwargs):
+    product_id = instance.pk
+    # Runs inside the deletion's transaction, so the tombstone commits with it
+    record_changes([product_id], ProductChange.DELETED, using=using)
+    apply_changes({product_id: product_row(instance)}, {}, using=using)
+    transaction.on_commit(lambda: get_detail_cache().invalidate(product_id))
+    for index in loaded_indexes():
+        transaction.on_commit(lambda index=index: index.remove(product_id))
+    if get_leaderboards().loaded:
+        transaction.on_commit(lambda: get_leaderboards().product_removed(product_id))
+
+
+@contextmanager
+def attribute_signals_muted():
+    """
+    Skip the per-row attribute handlers in this thread, for bulk writes that
+    bump updated_at, log and reindex their products themselves.
+    """
+    _muted.depth = getattr(_muted, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _muted.depth -= 1
+
+
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_delete, sender=ProductAttribute)
+def product_attribute_changed(sender, instance, **kwargs):
+    if getattr(_muted, 'depth', 0):
+        return
+    _touch_product(instance.product_id)
+    _reindex_on_commit(instance.product_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def category_products_changed(sender, instance, created=False, **kwargs):
+    # Products embed their category, so feed consumers must re-read them
+    if not created:
+        Product.objects.filter(category_id=instance.pk).log_changes()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Serialized leaderboard rows and detail payloads embed the category
+    category_id = instance.pk
+    transaction.on_commit(lambda: get_detail_cache().invalidate_category(category_id))
+    for index in loaded_indexes():
+        transaction.on_commit(lambda index=index: index.category_changed(category_id))
+    leaderboards = get_leaderboards()
+    if leaderboards.loaded:
+        transaction.on_commit(leaderboards.invalidate)
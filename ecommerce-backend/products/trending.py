@@ -0,0 +1,133 @@
+"""
+Time-decayed trending scores for products
+
+Every sale and new review adds weight to its product, and that weight halves
+every ``TRENDING_HALF_LIFE_HOURS``. Rather than decaying every score as time
+passes, weights are scaled *up* by the same factor relative to a fixed epoch:
+
+    trending_score = ln( sum of weight * 2 ** ((bucket - EPOCH) / half_life) )
+
+All products decay at the same rate, so ordering by the stored score is the
+same as ordering by decayed activity right now. An event is a single
+set-based log-add on ``Product.trending_score`` and the top-K is an indexed
+ORDER BY served from the ``trending`` leaderboard, so nothing scans history
+at request time. Raw counts are also kept per time bucket (ProductActivity)
+so the scores can be rebuilt after changing the half-life
+(``manage.py rebuild_trending``).
+"""
+
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+# exp() of anything below this is lost next to 1.0 in a double anyway
+MIN_EXPONENT = -50.0
+
+
+def bucket_start(when):
+    """Truncate a datetime to the start of its activity bucket"""
+    width = settings.TRENDING_BUCKET_SECONDS
+    offset = (when - EPOCH).total_seconds()
+    return EPOCH + timedelta(seconds=offset - offset % width)
+
+
+def event_score(weight, bucket):
+    """Log-space score of ``weight`` events in ``bucket``"""
+    half_lives = (bucket - EPOCH).total_seconds() / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+    return math.log(weight) + half_lives * math.log(2)
+
+
+def log_add(scores):
+    """ln(sum(exp(score))) without overflowing"""
+    top = max(scores)
+    return top + math.log(sum(math.exp(score - top) for score in scores))
+
+
+def log_add_expression(score):
+    """SQL for ``trending_score`` after adding an event with the given score"""
+    current = F('trending_score')
+    value = Value(score, output_field=FloatField())
+    return Case(
+        When(trending_score__isnull=True, then=value),
+        default=Greatest(current, value) + Ln(Value(1.0) + Exp(
+            Greatest(-Abs(current - value), Value(MIN_EXPONENT)))),
+        output_field=FloatField(),
+    )
+
+
+def activity_weight(sales, reviews):
+    return sales + reviews * settings.TRENDING_REVIEW_WEIGHT
+
+
+def record_activity(sales=None, reviews=None, when=None):
+    """
+    Count sales / new reviews ({product_id: count}) towards trending.
+
+    Runs in the caller's transaction when there is one. Only the database is
+    written; callers let the leaderboards know (the counter flush and product
+    saves already do).
+    """
+    from .models import Product, ProductActivity
+
+    sales, reviews = sales or {}, reviews or {}
+    product_ids = set(Product.objects.filter(pk__in=set(sales) | set(reviews))
+                      .values_list('pk', flat=True))
+    if not product_ids:
+        return 0
+
+    bucket = bucket_start(when or timezone.now())
+    by_amount = defaultdict(list)
+    for product_id in product_ids:
+        by_amount[sales.get(product_id, 0), reviews.get(product_id, 0)].append(product_id)
+
+    with transaction.atomic(savepoint=False):
+        ProductActivity.objects.bulk_create(
+            [ProductActivity(product_id=product_id, bucket=bucket) for product_id in product_ids],
+            ignore_conflicts=True,
+        )
+        for (sold, reviewed), ids in by_amount.items():
+            ProductActivity.objects.filter(bucket=bucket, product_id__in=ids).update(
+                sales=F('sales') + sold, reviews=F('reviews') + reviewed)
+            weight = activity_weight(sold, reviewed)
+            if weight > 0:
+                Product.objects.filter(pk__in=ids).update(
+                    trending_score=log_add_expression(event_score(weight, bucket)))
+    return len(product_ids)
+
+
+def rebuild_scores(batch_size=1000):
+    """
+    Recompute every trending score from the activity buckets.
+
+    Buckets older than ``TRENDING_WINDOW_DAYS`` are pruned first; products
+    with no remaining activity drop out of the ranking.
+    """
+    from .models import Product, ProductActivity
+
+    cutoff = timezone.now() - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    pruned, _ = ProductActivity.objects.filter(bucket__lt=cutoff).delete()
+
+    scores = defaultdict(list)
+    rows = ProductActivity.objects.values_list('product_id', 'bucket', 'sales', 'reviews')
+    for product_id, bucket, sold, reviewed in rows.iterator():
+        weight = activity_weight(sold, reviewed)
+        if weight > 0:
+            scores[product_id].append(event_score(weight, bucket))
+
+    with transaction.atomic():
+        Product.objects.exclude(trending_score__isnull=True).update(trending_score=None)
+        Product.objects.bulk_update(
+            [Product(pk=product_id, trending_score=log_add(values))
+             for product_id, values in scores.items()],
+            ['trending_score'],
+            batch_size=batch_size,
+        )
+    return len(scores), pruned
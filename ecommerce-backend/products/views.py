@@ -2,33 +2,80 @@
 Views/ViewSets for products app
 """
 
+from datetime import timedelta
+
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import DateTimeField
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import (
+    AllowAny, IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser
+)
+from django.conf import settings
+from django.db.models import Count, Max, Q, Sum
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Product
+from .models import Product, ProductChange
 from .serializers import (
     ProductListSerializer,
     ProductDetailSerializer,
-    ProductCreateUpdateSerializer
+    ProductCreateUpdateSerializer,
+    product_list_values,
+    serialize_product_values,
 )
 from .filters import ProductFilter
+from .permissions import IsStaffOrCatalogPartner
+from .facets import get_facet_index, parse_attribute_filters
+from .autocomplete import get_autocomplete_index
+from .bulk_updates import PriceStockUpdater
+from .counters import get_sales_counter
+from .detail_cache import get_detail_cache
+from .exporters import OUTPUTS, CatalogExporter, export_queryset
+from .importers import ImportFormatError, ProductImporter, detect_format
+from .leaderboards import LEADERBOARDS, get_leaderboards, with_absolute_urls
+from .search import get_search_index, search_queryset
+from categories.models import Category
+from ecommerce_project.conditional import ConditionalGetMixin, latest
+from ecommerce_project.fieldsets import SparseFieldsetMixin, parse_field_list
+from ecommerce_project.pagination import KeysetPaginationMixin
+from ecommerce_project.query_shapes import QueryShapeMixin
 
 
-class ProductViewSet(viewsets.ModelViewSet):
-    """ViewSet for product CRUD operations with advanced filtering and pagination"""
+class ProductViewSet(QueryShapeMixin, SparseFieldsetMixin, KeysetPaginationMixin,
+                     ConditionalGetMixin, viewsets.ModelViewSet):
+    """
+    ViewSet for product CRUD operations with advanced filtering and pagination.
+
+    Pass ``?pagination=cursor`` to switch listings to keyset pagination and
+    ``?q=`` to rank listings with the in-process full-text index. Add
+    ``?facets=true`` to get facet counts for the filtered listing, and
+    ``?fields=`` / ``?expand=`` to choose the rendered fields. Detail
+    and list responses carry ETag / Last-Modified validators, and detail
+    payloads are served from an in-process cache (see products.detail_cache).
+    """
     queryset = Product.objects.filter(is_active=True)
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend,
                        filters.SearchFilter, filters.OrderingFilter]
     filterset_class = ProductFilter
     search_fields = ['name', 'description', 'sku']
-    ordering_fields = ['price', 'created_at', 'sales_count', 'average_rating']
+    ordering_fields = [
+        'price', 'effective_price', 'discount_percentage', 'created_at', 'sales_count',
+        'average_rating',
+    ]
     ordering = ['-created_at']
+    # Columns describing a product detail payload's version (ETag and cache key)
+    detail_fingerprint_fields = (
+        'pk', 'updated_at', 'category__updated_at', 'sales_count', 'average_rating',
+        'review_count',
+    )
 
     def get_serializer_class(self):
-        if self.action == 'retrieve':
+        if self.action in ('retrieve', 'by_slug', 'batch'):
             return ProductDetailSerializer
         elif self.action in ['create', 'update', 'partial_update']:
             return ProductCreateUpdateSerializer
@@ -41,8 +88,312 @@ class ProductViewSet(viewsets.ModelViewSet):
         if self.request.user and self.request.user.is_staff:
             queryset = Product.objects.all()
 
-        # Optimize queries
-        return queryset.select_related('category').prefetch_related('attributes')
+        # Load only what the response renders; detail payloads are cached in full
+        return self.optimize_queryset(
+            queryset, sparse=self.action not in ('retrieve', 'by_slug', 'batch'))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        query = self.request.query_params.get('q', '').strip()
+        if query and self.action == 'list':
+            keep_ordering = 'ordering' in self.request.query_params
+            if not keep_ordering and self.use_keyset_pagination():
+                raise ValidationError({'q': 'Relevance-ranked search does not support '
+                                            'cursor pagination; pass ?ordering= or use pages'})
+            queryset = search_queryset(queryset, query, keep_ordering=keep_ordering)
+        return queryset
+
+    def list_response(self, queryset):
+        response = self.render_list(queryset)
+        # Added before the list ETag is taken, so the validator covers facets
+        if (response.status_code == status.HTTP_200_OK
+                and self.request.query_params.get('facets', '').lower() in ('1', 'true', 'yes')):
+            response.data['facets'] = self.get_facets()
+        return response
+
+    def render_list(self, queryset):
+        if self.get_serializer_class() is not ProductListSerializer:
+            return super().list_response(queryset)
+        # Fast path: render .values() rows instead of model instances
+        fields, expand = self.get_fieldset()
+        queryset = product_list_values(queryset, fields and [*fields, *expand])
+        page = self.paginate_queryset(queryset)
+        data = serialize_product_values(
+            queryset if page is None else page, self.get_serializer_context())
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def get_detail_lookup(self):
+        if 'slug' in self.kwargs:
+            return {'slug': self.kwargs['slug']}
+        return {'pk': self.kwargs[self.lookup_url_kwarg or self.lookup_field]}
+
+    def get_detail_fingerprint(self):
+        row = (self.get_queryset().prefetch_related(None)
+               .filter(**self.get_detail_lookup())
+               .values(*self.detail_fingerprint_fields)
+               .first())
+        if row is None:
+            return None
+        return self.fingerprint_parts(row), latest(row['updated_at'], row['category__updated_at'])
+
+    def fingerprint_parts(self, row):
+        return tuple(row[name] for name in self.detail_fingerprint_fields)
+
+    def serialize_detail(self, instance):
+        # Rendered without the request so image URLs stay host-relative
+        return self.get_serializer_class()(instance).data
+
+    def retrieve(self, request, *args, **kwargs):
+        fingerprint = self.get_detail_fingerprint()
+        return self.conditional_response(
+            fingerprint,
+            render=lambda: self.render_detail(fingerprint and fingerprint[0])
+        )
+
+    def render_detail(self, parts):
+        """Detail response, from the cache when the product is unchanged"""
+        cache = get_detail_cache()
+        data = cache.get(parts[0], parts) if parts else None
+        if data is None:
+            instance = get_object_or_404(self.get_queryset(), **self.get_detail_lookup())
+            self.check_object_permissions(self.request, instance)
+            data = self.serialize_detail(instance)
+            if parts:
+                cache.set(instance.pk, parts, data)
+        return Response(self.trim_fields(with_absolute_urls([data], self.request)[0]))
+
+    @action(detail=False, methods=['get'], url_path=r'slug/(?P<slug>[-\w]+)')
+    def by_slug(self, request, slug=None):
+        """Get product details by slug"""
+        return self.retrieve(request, slug=slug)
+
+    @action(detail=False, methods=['get', 'post'], permission_classes=[AllowAny])
+    def batch(self, request):
+        """
+        Get several products' details in one request.
+
+        Takes ``?ids=1,2&slugs=a,b`` (or the same keys as JSON lists in a POST
+        body) and returns the products in request order plus the lookups that
+        matched nothing. Unchanged products come from the detail cache; the
+        rest are loaded together.
+        """
+        source = request.data if request.method == 'POST' else request.query_params
+        ids, slugs = source.get('ids') or [], source.get('slugs') or []
+        if isinstance(ids, str):
+            ids = parse_field_list(ids)
+        if isinstance(slugs, str):
+            slugs = parse_field_list(slugs)
+        if not isinstance(ids, list) or not isinstance(slugs, list):
+            return Response({'error': 'ids and slugs must be lists'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = [int(value) for value in ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'ids must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        lookups = list(dict.fromkeys([('id', value) for value in ids]
+                                     + [('slug', str(value)) for value in slugs]))
+        if not lookups:
+            return Response({'error': 'Pass ids and/or slugs'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(lookups) > settings.PRODUCT_BATCH_MAX_SIZE:
+            return Response(
+                {'error': f'At most {settings.PRODUCT_BATCH_MAX_SIZE} products per request'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.get_queryset()
+        rows = list(queryset.prefetch_related(None)
+                    .filter(Q(pk__in=ids) | Q(slug__in=slugs))
+                    .values('slug', *self.detail_fingerprint_fields))
+
+        cache = get_detail_cache()
+        payloads = {}
+        for row in rows:
+            data = cache.get(row['pk'], self.fingerprint_parts(row))
+            if data is not None:
+                payloads[row['pk']] = data
+        missed = {row['pk']: row for row in rows if row['pk'] not in payloads}
+        if missed:
+            for instance in queryset.filter(pk__in=missed):
+                data = payloads[instance.pk] = self.serialize_detail(instance)
+                cache.set(instance.pk, self.fingerprint_parts(missed[instance.pk]), data)
+
+        by_key = {}
+        for row in rows:
+            by_key[('id', row['pk'])] = by_key[('slug', row['slug'])] = row['pk']
+        found = dict.fromkeys(by_key[lookup] for lookup in lookups if lookup in by_key)
+        results = with_absolute_urls([payloads[pk] for pk in found if pk in payloads],
+                                     request)
+        return Response({
+            'results': [self.trim_fields(item) for item in results],
+            'missing': [{key: value} for key, value in lookups if (key, value) not in by_key],
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def changes(self, request):
+        """
+        Products changed after ``?since=<cursor>``, oldest first.
+
+        Reads only the change log rows after the cursor and the products they
+        name, so a sync costs O(changes). Several changes to one product in a
+        page are collapsed into one entry reflecting its current state:
+        ``deactivated`` and ``deleted`` entries are tombstones without a
+        product. Pass the returned ``cursor`` as ``since`` on the next call.
+        """
+        try:
+            since = int(request.query_params.get('since') or 0)
+            limit = int(request.query_params.get('limit') or settings.PRODUCT_CHANGES_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'since and limit must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.PRODUCT_CHANGES_MAX_PAGE_SIZE))
+
+        entries = ProductChange.objects.filter(pk__gt=since)
+        if settings.PRODUCT_CHANGES_SETTLE_SECONDS:
+            # Ids are allocated before commit; give slower transactions time to
+            # land so the cursor never moves past a change that is not yet visible
+            entries = entries.filter(changed_at__lte=timezone.now() - timedelta(
+                seconds=settings.PRODUCT_CHANGES_SETTLE_SECONDS))
+        entries = list(entries.order_by('pk').values_list(
+            'pk', 'product_id', 'action', 'changed_at')[:limit + 1])
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        last_change = {}
+        for cursor, product_id, change, changed_at in entries:
+            last_change.pop(product_id, None)
+            last_change[product_id] = (cursor, change, changed_at)
+
+        fields, expand = self.get_fieldset()
+        rows = list(product_list_values(
+            Product.objects.filter(pk__in=last_change), fields and [*fields, *expand, 'is_active']))
+        is_active = {row['id']: row['is_active'] for row in rows}
+        products = {item['id']: item for item in serialize_product_values(
+            [row for row in rows if row['is_active']], self.get_serializer_context())}
+
+        timestamp = DateTimeField()
+        results = []
+        for product_id, (cursor, change, changed_at) in last_change.items():
+            if product_id not in is_active:
+                change = ProductChange.DELETED
+            elif not is_active[product_id]:
+                change = ProductChange.DEACTIVATED
+            elif change not in (ProductChange.CREATED, ProductChange.UPDATED):
+                change = ProductChange.UPDATED
+            results.append({
+                'cursor': cursor,
+                'product_id': product_id,
+                'action': change,
+                'changed_at': timestamp.to_representation(changed_at),
+                'product': products.get(product_id),
+            })
+
+        return Response({
+            'cursor': entries[-1][0] if entries else since,
+            'has_more': has_more,
+            'results': results,
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def autocomplete(self, request):
+        """Suggest products and categories for a search box, from memory"""
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', settings.AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            limit = settings.AUTOCOMPLETE_LIMIT
+        limit = max(1, min(limit, settings.AUTOCOMPLETE_MAX_LIMIT))
+
+        index = get_autocomplete_index()
+        index.ensure_loaded()
+        products, categories = index.suggest(query, limit)
+        return Response({'query': query, 'products': products, 'categories': categories})
+
+    @action(detail=False, methods=['get'], url_path='cache-stats',
+            permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """Detail cache statistics for the worker serving the request"""
+        return Response(get_detail_cache().stats())
+
+    def get_list_fingerprint(self, queryset):
+        # sales_count is written by set-based updates that leave updated_at
+        # alone, so it is folded in separately
+        row = queryset.order_by().aggregate(
+            updated=Max('updated_at'),
+            category_updated=Max('category__updated_at'),
+            count=Count('pk'),
+            sales=Sum('sales_count'),
+        )
+        if 'sales_count' in self.request.query_params.get('ordering', ''):
+            # Counter flushes are not in the change log, so only the ETag sees them
+            return tuple(row.values()), None
+        # Every logged product write, deletes included, moves the change log
+        # head; Max(updated_at) alone misses products leaving the set
+        head = ProductChange.objects.order_by('-pk').values_list('changed_at', flat=True).first()
+        return tuple(row.values()), latest(row['updated'], row['category_updated'], head)
+
+    def get_facets(self):
+        """Facet counts for the current filters, computed from the facet index"""
+        params = self.request.query_params
+        index = get_facet_index()
+        index.ensure_loaded()
+
+        # Every ProductFilter field and ?q= narrow the counts from the indexes;
+        # only the substring ?search= needs the database, up to a bound
+        values = {}
+        filterset = self.filterset_class(params, queryset=Product.objects.none(),
+                                         request=self.request)
+        if filterset.is_valid():
+            values = filterset.form.cleaned_data
+        narrowing = [index.filter_matches(values)]
+        if values.get('category_tree') is not None:
+            root = Category.objects.filter(pk=values['category_tree']).first()
+            narrowing.append(index.category_matches(
+                root.get_descendants().values_list('pk', flat=True) if root else ()))
+        if values.get('category_name'):
+            narrowing.append(index.category_matches(Category.objects.filter(
+                name__icontains=values['category_name']).values_list('pk', flat=True)))
+        query = params.get('q', '').strip()
+        if query:
+            search_index = get_search_index()
+            search_index.ensure_loaded()
+            narrowing.append({product_id for product_id, _ in search_index.search(query)})
+        truncated = False
+        if params.get('search', '').strip():
+            limit = settings.FACET_SCAN_LIMIT
+            matches = list(self.filter_queryset(self.get_queryset())
+                           .order_by().values_list('pk', flat=True)[:limit + 1])
+            truncated = len(matches) > limit
+            narrowing.append(set(matches[:limit]))
+
+        restrict_to = None
+        for matches in narrowing:
+            if matches is not None:
+                restrict_to = matches if restrict_to is None else restrict_to & matches
+
+        try:
+            category_id = int(params['category']) if params.get('category') else None
+        except ValueError:
+            category_id = None
+
+        counts = index.facet_counts(
+            parse_attribute_filters(params),
+            category_id=category_id,
+            include_inactive=bool(self.request.user and self.request.user.is_staff),
+            restrict_to=restrict_to,
+        )
+        categories = Category.objects.filter(
+            pk__in=counts['categories']).values('id', 'name', 'slug')
+        counts['categories'] = sorted(
+            [dict(category, count=counts['categories'][category['id']])
+             for category in categories],
+            key=lambda item: (-item['count'], item['name'])
+        )
+        counts['truncated'] = truncated
+        return counts
 
     def perform_create(self, serializer):
         """Create product with current user as creator"""
@@ -50,38 +401,114 @@ class ProductViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def increment_sales(self, request, pk=None):
-        """Increment product sales count"""
+        """Increment product sales count (buffered, see products.counters)"""
         product = self.get_object()
-        product.sales_count += 1
-        product.save(update_fields=['sales_count'])
+        counter = get_sales_counter()
+        counter.increment(product.pk)
+        product.sales_count = counter.sales_count(product.pk)
         serializer = ProductDetailSerializer(product)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'], url_path='import',
+            permission_classes=[IsAdminUser], parser_classes=[MultiPartParser])
+    def import_products(self, request):
+        """Bulk upsert products by SKU from an uploaded CSV or JSONL file"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'error': 'Upload the feed as multipart field "file"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fmt = request.data.get('format') or detect_format(upload.name)
+        try:
+            report = ProductImporter(created_by=request.user).run(upload.file, fmt)
+        except ImportFormatError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict())
+
+    @action(detail=False, methods=['post'], url_path='bulk-update',
+            permission_classes=[IsAdminUser])
+    def bulk_update(self, request):
+        """
+        Set price / discount price / stock for many products by SKU.
+
+        Takes a JSON list of ``{"sku", "price", "discount_price",
+        "quantity_in_stock"}`` objects (or ``{"items": [...]}``); omitted
+        fields are left alone. Returns totals and a per-SKU status.
+        """
+        items = request.data.get('items') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Send a non-empty JSON list of rows'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.PRODUCT_BULK_UPDATE_MAX_SIZE:
+            return Response(
+                {'error': f'At most {settings.PRODUCT_BULK_UPDATE_MAX_SIZE} rows per request'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        report = PriceStockUpdater().run(enumerate(items, start=1))
+        return Response(report.as_dict())
+
+    @action(detail=False, methods=['get'], permission_classes=[IsStaffOrCatalogPartner])
+    def export(self, request):
+        """Stream every active product as NDJSON (or CSV with ?output=csv)"""
+        output = request.query_params.get('output', 'ndjson')
+        if output not in OUTPUTS:
+            return Response(
+                {'error': f'output must be one of: {", ".join(OUTPUTS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        category = request.query_params.get('category')
+        if category is not None and not category.isdigit():
+            return Response(
+                {'error': 'category must be a category id'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        exporter = CatalogExporter(
+            export_queryset(int(category) if category else None),
+            media_base=request.build_absolute_uri('/'),
+        )
+        response = StreamingHttpResponse(
+            exporter.stream(output), content_type=OUTPUTS[output])
+        filename = f'catalog-{timezone.now():%Y%m%d}.{output}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def leaderboard(self, name):
+        """Serve a top-N list from the materialized leaderboard store"""
+        if self.request.user and self.request.user.is_staff:
+            # Staff also see inactive products, which the shared boards exclude
+            board = LEADERBOARDS[name]
+            queryset = board.filter(self.get_queryset())
+            products = queryset.order_by(*board.ordering)[:settings.LEADERBOARD_SIZE]
+            serializer = self.get_serializer(products, many=True)
+            return Response(serializer.data)
+        data = get_leaderboards().get(name)
+        return Response([self.trim_fields(item)
+                         for item in with_absolute_urls(data, self.request)])
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticatedOrReadOnly])
     def featured(self, request):
         """Get featured products"""
-        products = self.get_queryset().filter(
-            is_featured=True).order_by('-sales_count')[:10]
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        return self.leaderboard('featured')
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticatedOrReadOnly])
     def best_sellers(self, request):
         """Get best selling products"""
-        products = self.get_queryset().order_by('-sales_count')[:10]
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        return self.leaderboard('best_sellers')
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticatedOrReadOnly])
     def top_rated(self, request):
         """Get top rated products"""
-        products = self.get_queryset().order_by('-average_rating')[:10]
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        return self.leaderboard('top_rated')
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticatedOrReadOnly])
     def latest(self, request):
         """Get latest products"""
-        products = self.get_queryset().order_by('-created_at')[:10]
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        return self.leaderboard('latest')
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticatedOrReadOnly])
+    def trending(self, request):
+        """Get products ranked by recent, time-decayed sales and reviews"""
+        return self.leaderboard('trending')
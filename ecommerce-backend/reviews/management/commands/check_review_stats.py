@@ -0,0 +1,63 @@
+"""
+Django management command to check product review stats against the reviews
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from products.models import Product
+from reviews.models import Review
+
+
+class Command(BaseCommand):
+    help = 'Compare stored product review counts and ratings with a full aggregate of the reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Rewrite the stats of products that drifted',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Products written per UPDATE when fixing (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        totals = {
+            row['product_id']: (row['count'], row['total'])
+            for row in Review.objects.order_by().values('product_id')
+            .annotate(count=Count('pk'), total=Sum('rating'))
+        }
+
+        now = timezone.now()
+        drifted = []
+        stored = Product.objects.values_list('pk', 'review_count', 'rating_sum', 'average_rating')
+        for pk, review_count, rating_sum, average_rating in stored.iterator():
+            count, total = totals.get(pk, (0, 0))
+            average = total / count if count else 0.0
+            if (review_count, rating_sum) != (count, total) or abs(average_rating - average) > 1e-9:
+                self.stdout.write(
+                    f'Product {pk}: stored {review_count} reviews / {rating_sum} rating sum, '
+                    f'expected {count} / {total}'
+                )
+                drifted.append(Product(pk=pk, review_count=count, rating_sum=total,
+                                       average_rating=average, updated_at=now))
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('✅ Product review stats are consistent'))
+            return
+        if not options['fix']:
+            self.stdout.write(self.style.WARNING(
+                f'{len(drifted)} products have drifted review stats (run with --fix to repair)'))
+            return
+
+        with transaction.atomic():
+            Product.objects.bulk_update(
+                drifted, ['review_count', 'rating_sum', 'average_rating', 'updated_at'],
+                batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Fixed review stats of {len(drifted)} products'))
@@ -2,7 +2,7 @@
 Models for reviews app
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from products.models import Product
 from accounts.models import User
@@ -44,19 +44,10 @@ class Review(models.Model):
         ]
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
-
-        # Update product review stats when review is created or updated
-        if is_new:
-            self.product.update_review_stats()
-
-    def delete(self, *args, **kwargs):
-        product = self.product
-        super().delete(*args, **kwargs)
-
-        # Update product review stats when review is deleted
-        product.update_review_stats()
+        # reviews.signals locks the row in pre_save and applies the stats delta
+        # in post_save; Model.save() opens no transaction spanning both
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Review of {self.product.name} by {self.user.email} - {self.rating}★"
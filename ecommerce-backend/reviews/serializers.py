@@ -5,9 +5,10 @@ Serializers for reviews app
 from rest_framework import serializers
 from .models import Review
 from accounts.serializers import UserSerializer
+from ecommerce_project.fieldsets import SparseFieldsetSerializerMixin
 
 
-class ReviewListSerializer(serializers.ModelSerializer):
+class ReviewListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for review listing"""
     user_email = serializers.CharField(source='user.email', read_only=True)
     user = UserSerializer(read_only=True)
@@ -0,0 +1,66 @@
+"""
+Signal handlers for reviews app
+
+Each review write adds the difference it makes to its product's
+``review_count`` / ``rating_sum`` (one UPDATE deriving ``average_rating``)
+instead of re-aggregating the product's reviews.
+"""
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from products.models import Product
+from products.signals import product_changed
+from products.trending import record_activity
+from .models import Review
+
+# Review fields whose changes move product stats
+STATS_FIELDS = {'rating', 'product', 'product_id'}
+
+
+def apply_review_stats(product_id, count, rating_total):
+    """Add a change in review count / rating sum to a product (one UPDATE, no re-aggregation)"""
+    if Product.objects.filter(pk=product_id).add_review_stats(count, rating_total):
+        product_changed(product_id)
+
+
+@receiver(pre_save, sender=Review)
+def review_saving(sender, instance, update_fields=None, raw=False, using=None, **kwargs):
+    # Remember what an edit replaces; the delta is applied once it is saved.
+    # The row stays locked until then (Review.save() runs in a transaction),
+    # so a concurrent edit reads this one's rating rather than the same old one
+    instance._stats_before = None
+    if not raw and not instance._state.adding and (
+            update_fields is None or STATS_FIELDS & set(update_fields)):
+        instance._stats_before = (Review.objects.using(using).select_for_update()
+                                  .filter(pk=instance.pk)
+                                  .values_list('product_id', 'rating').first())
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        record_activity(reviews={instance.product_id: 1})
+        apply_review_stats(instance.product_id, 1, instance.rating)
+        return
+    previous = getattr(instance, '_stats_before', None)
+    if previous is None or previous == (instance.product_id, instance.rating):
+        return
+    product_id, rating = previous
+    if product_id == instance.product_id:
+        apply_review_stats(product_id, 0, instance.rating - rating)
+    else:
+        apply_review_stats(product_id, -1, -rating)
+        apply_review_stats(instance.product_id, 1, instance.rating)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, origin=None, **kwargs):
+    # Also covers reviews deleted in bulk or with their user, but not those
+    # deleted with their product: its row is about to go too
+    if isinstance(origin, Product) or (isinstance(origin, QuerySet) and origin.model is Product):
+        return
+    apply_review_stats(instance.product_id, -1, -instance.rating)
@@ -10,10 +10,12 @@ from rest_framework.exceptions import ValidationError
 from .models import Review
 from .serializers import ReviewListSerializer, ReviewCreateUpdateSerializer
 from products.models import Product
+from ecommerce_project.fieldsets import SparseFieldsetMixin
+from ecommerce_project.query_shapes import QueryShapeMixin
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
-    """ViewSet for product reviews"""
+class ReviewViewSet(QueryShapeMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
+    """ViewSet for product reviews (supports ?fields=)"""
     queryset = Review.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly]
     ordering = ['-created_at']
@@ -27,8 +29,10 @@ class ReviewViewSet(viewsets.ModelViewSet):
         # Filter reviews by product if product_id is in URL
         product_id = self.kwargs.get('product_id')
         if product_id:
-            return Review.objects.filter(product_id=product_id).order_by('-created_at')
-        return super().get_queryset()
+            queryset = Review.objects.filter(product_id=product_id).order_by('-created_at')
+        else:
+            queryset = super().get_queryset()
+        return self.optimize_queryset(queryset)
 
     def perform_create(self, serializer):
         """Create review with current user"""
@@ -0,0 +1,131 @@
+"""
+Tests for product and category autocomplete
+"""
+
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from django.utils import timezone
+from products.autocomplete import AutocompleteIndex, get_autocomplete_index, suggestion_keys
+from products.counters import get_sales_counter
+from products.models import Product
+from products.trending import record_activity
+
+
+@pytest.mark.django_db
+class TestAutocomplete:
+    """Test the in-memory prefix index and its endpoint"""
+
+    @pytest.fixture
+    def catalog(self, create_product, create_category, create_user):
+        user = create_user()
+        mice = create_category(name='Mice')
+        monitors = create_category(name='Monitors')
+        products = {
+            'wireless': create_product(name='Wireless Mouse', sku='MOU-001', category=mice,
+                                       created_by=user),
+            'gaming': create_product(name='Gaming Mouse', sku='MOU-002', category=mice,
+                                     created_by=user),
+            'monitor': create_product(name='4K Monitor', sku='MON-001', category=monitors,
+                                      created_by=user),
+        }
+        Product.objects.filter(pk=products['gaming'].pk).update(sales_count=50)
+        Product.objects.filter(pk=products['monitor'].pk).update(sales_count=500)
+        return products
+
+    def test_suggestion_keys(self):
+        """Every word start and the SKU are keys"""
+        assert suggestion_keys('Wireless  Mouse', 'MOU-001') == {
+            'wireless mouse', 'mouse', 'mou-001'}
+
+    def test_prefix_ranked_by_sales(self, api_client, catalog, django_assert_num_queries):
+        """Any word prefix matches; best sellers come first; no queries once loaded"""
+        api_client.get('/api/products/autocomplete/?q=warmup')
+
+        with django_assert_num_queries(0):
+            response = api_client.get('/api/products/autocomplete/?q=Mo')
+        assert [item['name'] for item in response.data['products']] == [
+            '4K Monitor', 'Gaming Mouse', 'Wireless Mouse']
+        assert [item['name'] for item in response.data['categories']] == ['Monitors']
+
+        response = api_client.get('/api/products/autocomplete/?q=mou-00&limit=1')
+        assert [item['sku'] for item in response.data['products']] == ['MOU-002']
+
+    def test_incremental_updates(self, api_client, catalog, create_product,
+                                 django_capture_on_commit_callbacks, settings):
+        """Saves, deletes and flushed sales counts are applied without a rebuild"""
+        index = get_autocomplete_index()
+        index.ensure_loaded()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product = catalog['wireless']
+            product.name = 'Wireless Trackball'
+            product.save()
+            catalog['gaming'].delete()
+        assert [item['name'] for item in index.suggest('track', 5)[0]] == ['Wireless Trackball']
+        assert index.suggest('mouse', 5)[0] == []
+
+        settings.SALES_COUNTER_MAX_PENDING = 10000
+        get_sales_counter().increment(product.pk, 1000)
+        with django_capture_on_commit_callbacks(execute=True):
+            get_sales_counter().flush()
+        assert index.suggest('wireless', 5)[0][0]['id'] == product.pk
+        assert index.suggest('4k', 5)[0][0]['name'] == '4K Monitor'
+        assert [item['name'] for item in index.suggest('m', 5)[1]] == ['Mice', 'Monitors']
+
+    def test_sync_follows_sales_flushed_elsewhere(self, catalog):
+        """Sales flushed by another worker (no notify, no updated_at) reach the rankings"""
+        # Written long before the load, so a sync does not re-read the rows anyway
+        Product.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        index = get_autocomplete_index()
+        index.ensure_loaded()
+        assert index.suggest('mo', 5)[0][0]['name'] == '4K Monitor'
+
+        wireless = catalog['wireless']
+        Product.objects.filter(pk=wireless.pk).update(sales_count=1000)
+        record_activity(sales={wireless.pk: 1000})
+        index.expire()
+        index.ensure_loaded()
+        assert index.suggest('mo', 5)[0][0]['id'] == wireless.pk
+        assert [item['name'] for item in index.suggest('m', 5)[1]] == ['Mice', 'Monitors']
+
+
+def test_top_lists_move_in_place(settings, monkeypatch):
+    """Sales changes re-rank precomputed prefix lists without scanning the keys"""
+    settings.AUTOCOMPLETE_MAX_LIMIT = 2
+    settings.AUTOCOMPLETE_TOP_DEPTH = 2
+    index = AutocompleteIndex()
+    products = [SimpleNamespace(pk=pk, name=name, slug=name.lower(), sku=f'SKU-{pk}',
+                                sales_count=pk, is_active=True, category_id=None)
+                for pk, name in enumerate(['Mouse', 'Monitor', 'Modem', 'Keyboard'], start=1)]
+    for product in products:
+        index.add(product)
+
+    def expected(prefix):
+        return [product.pk for product in sorted(
+            (product for product in products
+             if product.is_active and any(key.startswith(prefix)
+                                          for key in suggestion_keys(product.name, product.sku))),
+            key=lambda product: (-product.sales_count, product.name, product.pk))][:2]
+
+    def ranked(prefix):
+        return [item['id'] for item in index.suggest(prefix, 2)[0]]
+
+    assert ranked('mo') == expected('mo') == [3, 2]
+    with monkeypatch.context() as patch:
+        patch.setattr(index, 'rank_products', lambda *args: pytest.fail('rescanned'))
+        products[0].sales_count = 10
+        index.sales_changed(products[0])
+        products[2].sales_count = 4
+        index.sales_changed(products[2])
+    assert ranked('mo') == expected('mo') == [1, 3]
+    assert ranked('mod') == expected('mod') == [3]
+
+    # Demoting a listed product below the cut falls back to a rescan
+    products[0].sales_count = 0
+    index.sales_changed(products[0])
+    products[2].is_active = False
+    index.add(products[2])
+    for prefix in ('m', 'mo', 'sk', 'sku-'):
+        assert ranked(prefix) == expected(prefix)
@@ -0,0 +1,289 @@
+"""
+Tests for the category hierarchy
+"""
+
+import io
+
+import pytest
+from django.core.management import call_command
+from rest_framework import status
+from categories.models import Category
+from products.models import Product
+
+
+@pytest.fixture
+def tree(create_category):
+    """Electronics > Computers > Laptops, Electronics > Phones, and Books"""
+    electronics = create_category(name='Electronics')
+    computers = Category.objects.create(name='Computers', parent_category=electronics)
+    laptops = Category.objects.create(name='Laptops', parent_category=computers)
+    phones = Category.objects.create(name='Phones', parent_category=electronics)
+    books = create_category(name='Books')
+    return {category.name: category for category in
+            (electronics, computers, laptops, phones, books)}
+
+
+@pytest.mark.django_db
+class TestCategoryPaths:
+    """Test materialized category paths and subtree filtering"""
+
+    def test_paths_follow_parents(self, tree):
+        """Paths list ancestor ids, root first"""
+        electronics, computers, laptops = tree['Electronics'], tree['Computers'], tree['Laptops']
+        assert electronics.path == f'{electronics.pk}/'
+        assert laptops.path == f'{electronics.pk}/{computers.pk}/{laptops.pk}/'
+        assert laptops.depth == 2
+        assert set(electronics.get_descendants().values_list('name', flat=True)) == {
+            'Electronics', 'Computers', 'Laptops', 'Phones'}
+
+    def test_move_rewrites_subtree(self, tree):
+        """Moving a category re-roots its descendants; cycles are rejected"""
+        computers, books = tree['Computers'], tree['Books']
+        computers.parent_category = books
+        computers.save()
+
+        laptops = Category.objects.get(name='Laptops')
+        assert laptops.path == f'{books.pk}/{computers.pk}/{laptops.pk}/'
+        assert laptops.depth == 2
+
+        books.parent_category = laptops
+        with pytest.raises(ValueError):
+            books.save()
+
+    def test_category_tree_filter(self, api_client, tree, create_product, create_user):
+        """?category_tree= lists products anywhere in the subtree"""
+        user = create_user()
+        for sku, category in (('LAP', 'Laptops'), ('PHO', 'Phones'), ('BOO', 'Books')):
+            create_product(name=sku, sku=sku, category=tree[category], created_by=user)
+
+        response = api_client.get(f'/api/products/?category_tree={tree["Electronics"].pk}')
+        assert response.status_code == status.HTTP_200_OK
+        assert {item['name'] for item in response.data['results']} == {'LAP', 'PHO'}
+        response = api_client.get(f'/api/products/?category_tree={tree["Computers"].pk}')
+        assert [item['name'] for item in response.data['results']] == ['LAP']
+        response = api_client.get('/api/products/?category_tree=999999')
+        assert response.data['results'] == []
+
+    def test_rebuild_command(self, tree):
+        """rebuild_category_paths repairs paths written around save()"""
+        Category.objects.filter(pk=tree['Laptops'].pk).update(
+            parent_category=tree['Books'], path='', depth=0)
+
+        out = io.StringIO()
+        call_command('rebuild_category_paths', stdout=out)
+
+        laptops = Category.objects.get(name='Laptops')
+        assert laptops.path == f'{tree["Books"].pk}/{laptops.pk}/'
+        assert laptops.depth == 1
+        assert '1 updated' in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestCategoryTreeEndpoint:
+    """Test the cached nested category tree"""
+
+    def test_nested_tree_in_one_query(self, api_client, tree, django_assert_num_queries):
+        """The tree is built from one query; later hits only check the fingerprint"""
+        with django_assert_num_queries(2):
+            response = api_client.get('/api/categories/tree/')
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [node['name'] for node in data] == ['Books', 'Electronics']
+        electronics = data[1]
+        assert [node['name'] for node in electronics['children']] == ['Computers', 'Phones']
+        assert electronics['children'][0]['children'][0]['name'] == 'Laptops'
+
+        with django_assert_num_queries(1):
+            assert api_client.get('/api/categories/tree/').json() == data
+
+    def test_depth_limit(self, api_client, tree):
+        """?depth= cuts the tree; has_children tells menus what can expand"""
+        data = api_client.get('/api/categories/tree/?depth=1').json()
+        assert [(node['name'], node['has_children'], node['children']) for node in data] == [
+            ('Books', False, []), ('Electronics', True, [])]
+        assert api_client.get('/api/categories/tree/?depth=0').status_code == \
+            status.HTTP_400_BAD_REQUEST
+
+    def test_invalidated_by_category_changes(self, api_client, tree,
+                                             django_capture_on_commit_callbacks):
+        """Renames, deactivations and writes from other workers show up"""
+        api_client.get('/api/categories/tree/')
+        with django_capture_on_commit_callbacks(execute=True):
+            tree['Phones'].name = 'Mobiles'
+            tree['Phones'].save()
+        children = api_client.get('/api/categories/tree/').json()[1]['children']
+        assert [node['name'] for node in children] == ['Computers', 'Mobiles']
+
+        # Invalidation waits for a commit; the fingerprint (row count) still catches it
+        Category.objects.filter(pk=tree['Computers'].pk).delete()
+        children = api_client.get('/api/categories/tree/').json()[1]['children']
+        assert [node['name'] for node in children] == ['Mobiles']
+
+
+def counts(name):
+    category = Category.objects.get(name=name)
+    return (category.product_count, category.in_stock_count,
+            category.tree_product_count, category.tree_in_stock_count)
+
+
+@pytest.fixture
+def stocked(tree, create_product, create_user):
+    """An in-stock laptop, an out-of-stock phone and a cable in Electronics itself"""
+    user = create_user()
+    return {
+        'laptop': create_product(name='Laptop', sku='LAP', price='999.00',
+                                 category=tree['Laptops'], created_by=user),
+        'phone': create_product(name='Phone', sku='PHO', price='499.00', quantity=0,
+                                category=tree['Phones'], created_by=user),
+        'cable': create_product(name='Cable', sku='CAB', price='9.99',
+                                category=tree['Electronics'], created_by=user),
+    }
+
+
+@pytest.mark.django_db
+class TestCategoryCounts:
+    """Test denormalized direct and subtree product counts"""
+
+    def test_counts_roll_up(self, stocked):
+        """Direct counts stay on the category; subtree counts include descendants"""
+        assert counts('Laptops') == (1, 1, 1, 1)
+        assert counts('Computers') == (0, 0, 1, 1)
+        assert counts('Phones') == (1, 0, 1, 0)
+        assert counts('Electronics') == (1, 1, 3, 2)
+        assert counts('Books') == (0, 0, 0, 0)
+
+    def test_writes_keep_counts_consistent(self, tree, stocked):
+        """save, update, bulk_update, deletes and category moves apply deltas"""
+        from categories.counts import reconcile_counts
+        laptop, phone, cable = stocked['laptop'], stocked['phone'], stocked['cable']
+
+        laptop.category = tree['Books']
+        laptop.save()
+        assert counts('Electronics') == (1, 1, 2, 1)
+        assert counts('Books') == (1, 1, 1, 1)
+
+        Product.objects.filter(pk=cable.pk).update(is_active=False)
+        phone.quantity_in_stock = 5
+        Product.objects.bulk_update([phone], ['quantity_in_stock'])
+        assert counts('Electronics') == (0, 0, 1, 1)
+
+        tree['Phones'].parent_category = tree['Books']
+        tree['Phones'].save()
+        assert counts('Electronics') == (0, 0, 0, 0)
+        assert counts('Books') == (1, 1, 2, 2)
+
+        Product.objects.filter(pk=laptop.pk).delete()
+        assert counts('Books') == (0, 0, 1, 1)
+        Category.objects.filter(name='Phones').delete()
+        assert counts('Books') == (0, 0, 0, 0)
+        assert reconcile_counts() == 0
+
+    def test_listed_without_extra_queries(self, api_client, stocked,
+                                          django_assert_max_num_queries):
+        """Category lists read the stored counts (fingerprint, page count, rows)"""
+        with django_assert_max_num_queries(3):
+            response = api_client.get('/api/categories/?search=Electronics')
+        item = response.data['results'][0]
+        assert (item['product_count'], item['tree_product_count'],
+                item['tree_in_stock_count']) == (1, 3, 2)
+
+    def test_reconcile_command(self, stocked):
+        """reconcile_category_counts repairs drift"""
+        Category.objects.filter(name='Electronics').update(tree_product_count=99)
+        out = io.StringIO()
+        call_command('reconcile_category_counts', stdout=out)
+        assert counts('Electronics') == (1, 1, 3, 2)
+        assert '1 categories had drifted counts' in out.getvalue()
+
+
+def stats(name):
+    from categories.serializers import CategoryStatsSerializer, category_stats
+    return CategoryStatsSerializer(category_stats(Category.objects.get(name=name))).data
+
+
+@pytest.mark.django_db
+class TestCategoryStats:
+    """Test the incrementally maintained category statistics store"""
+
+    def test_stats_roll_up(self, api_client, tree, stocked):
+        """Direct and subtree stats are served on detail and /stats/"""
+        response = api_client.get(f'/api/categories/{tree["Electronics"].pk}/stats/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['direct'] == {
+            'min_price': '9.99', 'max_price': '9.99', 'average_rating': None,
+            'product_count': 1, 'in_stock_count': 1,
+        }
+        assert response.data['subtree'] == {
+            'min_price': '9.99', 'max_price': '999.00', 'average_rating': None,
+            'product_count': 3, 'in_stock_count': 2,
+        }
+        detail = api_client.get(f'/api/categories/{tree["Computers"].pk}/').data
+        assert detail['stats']['subtree']['min_price'] == '999.00'
+        assert detail['stats']['direct']['min_price'] is None
+
+    def test_writes_refresh_stats(self, tree, stocked):
+        """Price, rating, activity and category moves update the affected categories"""
+        laptop, phone, cable = stocked['laptop'], stocked['phone'], stocked['cable']
+
+        Product.objects.filter(pk=cable.pk).update(is_active=False)
+        assert stats('Electronics')['subtree']['min_price'] == '499.00'
+
+        laptop.price = '1299.00'
+        laptop.save()
+        Product.objects.filter(pk=phone.pk).update(average_rating=4.0, review_count=2)
+        subtree = stats('Electronics')['subtree']
+        assert (subtree['max_price'], subtree['average_rating']) == ('1299.00', 4.0)
+
+        tree['Computers'].parent_category = tree['Books']
+        tree['Computers'].save()
+        assert stats('Electronics')['subtree']['max_price'] == '499.00'
+        assert stats('Books')['subtree']['max_price'] == '1299.00'
+
+    def test_deltas_skip_aggregation_unless_extreme_leaves(self, tree, stocked, create_product,
+                                                          django_assert_max_num_queries):
+        """Rating and inner price changes apply deltas; losing the max re-aggregates"""
+        from categories.stats import rebuild_stats
+        laptops = tree['Laptops']
+        user = stocked['laptop'].created_by
+        create_product(name='Netbook', sku='NET', price='500.00', category=laptops,
+                       created_by=user)
+        ultrabook = create_product(name='Ultrabook', sku='ULT', price='700.00',
+                                   category=laptops, created_by=user)
+
+        with django_assert_max_num_queries(20) as context:
+            Product.objects.filter(pk=ultrabook.pk).update(price='800.00')
+            Product.objects.filter(pk=ultrabook.pk).update(average_rating=4.0, review_count=1)
+        assert not any('MIN(' in query['sql'] for query in context.captured_queries)
+        direct = stats('Laptops')['direct']
+        assert (direct['min_price'], direct['max_price'], direct['average_rating']) == \
+            ('500.00', '999.00', 4.0)
+
+        Product.objects.filter(pk=stocked['laptop'].pk).delete()
+        assert stats('Laptops')['direct']['max_price'] == '800.00'
+        assert stats('Electronics')['subtree']['max_price'] == '800.00'
+        assert rebuild_stats(workers=0) == 0
+
+    def test_detail_etag_follows_stats(self, api_client, tree, stocked):
+        """A stats change alters the category detail ETag"""
+        url = f'/api/categories/{tree["Laptops"].pk}/'
+        etag = api_client.get(url)['ETag']
+        Product.objects.filter(pk=stocked['laptop'].pk).update(price='5.00')
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['stats']['direct']['max_price'] == '5.00'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rebuild_stats_command_in_parallel(tree, stocked):
+    """rebuild_category_stats aggregates batches on worker threads"""
+    from categories.models import CategoryStats
+    expected = stats('Electronics')
+    CategoryStats.objects.all().delete()
+
+    out = io.StringIO()
+    call_command('rebuild_category_stats', '--workers', '2', '--batch-size', '2', stdout=out)
+
+    assert stats('Electronics')['subtree'] == expected['subtree']
+    # Books has no products, which an absent row already says
+    assert CategoryStats.objects.count() == 4
+    assert '4 categories changed' in out.getvalue()
@@ -0,0 +1,92 @@
+"""
+Tests for streaming catalog export
+"""
+
+import csv
+import io
+import json
+
+import pytest
+from django.contrib.auth.models import Group
+from rest_framework import status
+from products.importers import ProductImporter
+from products.models import Product, ProductAttribute
+
+
+@pytest.fixture
+def partner_client(api_client, create_user, settings):
+    user = create_user(username='partner', email='partner@example.com')
+    user.groups.add(Group.objects.create(name=settings.CATALOG_PARTNER_GROUP))
+    api_client.force_authenticate(user=user)
+    return api_client
+
+
+@pytest.fixture
+def catalog(create_product, create_category, create_user):
+    user = create_user(username='seller', email='seller@example.com')
+    category = create_category()
+    first = create_product(name='First', sku='EXP-1', category=category, created_by=user)
+    create_product(name='Second', sku='EXP-2', category=category, created_by=user)
+    hidden = create_product(name='Hidden', sku='EXP-3', category=category, created_by=user)
+    hidden.is_active = False
+    hidden.save()
+    ProductAttribute.objects.create(product=first, attribute_key='Color', attribute_value='Red')
+    return first
+
+
+def content(response):
+    return b''.join(response.streaming_content).decode()
+
+
+@pytest.mark.django_db
+class TestCatalogExport:
+    """Test NDJSON/CSV catalog export"""
+
+    def test_requires_partner_or_staff(self, authenticated_client):
+        """Ordinary users cannot export"""
+        response = authenticated_client.get('/api/products/export/')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_ndjson(self, partner_client, catalog):
+        """Every active product is one JSON line with category and attributes"""
+        response = partner_client.get('/api/products/export/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/x-ndjson'
+        records = [json.loads(line) for line in content(response).splitlines()]
+        assert [r['sku'] for r in records] == ['EXP-1', 'EXP-2']
+        assert records[0]['category']['name'] == 'Electronics'
+        assert records[0]['attributes'] == [
+            {'attribute_key': 'Color', 'attribute_value': 'Red'}]
+
+    def test_csv_round_trips_through_import(self, partner_client, catalog):
+        """The CSV export can be re-imported as-is"""
+        response = partner_client.get('/api/products/export/?output=csv')
+        body = content(response)
+        rows = list(csv.DictReader(io.StringIO(body)))
+        assert [r['sku'] for r in rows] == ['EXP-1', 'EXP-2']
+        assert rows[0]['attr.Color'] == 'Red'
+
+        Product.objects.filter(sku='EXP-1').update(name='Changed')
+        report = ProductImporter().run(io.BytesIO(body.encode()), 'csv')
+        assert (report.updated, report.failed) == (2, 0)
+        reimported = Product.objects.get(sku='EXP-1')
+        assert (reimported.name, reimported.image.name) == ('First', 'test.jpg')
+
+    def test_csv_round_trips_multi_valued_attributes(self, partner_client, catalog):
+        """Several values of one key share a cell and import back as separate rows"""
+        for value in ('Blue', 'Teal; Navy', 'A\\B'):
+            ProductAttribute.objects.create(
+                product=catalog, attribute_key='Color', attribute_value=value)
+        expected = set(catalog.attributes.values_list('attribute_key', 'attribute_value'))
+        body = content(partner_client.get('/api/products/export/?output=csv'))
+
+        catalog.attributes.all().delete()
+        report = ProductImporter().run(io.BytesIO(body.encode()), 'csv')
+        assert report.failed == 0
+        assert set(catalog.attributes.values_list('attribute_key', 'attribute_value')) == \
+            expected
+
+    def test_invalid_output(self, partner_client):
+        """Unknown output formats are rejected"""
+        response = partner_client.get('/api/products/export/?output=xml')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
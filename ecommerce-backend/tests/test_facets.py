@@ -0,0 +1,114 @@
+"""
+Tests for faceted attribute filtering
+"""
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from products.models import Product, ProductAttribute
+
+
+@pytest.fixture
+def catalog(create_product, create_category, create_user):
+    """Shirts in two colours and sizes across two categories"""
+    user = create_user()
+    clothing = create_category(name='Clothing')
+    sale = create_category(name='Sale')
+
+    def make(sku, price, category, **attributes):
+        product = create_product(name=sku, sku=sku, price=price,
+                                 category=category, created_by=user)
+        for key, value in attributes.items():
+            ProductAttribute.objects.create(
+                product=product, attribute_key=key, attribute_value=value)
+        return product
+
+    return {
+        'red_m': make('RED-M', '20.00', clothing, Color='Red', Size='M'),
+        'red_l': make('RED-L', '30.00', clothing, Color='Red', Size='L'),
+        'blue_m': make('BLUE-M', '120.00', sale, Color='Blue', Size='M'),
+        'clothing': clothing,
+        'sale': sale,
+    }
+
+
+def counts(facets, key):
+    return {item['value']: item['count'] for item in facets['attributes'][key]}
+
+
+@pytest.mark.django_db
+class TestProductFacets:
+    """Test attr.<key>=<value> filters and facet counts"""
+
+    def test_attribute_filter(self, api_client, catalog):
+        """attr.<key> values are OR-ed within a key and AND-ed across keys"""
+        response = api_client.get('/api/products/?attr.color=red&attr.size=M')
+        assert [p['id'] for p in response.data['results']] == [catalog['red_m'].id]
+
+        response = api_client.get('/api/products/?attr.Color=Red&attr.Color=Blue')
+        assert response.data['count'] == 3
+
+    def test_facet_counts(self, api_client, catalog):
+        """Facet counts cover attributes, categories and price buckets"""
+        response = api_client.get('/api/products/?facets=true')
+        assert response.status_code == status.HTTP_200_OK
+        facets = response.data['facets']
+        assert facets['total'] == 3
+        assert counts(facets, 'Color') == {'Red': 2, 'Blue': 1}
+        assert {c['name']: c['count'] for c in facets['categories']} == \
+            {'Clothing': 2, 'Sale': 1}
+        assert {b['min']: b['count'] for b in facets['price'] if b['count']} == \
+            {0: 1, 25: 1, 100: 1}
+
+    def test_disjunctive_counts(self, api_client, catalog):
+        """Selecting a colour keeps counts for the other colours"""
+        response = api_client.get('/api/products/?facets=true&attr.color=red')
+        facets = response.data['facets']
+        assert facets['total'] == 2
+        assert counts(facets, 'Color') == {'Red': 2, 'Blue': 1}
+        assert counts(facets, 'Size') == {'M': 1, 'L': 1}
+
+    def test_counts_respect_other_filters(self, api_client, catalog):
+        """Range, flag and category tree filters narrow the counts from the index"""
+        Product.objects.filter(pk=catalog['red_l'].pk).update(is_featured=True)
+        api_client.get('/api/products/?facets=true')
+
+        url = '/api/products/?max_price=50&is_featured=true'
+        with CaptureQueriesContext(connection) as plain:
+            api_client.get(url)
+        with CaptureQueriesContext(connection) as faceted:
+            response = api_client.get(f'{url}&facets=true')
+        # Only the category names of the counts are read
+        assert len(faceted) == len(plain) + 1
+        assert response.data['facets']['total'] == 1
+        assert counts(response.data['facets'], 'Size') == {'L': 1}
+
+        response = api_client.get('/api/products/?facets=true&max_price=25')
+        assert response.data['facets']['total'] == 1
+        assert counts(response.data['facets'], 'Color') == {'Red': 1}
+        response = api_client.get(
+            f'/api/products/?facets=true&category_tree={catalog["sale"].pk}')
+        assert counts(response.data['facets'], 'Color') == {'Blue': 1}
+
+    def test_substring_search_scan_is_bounded(self, api_client, catalog, settings):
+        """?search= matches are read from the database up to FACET_SCAN_LIMIT"""
+        settings.FACET_SCAN_LIMIT = 1
+        response = api_client.get('/api/products/?facets=true&search=RED')
+        assert response.data['count'] == 2
+        assert response.data['facets']['total'] == 1
+        assert response.data['facets']['truncated'] is True
+        response = api_client.get('/api/products/?facets=true&search=BLUE')
+        assert response.data['facets']['truncated'] is False
+
+    def test_counts_follow_writes(self, api_client, catalog, django_capture_on_commit_callbacks):
+        """A loaded facet index is updated incrementally"""
+        api_client.get('/api/products/?facets=true')
+        with django_capture_on_commit_callbacks(execute=True):
+            ProductAttribute.objects.filter(
+                product=catalog['blue_m'], attribute_key='Color'
+            ).update(attribute_value='Red')
+            catalog['blue_m'].save()
+
+        response = api_client.get('/api/products/?facets=true')
+        assert counts(response.data['facets'], 'Color') == {'Red': 3}
@@ -0,0 +1,75 @@
+"""
+Tests for sparse fieldsets (?fields= / ?expand=)
+"""
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from products.models import ProductAttribute
+from reviews.models import Review
+
+
+@pytest.mark.django_db
+class TestSparseFieldsets:
+    """Test field selection and the matching query pruning"""
+
+    def test_product_list_fields_and_expand(self, api_client, create_product):
+        """Only requested fields are rendered; attributes on request"""
+        product = create_product()
+        ProductAttribute.objects.create(
+            product=product, attribute_key='Color', attribute_value='Red')
+
+        response = api_client.get('/api/products/?fields=id,name,current_price')
+        assert response.data['results'] == [
+            {'id': product.id, 'name': product.name, 'current_price': '99.99'}]
+
+        response = api_client.get('/api/products/?fields=id&expand=attributes')
+        item = response.data['results'][0]
+        assert item['attributes'][0]['attribute_value'] == 'Red'
+        assert set(item) == {'id', 'attributes'}
+
+    def test_product_list_prunes_columns(self, api_client, create_product):
+        """Unrequested columns and joins are not selected"""
+        create_product()
+        with CaptureQueriesContext(connection) as queries:
+            api_client.get('/api/products/?fields=id,name')
+        page_query = queries.captured_queries[-1]['sql']
+        assert '"products"."description"' not in page_query
+        assert 'JOIN "categories"' not in page_query
+
+    def test_product_detail_fields(self, api_client, create_product):
+        """Detail responses are trimmed (the cached payload stays complete)"""
+        product = create_product()
+        response = api_client.get(f'/api/products/{product.id}/?fields=id,sku')
+        assert response.data == {'id': product.id, 'sku': product.sku}
+        assert 'description' in api_client.get(f'/api/products/{product.id}/').data
+
+    def test_category_list_only_loads_requested_columns(self, api_client, create_category):
+        """Category listings defer unrequested columns"""
+        create_category()
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get('/api/categories/?fields=id,name')
+        assert response.data['results'][0].keys() == {'id', 'name'}
+        assert '"categories"."description"' not in queries.captured_queries[-1]['sql']
+
+    def test_reviews_join_users_only_when_rendered(self, api_client, create_product,
+                                                   create_user, django_assert_num_queries):
+        """Nested users are joined in one query instead of one per review"""
+        product = create_product()
+        for number in range(3):
+            user = create_user(username=f'reviewer{number}', email=f'r{number}@example.com')
+            Review.objects.create(product=product, user=user, rating=4,
+                                  title='Great product', comment='Works really well')
+        url = f'/api/reviews/products/{product.id}/reviews/'
+
+        with django_assert_num_queries(2):
+            response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'][0]['user_email'].endswith('@example.com')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(f'{url}?fields=id,rating')
+        assert response.data['results'][0] == {
+            'id': response.data['results'][0]['id'], 'rating': 4}
+        assert 'JOIN' not in queries.captured_queries[-1]['sql']
@@ -0,0 +1,99 @@
+"""
+Tests for responsive image variants
+"""
+
+import io
+from pathlib import Path
+
+import pytest
+from django.core.management import call_command
+from PIL import Image
+from products.models import Product
+
+
+def write_image(settings, name, size):
+    path = Path(settings.MEDIA_ROOT) / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new('RGB', size, 'red').save(path, 'JPEG')
+    return name
+
+
+@pytest.mark.django_db
+class TestImageVariants:
+    """Test variant generation and the srcset maps"""
+
+    def test_variants_generated_after_commit(self, api_client, create_category, create_user,
+                                             settings, django_capture_on_commit_callbacks):
+        """Saving a product writes WebP variants and lists expose them as image_srcset"""
+        write_image(settings, 'products/photo.jpg', (2000, 1000))
+        with django_capture_on_commit_callbacks(execute=True):
+            product = Product.objects.create(
+                name='Photo', sku='PHOTO-1', price='10.00', quantity_in_stock=1,
+                category=create_category(), created_by=create_user(),
+                description='Test', image='products/photo.jpg')
+
+        product.refresh_from_db()
+        assert product.image_variants['source'] == 'products/photo.jpg'
+        assert sorted(product.image_variants['widths'], key=int) == ['160', '320', '640', '1280']
+        variant = Image.open(Path(settings.MEDIA_ROOT) / product.image_variants['widths']['320'])
+        assert (variant.format, variant.size) == ('WEBP', (320, 160))
+
+        item = api_client.get('/api/products/').data['results'][0]
+        assert item['image_srcset']['320w'] == 'http://testserver/media/products/photo_320w.webp'
+        assert list(item['image_srcset']) == ['160w', '320w', '640w', '1280w']
+        assert item['category']['image_srcset'] == {}
+
+    def test_small_images_are_not_upscaled(self, create_product, settings,
+                                           django_capture_on_commit_callbacks):
+        """An image narrower than every width gets a single full-size WebP copy"""
+        write_image(settings, 'test.jpg', (100, 80))
+        with django_capture_on_commit_callbacks(execute=True):
+            product = create_product()
+        product.refresh_from_db()
+        assert list(product.image_variants['widths']) == ['100']
+
+    def test_replaced_image_drops_stale_variants(self, create_product, settings,
+                                                 django_capture_on_commit_callbacks):
+        """A new upload gets fresh variants and the old ones are deleted"""
+        write_image(settings, 'test.jpg', (400, 400))
+        write_image(settings, 'products/new.jpg', (400, 400))
+        with django_capture_on_commit_callbacks(execute=True):
+            product = create_product()
+        product.refresh_from_db()
+        old = Path(settings.MEDIA_ROOT) / product.image_variants['widths']['320']
+        assert old.exists()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product.image = 'products/new.jpg'
+            product.save()
+        product.refresh_from_db()
+        assert product.image_variants['widths']['320'] == 'products/new_320w.webp'
+        assert not old.exists()
+
+    def test_command_backfills_missing_variants(self, create_product, settings):
+        """generate_image_variants covers rows written without signals"""
+        write_image(settings, 'test.jpg', (400, 400))
+        product = create_product()
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+
+        out = io.StringIO()
+        call_command('generate_image_variants', stdout=out)
+
+        product.refresh_from_db()
+        assert product.image_variants['source'] == 'test.jpg'
+        assert 'products.Product.image: 1 built, 0 unreadable' in out.getvalue()
+
+    def test_force_rebuilds_only_rows_with_images(self, create_product, settings):
+        """--force rebuilds in place without logging a change for every product"""
+        from products.models import ProductChange
+        write_image(settings, 'test.jpg', (400, 400))
+        product = create_product()
+        create_product(name='Bare', sku='BARE-001', category=product.category,
+                       created_by=product.created_by)
+        Product.objects.filter(sku='BARE-001').update(image='')
+        ProductChange.objects.all().delete()
+
+        out = io.StringIO()
+        call_command('generate_image_variants', '--force', stdout=out)
+        assert 'products.Product.image: 1 built, 0 unreadable' in out.getvalue()
+        assert list(ProductChange.objects.values_list('product_id', flat=True)) == [product.pk]
@@ -0,0 +1,179 @@
+"""
+Tests for bulk product import
+"""
+
+import io
+import json
+from decimal import Decimal
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from rest_framework import status
+from products.importers import ProductImporter
+from products.models import Product, ProductAttribute
+
+CSV_FEED = (
+    'sku,name,description,price,quantity_in_stock,category,attr.Color,attr.Size\n'
+    'IMP-1,Imported One,First imported product,10.00,5,{category},Red,M\n'
+    'IMP-2,Imported Two,Second imported product,20.00,7,,Blue,\n'
+    'IMP-3,Broken,Missing a price,,1,,,\n'
+)
+
+
+@pytest.fixture
+def staff_client(api_client, create_user):
+    user = create_user(username='staff', email='staff@example.com')
+    user.is_staff = True
+    user.save()
+    api_client.force_authenticate(user=user)
+    return api_client
+
+
+@pytest.mark.django_db
+class TestProductImport:
+    """Test streaming CSV/JSONL product import"""
+
+    def test_csv_import(self, create_category):
+        """Rows are upserted with attributes and invalid rows are reported"""
+        category = create_category()
+        feed = io.BytesIO(CSV_FEED.format(category=category.id).encode())
+        report = ProductImporter(batch_size=2).run(feed, 'csv')
+
+        assert (report.rows, report.created, report.failed, report.batches) == (3, 2, 1, 2)
+        assert report.errors[0]['row'] == 4
+        assert 'price' in report.errors[0]['errors']
+
+        product = Product.objects.get(sku='IMP-1')
+        assert product.category == category
+        assert product.slug == 'imported-one'
+        assert set(product.attributes.values_list('attribute_key', 'attribute_value')) == \
+            {('Color', 'Red'), ('Size', 'M')}
+
+    def test_jsonl_upsert_by_sku(self, create_product):
+        """Existing SKUs are updated in place and keep their slug"""
+        existing = create_product(name='Old Name', sku='JS-1')
+        rows = [
+            {'sku': 'JS-1', 'name': 'New Name', 'description': 'Updated', 'price': '5.50',
+             'quantity_in_stock': 3,
+             'attributes': [{'attribute_key': 'Brand', 'attribute_value': 'Acme'}]},
+            {'sku': 'JS-2', 'name': 'Old Name', 'description': 'Same name as JS-1',
+             'price': '1.00', 'quantity_in_stock': 1},
+        ]
+        feed = io.BytesIO('\n'.join(json.dumps(row) for row in rows).encode() + b'\nnot json\n')
+        report = ProductImporter().run(feed, 'jsonl')
+
+        assert (report.created, report.updated, report.failed) == (1, 1, 1)
+        existing.refresh_from_db()
+        assert (existing.name, str(existing.price), existing.slug) == \
+            ('New Name', '5.50', 'old-name')
+        assert Product.objects.get(sku='JS-2').slug == 'old-name-js-2'
+        assert list(ProductAttribute.objects.filter(product=existing).values_list(
+            'attribute_value', flat=True)) == ['Acme']
+
+    def test_attribute_replacement_stays_set_based(self, create_category,
+                                                   django_assert_max_num_queries):
+        """Re-importing attributes logs each product once and touches no rows one by one"""
+        from products.models import ProductChange
+        category = create_category()
+        feed = CSV_FEED.format(category=category.id).encode()
+        ProductImporter().run(io.BytesIO(feed), 'csv')
+        ProductChange.objects.all().delete()
+
+        with django_assert_max_num_queries(20) as context:
+            ProductImporter().run(io.BytesIO(feed), 'csv')
+        assert not any(query['sql'].startswith('UPDATE "products" SET "updated_at"')
+                       for query in context.captured_queries)
+        assert sorted(ProductChange.objects.values_list('product_id', flat=True)) == \
+            sorted(Product.objects.values_list('pk', flat=True))
+        assert Product.objects.get(sku='IMP-1').attributes.count() == 2
+
+    def test_import_endpoint_requires_staff(self, authenticated_client):
+        """Non-staff users cannot import"""
+        upload = SimpleUploadedFile('feed.csv', b'sku\n')
+        response = authenticated_client.post(
+            '/api/products/import/', {'file': upload}, format='multipart')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_import_endpoint(self, staff_client, create_category):
+        """Staff upload returns a throughput and error report"""
+        category = create_category()
+        upload = SimpleUploadedFile(
+            'feed.csv', CSV_FEED.format(category=category.id).encode())
+        response = staff_client.post(
+            '/api/products/import/', {'file': upload}, format='multipart')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['created'] == 2
+        assert response.data['failed'] == 1
+        assert 'rows_per_second' in response.data
+        assert Product.objects.get(sku='IMP-1').created_by.username == 'staff'
+
+    def test_import_command(self, create_category, tmp_path):
+        """manage.py import_products reads a feed file"""
+        category = create_category()
+        path = tmp_path / 'feed.csv'
+        path.write_text(CSV_FEED.format(category=category.id))
+        out = io.StringIO()
+        call_command('import_products', str(path), stdout=out, stderr=io.StringIO())
+        assert '2 created' in out.getvalue()
+        assert Product.objects.filter(sku__startswith='IMP-').count() == 2
+
+
+@pytest.mark.django_db
+class TestBulkPriceStockUpdate:
+    """Test set-based price / stock updates by SKU"""
+
+    def test_bulk_update_endpoint(self, staff_client, create_product, create_category,
+                                  create_user, django_assert_max_num_queries):
+        """Valid rows are written together; every SKU gets a status"""
+        user, category = create_user(), create_category()
+        first = create_product(sku='BULK-1', category=category, created_by=user)
+        second = create_product(name='Second', sku='BULK-2', category=category, created_by=user)
+        staff_client.get(f'/api/products/{first.id}/')
+        rows = [
+            {'sku': 'BULK-1', 'price': '80.00', 'discount_price': '60.00'},
+            {'sku': 'BULK-2', 'quantity_in_stock': 10},
+            {'sku': 'NOPE', 'price': '1.00'},
+            {'sku': 'BULK-2', 'quantity_in_stock': 3},
+            {'sku': 'BULK-1'},
+        ]
+
+        response = staff_client.post('/api/products/bulk-update/', rows, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert [(r['row'], r['sku'], r['status']) for r in response.data['results']] == [
+            (1, 'BULK-1', 'updated'), (2, 'BULK-2', 'failed'), (3, 'NOPE', 'failed'),
+            (4, 'BULK-2', 'updated'), (5, 'BULK-1', 'failed'),
+        ]
+        first.refresh_from_db()
+        second.refresh_from_db()
+        assert (first.effective_price, first.discount_percentage) == (Decimal('60.00'), 25)
+        assert second.quantity_in_stock == 3
+
+        # The cached detail payload was dropped
+        assert staff_client.get(f'/api/products/{first.id}/').data['current_price'] == '60.00'
+
+        # Unchanged rows are not rewritten; the rest is one SELECT, one UPDATE,
+        # one change log INSERT and the category count snapshots around the
+        # stock change (plus savepoints), whatever the number of rows
+        with django_assert_max_num_queries(8):
+            response = staff_client.post(
+                '/api/products/bulk-update/', {'items': rows[:2]}, format='json')
+        assert response.data['unchanged'] == 1
+        assert response.data['updated'] == 1
+
+    def test_bulk_update_requires_staff(self, authenticated_client):
+        """Non-staff users cannot bulk update"""
+        response = authenticated_client.post(
+            '/api/products/bulk-update/', [{'sku': 'X', 'price': '1.00'}], format='json')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_bulk_update_command(self, create_product, tmp_path):
+        """manage.py bulk_update_products reads a CSV feed"""
+        create_product(sku='CMD-1')
+        path = tmp_path / 'prices.csv'
+        path.write_text('sku,price,quantity_in_stock\nCMD-1,5.50,0\n')
+        out = io.StringIO()
+        call_command('bulk_update_products', str(path), stdout=out, stderr=io.StringIO())
+        assert '1 updated' in out.getvalue()
+        product = Product.objects.get(sku='CMD-1')
+        assert (product.price, product.quantity_in_stock) == (Decimal('5.50'), 0)
@@ -2,9 +2,14 @@
 Tests for products app
 """
 
+import io
+from decimal import Decimal
+
 import pytest
+from django.core.management import call_command
+from django.db import DatabaseError
 from rest_framework import status
-from products.models import Product
+from products.models import Product, ProductAttribute
 from categories.models import Category
 
 
@@ -107,3 +112,792 @@ class TestCategoryAPI:
         create_category(name='Electronics')
         response = api_client.get('/api/categories/?search=electronics')
         assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+class TestProductCursorPagination:
+    """Test keyset (cursor) pagination for product listings"""
+
+    def _walk(self, client, url):
+        ids = []
+        while url:
+            response = client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert 'count' not in response.data
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_cursor_walk_matches_offset_ordering(self, api_client, create_product,
+                                                 create_category, create_user):
+        """Walking every cursor page returns each product once, in order"""
+        category = create_category()
+        user = create_user()
+        for i in range(7):
+            create_product(name=f'Product {i}', sku=f'SKU-{i}', created_by=user,
+                           price='10.00' if i % 2 else '20.00', category=category)
+
+        for ordering in ['price', '-price', 'created_at', '-sales_count', '-average_rating']:
+            ids = self._walk(
+                api_client,
+                f'/api/products/?pagination=cursor&page_size=2&ordering={ordering}')
+            expected = list(Product.objects.order_by(
+                ordering, ('-' if ordering.startswith('-') else '') + 'id'
+            ).values_list('id', flat=True))
+            assert ids == expected
+
+    def test_previous_link(self, api_client, create_product, create_category, create_user):
+        """Following previous from the second page returns the first page"""
+        category = create_category()
+        user = create_user()
+        for i in range(5):
+            create_product(name=f'Product {i}', sku=f'SKU-{i}',
+                           category=category, created_by=user)
+
+        first = api_client.get('/api/products/?pagination=cursor&page_size=2')
+        assert first.data['previous'] is None
+        second = api_client.get(first.data['next'])
+        back = api_client.get(second.data['previous'])
+        assert [p['id'] for p in back.data['results']] == \
+            [p['id'] for p in first.data['results']]
+        assert back.data['previous'] is None
+
+    def test_invalid_cursor(self, api_client, create_product):
+        """A malformed cursor returns 404"""
+        create_product()
+        response = api_client.get('/api/products/?cursor=not-a-cursor')
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestLeaderboards:
+    """Test materialized featured/best_sellers/top_rated/latest lists"""
+
+    def _ids(self, client, action):
+        response = client.get(f'/api/products/{action}/')
+        assert response.status_code == status.HTTP_200_OK
+        return [item['id'] for item in response.data]
+
+    def test_served_without_queries(self, api_client, create_product,
+                                    django_assert_num_queries):
+        """A warm board is served from memory"""
+        create_product()
+        self._ids(api_client, 'best_sellers')
+        with django_assert_num_queries(0):
+            self._ids(api_client, 'best_sellers')
+
+    def test_incremental_updates(self, api_client, create_product, create_category,
+                                 create_user, django_capture_on_commit_callbacks):
+        """Sales, featured flag and deactivation reshuffle warm boards"""
+        category = create_category()
+        user = create_user()
+        first = create_product(name='First', sku='SKU-1', category=category, created_by=user)
+        second = create_product(name='Second', sku='SKU-2', category=category, created_by=user)
+        assert self._ids(api_client, 'featured') == []
+        assert self._ids(api_client, 'best_sellers') == [second.id, first.id]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            first.sales_count = 5
+            first.is_featured = True
+            first.save()
+        assert self._ids(api_client, 'best_sellers') == [first.id, second.id]
+        assert self._ids(api_client, 'featured') == [first.id]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            first.is_active = False
+            first.save()
+        assert self._ids(api_client, 'best_sellers') == [second.id]
+        assert self._ids(api_client, 'featured') == []
+
+    def test_refills_after_removals(self, api_client, create_product, create_category,
+                                    create_user, settings, django_capture_on_commit_callbacks):
+        """Dropping below the board size re-reads the board from the database"""
+        settings.LEADERBOARD_SIZE = 2
+        settings.LEADERBOARD_BUFFER_FACTOR = 1
+        category = create_category()
+        user = create_user()
+        products = [create_product(name=f'P{i}', sku=f'SKU-{i}', category=category,
+                                   created_by=user) for i in range(3)]
+        assert self._ids(api_client, 'latest') == [products[2].id, products[1].id]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            products[2].delete()
+        assert self._ids(api_client, 'latest') == [products[1].id, products[0].id]
+
+    def test_staleness_bound(self, api_client, create_product, settings):
+        """Boards older than LEADERBOARD_MAX_AGE are rebuilt"""
+        settings.LEADERBOARD_MAX_AGE = 0
+        product = create_product()
+        assert self._ids(api_client, 'top_rated') == [product.id]
+        Product.objects.filter(pk=product.pk).update(is_active=False)
+        assert self._ids(api_client, 'top_rated') == []
+
+
+@pytest.mark.django_db
+class TestSalesCounters:
+    """Test write-behind buffered sales counts"""
+
+    def test_increment_is_buffered(self, authenticated_client, create_product, create_user,
+                                   django_assert_num_queries):
+        """Increments are returned immediately and written on flush"""
+        from products.counters import get_sales_counter
+        product = create_product(
+            created_by=create_user(username='seller', email='seller@example.com'))
+        url = f'/api/products/{product.id}/increment_sales/'
+
+        assert authenticated_client.post(url).data['sales_count'] == 1
+        assert authenticated_client.post(url).data['sales_count'] == 2
+        product.refresh_from_db()
+        assert product.sales_count == 0
+
+        # savepoint, one UPDATE, release, plus the trending SELECT, INSERT and two UPDATEs
+        with django_assert_num_queries(7):
+            assert get_sales_counter().flush() == 1
+        product.refresh_from_db()
+        assert product.sales_count == 2
+        assert authenticated_client.post(url).data['sales_count'] == 3
+
+    def test_pending_bound_forces_flush(self, create_product, create_category,
+                                        create_user, settings):
+        """Reaching SALES_COUNTER_MAX_PENDING flushes synchronously"""
+        from products.counters import get_sales_counter
+        settings.SALES_COUNTER_MAX_PENDING = 3
+        category = create_category()
+        user = create_user()
+        first = create_product(name='First', sku='SKU-1', category=category, created_by=user)
+        second = create_product(name='Second', sku='SKU-2', category=category, created_by=user)
+
+        counter = get_sales_counter()
+        counter.increment(first.pk)
+        counter.increment(second.pk)
+        assert counter.total_pending == 2
+        counter.increment(first.pk)
+        assert counter.total_pending == 0
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        assert (first.sales_count, second.sales_count) == (2, 1)
+
+    def test_failed_flush_keeps_the_increment(self, authenticated_client, create_product,
+                                              create_user, settings, monkeypatch):
+        """A synchronous flush error is logged; the response counts the buffered sale"""
+        from products.counters import get_sales_counter
+
+        def fail(**kwargs):
+            raise DatabaseError('database unavailable')
+
+        settings.SALES_COUNTER_MAX_PENDING = 1
+        monkeypatch.setattr('products.counters.record_activity', fail)
+        product = create_product(
+            created_by=create_user(username='seller', email='seller@example.com'))
+        response = authenticated_client.post(f'/api/products/{product.id}/increment_sales/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['sales_count'] == 1
+        assert get_sales_counter().pending_for(product.pk) == 1
+
+    def test_sales_count_spans_flushes(self, create_product):
+        """Stored and pending counts are combined without double counting"""
+        from products.counters import get_sales_counter
+        product = create_product()
+        counter = get_sales_counter()
+        counter.increment(product.pk)
+        counter.increment(product.pk)
+        assert counter.sales_count(product.pk) == 2
+        counter.flush()
+        counter.increment(product.pk)
+        assert counter.sales_count(product.pk) == 3
+
+
+@pytest.mark.django_db
+class TestTrending:
+    """Test time-decayed trending scores and the trending leaderboard"""
+
+    def _ids(self, client):
+        response = client.get('/api/products/trending/')
+        assert response.status_code == status.HTTP_200_OK
+        return [item['id'] for item in response.data]
+
+    def test_recent_activity_outranks_lifetime_sales(self, api_client, create_product,
+                                                     create_category, create_user):
+        """Older sales decay, so fewer recent sales rank higher"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from products.trending import record_activity
+        category = create_category()
+        user = create_user()
+        old = create_product(name='Old', sku='SKU-1', category=category, created_by=user)
+        new = create_product(name='New', sku='SKU-2', category=category, created_by=user)
+        create_product(name='Idle', sku='SKU-3', category=category, created_by=user)
+
+        record_activity(sales={old.pk: 10}, when=timezone.now() - timedelta(days=3))
+        record_activity(sales={new.pk: 1})
+        ranked = Product.objects.filter(trending_score__isnull=False).order_by('-trending_score')
+        assert list(ranked.values_list('pk', flat=True)) == [old.id, new.id]
+
+        record_activity(sales={new.pk: 1})
+        assert self._ids(api_client) == [new.id, old.id]
+
+    def test_sales_and_reviews_update_warm_board(self, api_client, create_product,
+                                                 create_category, create_user,
+                                                 django_capture_on_commit_callbacks):
+        """Counter flushes and new reviews move products on an already built board"""
+        from products.counters import get_sales_counter
+        from reviews.models import Review
+        category = create_category()
+        user = create_user()
+        first = create_product(name='First', sku='SKU-1', category=category, created_by=user)
+        second = create_product(name='Second', sku='SKU-2', category=category, created_by=user)
+        assert self._ids(api_client) == []
+
+        counter = get_sales_counter()
+        counter.increment(first.pk)
+        counter.increment(first.pk)
+        with django_capture_on_commit_callbacks(execute=True):
+            counter.flush()
+        assert self._ids(api_client) == [first.id]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Review.objects.create(product=second, user=user, rating=5,
+                                  title='Great', comment='Great product')
+        assert self._ids(api_client) == [second.id, first.id]
+
+    def test_rebuild_matches_incremental_scores(self, create_product, create_category,
+                                                create_user, settings):
+        """rebuild_trending recomputes the same scores and prunes expired buckets"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from products.models import ProductActivity
+        from products.trending import record_activity
+        category = create_category()
+        user = create_user()
+        first = create_product(name='First', sku='SKU-1', category=category, created_by=user)
+        second = create_product(name='Second', sku='SKU-2', category=category, created_by=user)
+        now = timezone.now()
+        record_activity(sales={first.pk: 2, second.pk: 1}, when=now - timedelta(hours=5))
+        record_activity(sales={first.pk: 1}, reviews={second.pk: 1}, when=now)
+        record_activity(sales={first.pk: 1}, when=now)
+        scores = dict(Product.objects.values_list('pk', 'trending_score'))
+
+        Product.objects.update(trending_score=None)
+        out = io.StringIO()
+        call_command('rebuild_trending', stdout=out)
+        for pk, score in Product.objects.values_list('pk', 'trending_score'):
+            assert score == pytest.approx(scores[pk])
+        assert '0 expired buckets pruned' in out.getvalue()
+
+        settings.TRENDING_WINDOW_DAYS = 0
+        call_command('rebuild_trending', stdout=io.StringIO())
+        assert not ProductActivity.objects.exists()
+        assert not Product.objects.filter(trending_score__isnull=False).exists()
+
+
+@pytest.mark.django_db
+class TestProductAttributeWrites:
+    """Test diff-based attribute writes in ProductCreateUpdateSerializer"""
+
+    def _payload(self, category, count):
+        return {
+            'name': f'Product {count}', 'description': 'Attribute test', 'sku': f'ATTR-{count}',
+            'price': '10.00', 'quantity_in_stock': 1, 'category': category, 'image': 'test.jpg',
+            'attributes': [{'attribute_key': 'Key', 'attribute_value': str(i)}
+                           for i in range(count)],
+        }
+
+    def _save(self, validated_data, instance=None):
+        from products.serializers import ProductCreateUpdateSerializer
+        serializer = ProductCreateUpdateSerializer()
+        if instance is None:
+            return serializer.create(validated_data)
+        return serializer.update(instance, validated_data)
+
+    def test_create_query_count_is_constant(self, create_category):
+        """Creating with 1 or 20 attributes runs the same number of queries"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        category = create_category()
+        # The category's first product also creates its stats row
+        self._save(self._payload(category, 0))
+
+        counts = []
+        for size in (1, 20):
+            data = self._payload(category, size)
+            with CaptureQueriesContext(connection) as ctx:
+                product = self._save(data)
+            counts.append(len(ctx.captured_queries))
+            assert product.attributes.count() == size
+        assert counts[0] == counts[1]
+
+    def test_update_only_touches_changed_rows(self, create_category):
+        """Unchanged attributes keep their rows; others are added or removed"""
+        category = create_category()
+        product = self._save(self._payload(category, 3))
+        kept = ProductAttribute.objects.get(product=product, attribute_value='1')
+
+        self._save({'attributes': [
+            {'attribute_key': 'Key', 'attribute_value': '1'},
+            {'attribute_key': 'Key', 'attribute_value': 'new'},
+        ]}, instance=product)
+
+        assert set(product.attributes.values_list('attribute_value', flat=True)) == {'1', 'new'}
+        assert ProductAttribute.objects.filter(pk=kept.pk).exists()
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    """Test ETag / Last-Modified handling on products and categories"""
+
+    def test_product_detail_not_modified(self, api_client, create_product,
+                                         django_assert_num_queries):
+        """A matching If-None-Match gets a 304 from a single query"""
+        product = create_product()
+        url = f'/api/products/{product.id}/'
+        response = api_client.get(url)
+        etag = response['ETag']
+        assert response['Last-Modified']
+
+        with django_assert_num_queries(1):
+            response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        product.name = 'Renamed'
+        product.save()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+
+    def test_product_list_not_modified(self, api_client, create_product):
+        """List validators depend on the filters and on the data"""
+        product = create_product()
+        etag = api_client.get('/api/products/')['ETag']
+        assert api_client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code == \
+            status.HTTP_304_NOT_MODIFIED
+        assert api_client.get('/api/products/?ordering=price',
+                              HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+
+        # Only rendered columns matter: sales_count is not in the list payload
+        Product.objects.filter(pk=product.pk).update(sales_count=10)
+        assert api_client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code == \
+            status.HTTP_304_NOT_MODIFIED
+        Product.objects.filter(pk=product.pk).update(quantity_in_stock=3)
+        assert api_client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code == \
+            status.HTTP_200_OK
+
+    def test_list_validator_costs_no_aggregate(self, api_client, create_product,
+                                               django_assert_num_queries):
+        """Plain keyset requests are tagged from the page: no COUNT, no Last-Modified"""
+        product = create_product()
+        create_product(name='Second', sku='SKU-2', category=product.category,
+                       created_by=product.created_by)
+        url = '/api/products/?pagination=cursor&page_size=1'
+        with django_assert_num_queries(1) as context:
+            response = api_client.get(url)
+        assert 'COUNT(' not in context.captured_queries[0]['sql'].upper()
+        assert 'Last-Modified' not in response
+        etag = response['ETag']
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == \
+            status.HTTP_304_NOT_MODIFIED
+
+        # A delete changes the page even though no updated_at moved
+        etag = api_client.get('/api/products/')['ETag']
+        Product.objects.filter(pk=product.pk).delete()
+        assert api_client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code == \
+            status.HTTP_200_OK
+
+    def test_list_fingerprint_skips_rendering(self, api_client, create_product,
+                                              django_assert_num_queries):
+        """A conditional request is answered from the fingerprint without the list query"""
+        product = create_product()
+        url = '/api/products/?ordering=price'
+        page_etag = api_client.get(url)['ETag']
+        # A page digest still validates, and is swapped for the fingerprint ETag
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=page_etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        etag = response['ETag']
+        assert etag != page_etag
+
+        with django_assert_num_queries(2) as context:
+            response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert 'ORDER BY' not in context.captured_queries[0]['sql'].upper()
+        last_modified = response['Last-Modified']
+        assert api_client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code == \
+            status.HTTP_304_NOT_MODIFIED
+
+        Product.objects.filter(pk=product.pk).delete()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+
+    def test_category_detail_tracks_products(self, api_client, create_product,
+                                             create_category):
+        """Adding a product changes the category detail validator"""
+        category = create_category()
+        url = f'/api/categories/{category.id}/'
+        etag = api_client.get(url)['ETag']
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == \
+            status.HTTP_304_NOT_MODIFIED
+
+        create_product(category=category)
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+class TestEffectivePricing:
+    """Test the denormalized effective_price / discount_percentage columns"""
+
+    def test_save_syncs_pricing(self, create_product):
+        """Saving a product recomputes the derived columns"""
+        product = create_product(price='80.00')
+        assert product.effective_price == Decimal('80.00')
+        assert product.discount_percentage == 0
+
+        product.discount_price = Decimal('60.00')
+        product.save(update_fields=['discount_price'])
+        product.refresh_from_db()
+        assert product.effective_price == Decimal('60.00')
+        assert product.discount_percentage == 25
+
+    def test_queryset_update_syncs_pricing(self, create_product):
+        """Bulk update() writes the derived columns in the same statement"""
+        product = create_product(price='30.00')
+        Product.objects.filter(price__gt=10).update(price=Decimal('20.00'),
+                                                    discount_price=Decimal('15.00'))
+        product.refresh_from_db()
+        assert product.effective_price == Decimal('15.00')
+        assert product.discount_percentage == 25
+
+        Product.objects.filter(pk=product.pk).update(discount_price=None)
+        product.refresh_from_db()
+        assert product.effective_price == Decimal('20.00')
+        assert product.discount_percentage == 0
+
+    def test_filter_and_order_by_selling_price(self, api_client, create_product, create_user,
+                                               create_category):
+        """min_price / max_price and ordering use the price the customer pays"""
+        user, category = create_user(), create_category()
+        cheap = create_product(name='Cheap', sku='CHEAP-001', price='40.00',
+                               category=category, created_by=user)
+        sale = create_product(name='Sale', sku='SALE-001', price='100.00',
+                              category=category, created_by=user)
+        Product.objects.filter(pk=sale.pk).update(discount_price=Decimal('30.00'))
+
+        response = api_client.get('/api/products/?max_price=35')
+        assert [item['id'] for item in response.data['results']] == [sale.id]
+
+        response = api_client.get('/api/products/?ordering=effective_price')
+        assert [item['id'] for item in response.data['results']] == [sale.id, cheap.id]
+
+        response = api_client.get('/api/products/?ordering=-discount_percentage')
+        assert response.data['results'][0]['discount_percentage'] == 70
+
+    def test_backfill_command(self, create_product):
+        """backfill_pricing repairs rows whose derived columns drifted"""
+        product = create_product(price='50.00')
+        Product.objects.filter(pk=product.pk).update(effective_price=Decimal('1.00'))
+
+        out = io.StringIO()
+        call_command('backfill_pricing', stdout=out)
+        product.refresh_from_db()
+        assert product.effective_price == Decimal('50.00')
+        assert 'Updated pricing for 1 products' in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestProductDetailCache:
+    """Test the product detail response cache"""
+
+    def test_repeat_views_hit_cache(self, api_client, create_product,
+                                    django_assert_num_queries):
+        """The second view of a product is served from the cache"""
+        from products.detail_cache import get_detail_cache
+        product = create_product()
+        url = f'/api/products/{product.id}/'
+        first = api_client.get(url)
+
+        with django_assert_num_queries(1):
+            second = api_client.get(url)
+        assert second.data == first.data
+        assert second.data['image'].startswith('http://testserver/')
+
+        by_slug = api_client.get(f'/api/products/slug/{product.slug}/')
+        assert by_slug.data == first.data
+        stats = get_detail_cache().stats()
+        assert (stats['hits'], stats['misses'], stats['entries']) == (2, 1, 1)
+
+    def test_writes_invalidate_entries(self, api_client, create_product):
+        """Product, attribute and category changes are visible immediately"""
+        product = create_product()
+        url = f'/api/products/{product.id}/'
+        api_client.get(url)
+
+        ProductAttribute.objects.create(
+            product=product, attribute_key='Color', attribute_value='Red')
+        assert api_client.get(url).data['attributes'][0]['attribute_value'] == 'Red'
+
+        category = product.category
+        category.name = 'Renamed Category'
+        category.save()
+        assert api_client.get(url).data['category']['name'] == 'Renamed Category'
+
+        Product.objects.filter(pk=product.pk).update(is_active=False)
+        assert api_client.get(url).status_code == status.HTTP_404_NOT_FOUND
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted at capacity"""
+        from products.detail_cache import ProductDetailCache
+        cache = ProductDetailCache(max_entries=2)
+        for product_id in (1, 2, 3):
+            cache.set(product_id, (product_id,), {'id': product_id, 'category': None})
+        assert cache.get(1, (1,)) is None
+        assert cache.get(3, (3,)) == {'id': 3, 'category': None}
+        assert cache.stats()['evictions'] == 1
+
+
+@pytest.mark.django_db
+class TestProductListFastPath:
+    """Test the .values() serialization path for product listings"""
+
+    def test_output_identical_to_serializer(self, create_product, create_category, create_user,
+                                            rf):
+        """The fast path renders byte-identical JSON"""
+        from rest_framework.renderers import JSONRenderer
+        from products.serializers import (
+            ProductListSerializer, product_list_values, serialize_product_values)
+
+        user = create_user()
+        category = create_category()
+        Category.objects.filter(pk=category.pk).update(image='categories/c.png')
+        create_product(name='Plain', sku='PLAIN-001', price='10.50', category=category,
+                       created_by=user)
+        sale = create_product(name='Sale', sku='SALE-001', price='100', category=category,
+                              created_by=user)
+        Product.objects.filter(pk=sale.pk).update(discount_price=Decimal('33.33'),
+                                                  average_rating=4.5, quantity_in_stock=0)
+        Product.objects.create(name='Orphan', sku='ORPHAN-001', price='5', description='x',
+                               quantity_in_stock=1, image='', created_by=user)
+
+        context = {'request': rf.get('/api/products/')}
+        queryset = Product.objects.select_related('category').order_by('pk')
+        expected = ProductListSerializer(queryset, many=True, context=context).data
+        actual = serialize_product_values(product_list_values(queryset), context)
+        assert JSONRenderer().render(actual) == JSONRenderer().render(expected)
+
+    def test_cursor_pagination_over_values(self, api_client, create_product, create_user,
+                                           create_category):
+        """Keyset pagination builds cursors from projected rows"""
+        user, category = create_user(), create_category()
+        for number in range(3):
+            create_product(name=f'Item {number}', sku=f'ITEM-{number}', price=f'{number + 1}',
+                           category=category, created_by=user)
+        response = api_client.get('/api/products/?pagination=cursor&page_size=2&ordering=price')
+        assert [item['name'] for item in response.data['results']] == ['Item 0', 'Item 1']
+        response = api_client.get(response.data['next'])
+        assert [item['name'] for item in response.data['results']] == ['Item 2']
+
+
+@pytest.mark.django_db
+class TestProductBatch:
+    """Test the batch product detail endpoint"""
+
+    def test_batch_preserves_order_and_reports_missing(self, api_client, create_product,
+                                                        create_category, create_user,
+                                                        django_assert_num_queries):
+        """Products come back in request order from a fixed number of queries"""
+        user, category = create_user(), create_category()
+        first = create_product(name='First', sku='FIRST-001', category=category,
+                               created_by=user)
+        second = create_product(name='Second', sku='SECOND-001', category=category,
+                                created_by=user)
+
+        with django_assert_num_queries(3):
+            response = api_client.get(
+                f'/api/products/batch/?ids={second.id},999,{first.id}&slugs=nope')
+        assert [item['id'] for item in response.data['results']] == [second.id, first.id]
+        assert response.data['missing'] == [{'id': 999}, {'slug': 'nope'}]
+        assert response.data['results'][0] == api_client.get(f'/api/products/{second.id}/').data
+
+        # Cached payloads are reused
+        with django_assert_num_queries(1):
+            response = api_client.post('/api/products/batch/',
+                                       {'slugs': [first.slug, second.slug]}, format='json')
+        assert [item['id'] for item in response.data['results']] == [first.id, second.id]
+
+    def test_batch_validation(self, api_client, settings):
+        """Bad or oversized requests are rejected"""
+        settings.PRODUCT_BATCH_MAX_SIZE = 2
+        assert api_client.get('/api/products/batch/').status_code == status.HTTP_400_BAD_REQUEST
+        assert api_client.get('/api/products/batch/?ids=a').status_code == \
+            status.HTTP_400_BAD_REQUEST
+        assert api_client.get('/api/products/batch/?ids=1,2,3').status_code == \
+            status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestProductChangeFeed:
+    """Test the ?since= change feed and the change log behind it"""
+
+    def test_feed_collapses_changes_and_advances_cursor(self, api_client, create_product):
+        """Each changed product appears once, in its current state"""
+        product = create_product()
+        product.name = 'Renamed'
+        product.save()
+
+        response = api_client.get('/api/products/changes/?since=0')
+        assert response.status_code == status.HTTP_200_OK
+        [entry] = response.data['results']
+        assert entry['product_id'] == product.id
+        assert entry['action'] == 'updated'
+        assert entry['product']['name'] == 'Renamed'
+        assert entry['cursor'] == response.data['cursor']
+        assert response.data['has_more'] is False
+
+        cursor = response.data['cursor']
+        response = api_client.get(f'/api/products/changes/?since={cursor}')
+        assert response.data == {'cursor': cursor, 'has_more': False, 'results': []}
+
+    def test_tombstones_for_deactivated_and_deleted(self, api_client, create_product,
+                                                    create_category, create_user):
+        """Bulk deactivation and deletes are logged without product data"""
+        user, category = create_user(), create_category()
+        hidden = create_product(name='Hidden', sku='HIDDEN-1', category=category, created_by=user)
+        gone = create_product(name='Gone', sku='GONE-1', category=category, created_by=user)
+        cursor = api_client.get('/api/products/changes/').data['cursor']
+
+        Product.objects.filter(pk=hidden.pk).update(is_active=False)
+        gone_id = gone.id
+        gone.delete()
+
+        results = api_client.get(f'/api/products/changes/?since={cursor}').data['results']
+        assert [(entry['product_id'], entry['action'], entry['product']) for entry in results] \
+            == [(hidden.id, 'deactivated', None), (gone_id, 'deleted', None)]
+
+    def test_attribute_writes_logged_and_counters_ignored(self, api_client, create_product):
+        """Attribute rows bump the product into the feed; sales counters do not"""
+        product = create_product()
+        cursor = api_client.get('/api/products/changes/').data['cursor']
+
+        Product.objects.filter(pk=product.pk).update(sales_count=5)
+        assert api_client.get(f'/api/products/changes/?since={cursor}').data['results'] == []
+
+        ProductAttribute.objects.create(product=product, attribute_key='Color',
+                                        attribute_value='Red')
+        results = api_client.get(f'/api/products/changes/?since={cursor}').data['results']
+        assert [entry['product_id'] for entry in results] == [product.id]
+
+    def test_bulk_update_logs_each_product_once(self, create_product, create_user,
+                                                create_category):
+        """bulk_update writes exactly one change log row per updated product"""
+        from products.models import ProductChange
+        user, category = create_user(), create_category()
+        products = [create_product(name=f'P{number}', sku=f'P-{number}', category=category,
+                                   created_by=user) for number in range(3)]
+        ProductChange.objects.all().delete()
+
+        for product in products:
+            product.price = Decimal('5.00')
+        Product.objects.bulk_update(products, ['price'], batch_size=2)
+        assert sorted(ProductChange.objects.values_list('product_id', flat=True)) == \
+            sorted(product.pk for product in products)
+
+    def test_feed_pages_with_limit(self, api_client, create_product, create_category,
+                                   create_user):
+        """limit bounds a page and has_more tells the client to keep reading"""
+        user, category = create_user(), create_category()
+        ids = [create_product(name=f'P{number}', sku=f'P-{number}', category=category,
+                              created_by=user).id for number in range(3)]
+
+        first = api_client.get('/api/products/changes/?limit=2&fields=id,name').data
+        assert first['has_more'] is True
+        assert [entry['product'] for entry in first['results']] == [
+            {'id': ids[0], 'name': 'P0'}, {'id': ids[1], 'name': 'P1'}]
+        second = api_client.get(f'/api/products/changes/?limit=2&since={first["cursor"]}').data
+        assert second['has_more'] is False
+        assert [entry['product_id'] for entry in second['results']] == [ids[2]]
+        assert api_client.get('/api/products/changes/?since=x').status_code == \
+            status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestReviewStats:
+    """Test incrementally maintained review count, rating sum and average"""
+
+    def _review(self, product, user, rating):
+        from reviews.models import Review
+        return Review.objects.create(product=product, user=user, rating=rating,
+                                     title='Review', comment='Review comment')
+
+    def _stats(self, product):
+        product.refresh_from_db()
+        return product.review_count, product.rating_sum, product.average_rating
+
+    def test_deltas_on_create_edit_and_delete(self, create_product, create_user):
+        """New reviews, rating edits, moves and deletes apply deltas; the last delete resets"""
+        product = create_product()
+        other = create_product(name='Other', sku='SKU-2', category=product.category,
+                               created_by=product.created_by)
+        first = self._review(product, product.created_by, 4)
+        second = self._review(product, create_user(username='u2', email='u2@example.com'), 1)
+        assert self._stats(product) == (2, 5, 2.5)
+
+        second.rating = 5
+        second.save()
+        assert self._stats(product) == (2, 9, 4.5)
+        second.helpful_count = 3
+        second.save(update_fields=['helpful_count'])
+        assert self._stats(product) == (2, 9, 4.5)
+
+        second.product = other
+        second.save()
+        assert self._stats(product) == (1, 4, 4.0)
+        assert self._stats(other) == (1, 5, 5.0)
+
+        first.delete()
+        assert self._stats(product) == (0, 0, 0.0)
+
+    def test_product_delete_skips_review_deltas(self, create_product, create_user,
+                                                django_assert_max_num_queries):
+        """Reviews deleted with their product do not update it; with their user they do"""
+        product = create_product()
+        other_user = create_user(username='u2', email='u2@example.com')
+        self._review(product, product.created_by, 4)
+        self._review(product, other_user, 2)
+
+        other_user.delete()
+        assert self._stats(product) == (1, 4, 4.0)
+
+        with django_assert_max_num_queries(30) as context:
+            Product.objects.filter(pk=product.pk).delete()
+        assert not any('"review_count" = ' in query['sql']
+                       for query in context.captured_queries)
+
+    def test_new_review_does_not_scan_reviews(self, create_product, create_user,
+                                              django_assert_max_num_queries):
+        """Creating a review costs the same however many reviews the product has"""
+        product = create_product()
+        for number in range(5):
+            self._review(product, create_user(username=f'u{number}',
+                                              email=f'u{number}@example.com'), 3)
+        # Trending, the stats UPDATE and its change log / category stats upkeep
+        # (including locking the category's stats rows)
+        with django_assert_max_num_queries(14) as context:
+            self._review(product, product.created_by, 5)
+        assert not any('FROM "reviews"' in query['sql'] for query in context.captured_queries)
+        assert self._stats(product) == (6, 20, 20 / 6)
+
+    def test_check_command_reports_and_fixes_drift(self, create_product):
+        """check_review_stats compares against a full aggregate and --fix repairs it"""
+        product = create_product()
+        self._review(product, product.created_by, 4)
+        Product.objects.filter(pk=product.pk).update(review_count=7, rating_sum=1,
+                                                     average_rating=0.1)
+
+        out = io.StringIO()
+        call_command('check_review_stats', stdout=out)
+        assert '1 products have drifted review stats' in out.getvalue()
+        assert self._stats(product) == (7, 1, 0.1)
+
+        call_command('check_review_stats', '--fix', stdout=out)
+        assert self._stats(product) == (1, 4, 4.0)
+        out = io.StringIO()
+        call_command('check_review_stats', stdout=out)
+        assert 'consistent' in out.getvalue()
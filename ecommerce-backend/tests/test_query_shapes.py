@@ -0,0 +1,88 @@
+"""
+Tests for query-shape recording and the index advisor command
+"""
+
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+from django.db.migrations.loader import MigrationLoader
+from ecommerce_project.query_shapes import get_query_shape_recorder, query_shape, read_shape_log
+from categories.models import Category
+from products.models import Product
+
+
+@pytest.mark.django_db
+class TestQueryShapes:
+    """Test shape extraction, recording and index proposals"""
+
+    def test_shape_keeps_columns_not_values(self, create_category):
+        """Equality, range and ordering columns are captured without their values"""
+        category = create_category()
+        queryset = Product.objects.filter(
+            is_active=True, category=category, effective_price__gte=10,
+            name__icontains='mouse',
+        ).order_by('-created_at', '-pk')
+
+        assert query_shape(queryset) == {
+            'model': 'products.Product',
+            'equality': ['category', 'is_active'],
+            'range': ['effective_price'],
+            'ordering': ['-created_at'],
+            'conditions': {'is_active': True},
+        }
+
+    def test_list_requests_are_recorded(self, api_client, create_product, settings):
+        """Product list requests append their shape to the log on flush"""
+        product = create_product()
+        api_client.get(f'/api/products/?category={product.category_id}&min_price=5')
+        api_client.get(f'/api/products/?category={product.category_id}&min_price=50')
+        api_client.get(f'/api/products/{product.id}/')
+
+        get_query_shape_recorder().flush()
+        entries = list(read_shape_log(settings.QUERY_SHAPE_LOG))
+        assert len(entries) == 1
+        shape, count = entries[0]
+        assert count == 2
+        assert shape['equality'] == ['category', 'is_active']
+        assert shape['range'] == ['effective_price']
+
+    def test_recording_can_be_disabled(self, api_client, create_product, settings):
+        """An empty QUERY_SHAPE_LOG turns recording off"""
+        settings.QUERY_SHAPE_LOG = ''
+        create_product()
+        response = api_client.get('/api/products/')
+        assert response.status_code == 200
+        assert get_query_shape_recorder() is None
+
+    def test_index_advisor_proposes_partial_composite_index(self, create_user, tmp_path):
+        """The advisor ranks a partial (category, -created_at) index and emits a migration"""
+        user = create_user()
+        categories = [Category.objects.create(name=f'Category {number}') for number in range(10)]
+        Product.objects.bulk_create([
+            Product(name=f'Product {number}', slug=f'product-{number}', sku=f'SKU-{number}',
+                    description='Test', price='9.99', quantity_in_stock=1,
+                    category=categories[number % 10],
+                    created_by=user, is_active=number % 2 == 0, image='test.jpg')
+            for number in range(200)
+        ])
+        log = tmp_path / 'shapes.jsonl'
+        shape = {
+            'model': 'products.Product', 'equality': ['category', 'is_active'], 'range': [],
+            'ordering': ['-created_at'], 'conditions': {'is_active': True},
+        }
+        log.write_text(json.dumps({'shape': shape, 'count': 500}) + '\n')
+
+        out = io.StringIO()
+        call_command('index_advisor', log=str(log), emit_migration=True,
+                     output_dir=str(tmp_path / 'migrations'), stdout=out)
+
+        output = out.getvalue()
+        assert '1. products.Product (category, -created_at) WHERE is_active=True' in output
+        leaf = MigrationLoader(None).graph.leaf_nodes('products')[0]
+        migration = next((tmp_path / 'migrations').glob('*_advisor_indexes.py')).read_text()
+        migration = migration.replace('"', "'")
+        assert "condition=models.Q(('is_active', True))" in migration
+        assert "fields=['category', '-created_at']" in migration
+        assert repr(leaf) in migration
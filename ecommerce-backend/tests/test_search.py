@@ -0,0 +1,145 @@
+"""
+Tests for product full-text search
+"""
+
+import pytest
+from rest_framework import status
+from products.models import ProductAttribute
+from products.search import ProductSearchIndex, get_search_index, tokenize
+
+
+@pytest.fixture
+def catalog(create_product, create_category, create_user):
+    """A few products with distinct text"""
+    category = create_category()
+    user = create_user()
+
+    def make(name, sku, description='Test product description'):
+        product = create_product(name=name, sku=sku, category=category, created_by=user)
+        product.description = description
+        product.save()
+        return product
+
+    return {
+        'laptop': make('Gaming Laptop', 'LAP-001', 'Fast laptop with a great screen'),
+        'bag': make('Laptop Bag', 'BAG-001', 'Padded bag for carrying things'),
+        'mouse': make('Wireless Mouse', 'MOU-001', 'Ergonomic mouse'),
+    }
+
+
+def test_tokenize():
+    """Tokenizer lowercases and splits on non-word characters"""
+    assert tokenize('Wireless-Headphones, 2 Years') == ['wireless', 'headphones', '2', 'years']
+
+
+@pytest.mark.django_db
+class TestProductSearch:
+    """Test the ?q= search mode"""
+
+    def test_ranked_results(self, api_client, catalog):
+        """Products matching more often and in the name rank first"""
+        response = api_client.get('/api/products/?q=laptop')
+        assert response.status_code == status.HTTP_200_OK
+        ids = [item['id'] for item in response.data['results']]
+        assert ids == [catalog['laptop'].id, catalog['bag'].id]
+
+    def test_sku_and_attribute_match(self, api_client, catalog):
+        """Whole SKUs and attribute values are searchable"""
+        ProductAttribute.objects.create(
+            product=catalog['mouse'], attribute_key='Color', attribute_value='Crimson')
+        get_search_index().build()
+
+        response = api_client.get('/api/products/?q=MOU-001')
+        assert response.data['results'][0]['id'] == catalog['mouse'].id
+        response = api_client.get('/api/products/?q=crimson')
+        assert [item['id'] for item in response.data['results']] == [catalog['mouse'].id]
+
+    def test_incremental_update(self, api_client, catalog, django_capture_on_commit_callbacks):
+        """Saving and deleting products updates a loaded index"""
+        api_client.get('/api/products/?q=laptop')
+        assert get_search_index().loaded
+
+        with django_capture_on_commit_callbacks(execute=True):
+            catalog['mouse'].name = 'Laptop Mouse'
+            catalog['mouse'].save()
+            catalog['bag'].delete()
+
+        response = api_client.get('/api/products/?q=laptop')
+        ids = [item['id'] for item in response.data['results']]
+        assert set(ids) == {catalog['laptop'].id, catalog['mouse'].id}
+
+    def test_snapshot_round_trip(self, catalog, tmp_path):
+        """A saved snapshot loads back with identical rankings"""
+        index = get_search_index()
+        index.build()
+        index.save(tmp_path / 'snapshot.pickle')
+
+        loaded = ProductSearchIndex()
+        assert loaded.load(tmp_path / 'snapshot.pickle')
+        assert loaded.search('laptop bag') == index.search('laptop bag')
+
+    def test_no_matches(self, api_client, catalog):
+        """A query with no hits returns an empty page"""
+        response = api_client.get('/api/products/?q=nonexistent')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'] == []
+
+    def test_cursor_needs_field_ordering(self, api_client, catalog):
+        """Relevance order cannot be keyset-paginated; a field ordering can"""
+        response = api_client.get('/api/products/?q=laptop&pagination=cursor')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = api_client.get('/api/products/?q=laptop&pagination=cursor&ordering=price')
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 2
+
+    def test_filters_apply_before_the_cap(self, api_client, create_product, create_category,
+                                          create_user, settings):
+        """Matches ranked below the cap are still found when filters drop those above it"""
+        settings.SEARCH_MAX_RESULTS = 2
+        user = create_user()
+        tools, toys = create_category(name='Tools'), create_category(name='Toys')
+        for number in range(3):
+            create_product(name=f'Widget {number}', sku=f'W-{number}', category=tools, created_by=user)
+        toy = create_product(name='Widget 9', sku='W-9', category=toys, created_by=user)
+
+        response = api_client.get(f'/api/products/?q=widget&category={toys.pk}')
+        assert [item['id'] for item in response.data['results']] == [toy.id]
+        response = api_client.get('/api/products/?q=widget')
+        assert response.data['count'] == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_refresher_keeps_request_path_read_only(create_product, django_assert_num_queries):
+    """With a background refresher, requests wait for the first load and never sync inline"""
+    from products.indexing import reset_indexes, start_index_refresher
+    product = create_product(name='Gaming Laptop', sku='LAP-001')
+    try:
+        start_index_refresher()
+        index = get_search_index()
+        index.ensure_loaded()
+        assert [pk for pk, _ in index.search('laptop')] == [product.pk]
+
+        index.expire()
+        with django_assert_num_queries(0):
+            index.ensure_loaded()
+            index.search('laptop')
+    finally:
+        reset_indexes()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_failed_first_load_releases_requests(api_client, monkeypatch):
+    """A first load that raises answers waiting requests with 503 instead of hanging"""
+    from products.indexing import reset_indexes, start_index_refresher
+
+    def fail(self):
+        raise RuntimeError('database unavailable')
+
+    monkeypatch.setattr(ProductSearchIndex, 'build', fail)
+    try:
+        start_index_refresher()
+        response = api_client.get('/api/products/?q=laptop')
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert isinstance(get_search_index().load_error, RuntimeError)
+    finally:
+        reset_indexes()